@@ -13,4 +13,18 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Must happen before importing tf.
 os.environ['CUDA_VISIBLE_DEVICES'] = '-1'  # CPU is faster than GPU.
 
+# INTENT_PREWARM=1 warms up the solver processes and TF-Coder before the
+# server accepts requests, so the first /solve is as fast as the next ones.
+# The solver processes are forked from a fork server importing TF-Coder once,
+# unless INTENT_START_METHOD says otherwise. Solver processes import this
+# package too, and must not warm up another pool.
+import multiprocessing
+PREWARM = (bool(os.environ.get('INTENT_PREWARM')) and
+           multiprocessing.parent_process() is None)
+if PREWARM:
+    os.environ.setdefault('INTENT_START_METHOD', 'forkserver')
+
 import INTENT.main
+
+if PREWARM:
+    INTENT.utils.prewarm()
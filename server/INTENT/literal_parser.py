@@ -0,0 +1,255 @@
+"""
+Parser of the tensor literals sent to /solve and /validate.
+
+Replaces eval() on request data. Accepted literals are:
+  - Python scalars: 1, -2.5, True, 'abc'
+  - nested lists or tuples of scalars: [[1, 2], [3, 4]]
+  - tf.constant(<nested list>) and tf.constant(<nested list>, tf.<dtype>),
+    also with dtype=tf.<dtype>
+  - tf.SparseTensor(indices, values, dense_shape), also with keywords
+  - dtypes: tf.int32, tf.float32, ...
+  - lists of any of the above: [tf.constant([1, 2]), tf.constant([3])]
+
+Nested lists become NumPy arrays with the dtype tf.constant would give them
+(int32, int64, float32, bool or string), so TF-Coder converts them to the
+same tensors as before without walking Python lists again. Ragged nested
+lists, like [[1, 2], [3]], and lists of tensors stay Python lists, as with
+eval(). Lists are decoded with the C JSON decoder when they are valid JSON,
+which is the usual case, and with ast.literal_eval otherwise. No code is
+executed.
+"""
+import ast
+import json
+import re
+from typing import Any, List
+
+import numpy as np
+import tensorflow as tf
+
+# maximum number of characters of a literal
+MAX_LITERAL_LENGTH = 1000000
+# maximum number of elements of a tensor
+MAX_ELEMENTS = 100000
+# maximum number of dimensions of a tensor
+MAX_NUM_DIMENSIONS = 6
+
+_INT32_MIN, _INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+_DTYPE = re.compile(r'tf\.(\w+)$')
+_CALL = re.compile(
+    r'tf\.(constant|SparseTensor|sparse\.SparseTensor)\s*\((.*)\)$', re.DOTALL)
+# the optional dtype at the end of the arguments of tf.constant
+_CONSTANT_ARGUMENTS = re.compile(
+    r'(?P<value>.*?)\s*(?:,\s*(?:dtype\s*=\s*)?(?P<dtype>tf\.\w+))?\s*,?\s*$',
+    re.DOTALL)
+_SPARSE_ARGUMENT_NAMES = ['indices', 'values', 'dense_shape']
+
+
+class LiteralError(ValueError):
+    """Raised for text that is not an accepted literal."""
+
+
+def _reject_constant(name):
+    raise ValueError(f'{name} is not a Python literal')
+
+
+def _parse_python_value(text: str) -> Any:
+    """Parses a scalar or nested list literal into Python objects."""
+    try:
+        value = json.loads(text, parse_constant=_reject_constant)
+    except (ValueError, RecursionError):
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, TypeError, SyntaxError, MemoryError,
+                RecursionError) as e:
+            raise LiteralError(f'Invalid literal: {e}') from None
+    if isinstance(value, (dict, set, complex, bytes)) or value is None:
+        raise LiteralError(
+            f'Unsupported literal of type {type(value).__name__}')
+    return value
+
+
+def _parse_dtype(text: str) -> tf.DType:
+    match = _DTYPE.match(text)
+    dtype = getattr(tf, match.group(1), None) if match else None
+    if not isinstance(dtype, tf.DType):
+        raise LiteralError(f'Unknown dtype {text}')
+    return dtype
+
+
+def _to_array(value: Any, dtype: tf.DType = None) -> np.ndarray:
+    """Converts a nested list to an array with the dtype of tf.constant."""
+    try:
+        if dtype is not None and dtype != tf.string:
+            array = np.asarray(value, dtype=dtype.as_numpy_dtype)
+        else:
+            array = np.asarray(value)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise LiteralError(f'Invalid tensor: {e}') from None
+    if array.ndim > MAX_NUM_DIMENSIONS:
+        raise LiteralError(f'Tensors can have at most {MAX_NUM_DIMENSIONS} '
+                           f'dimensions, got {array.ndim}')
+    if array.size > MAX_ELEMENTS:
+        raise LiteralError(f'Tensors can have at most {MAX_ELEMENTS} '
+                           f'elements, got {array.size}')
+    if array.dtype == object:
+        raise LiteralError('Tensors must contain numbers, booleans or strings')
+    if dtype is None:
+        if array.dtype.kind == 'u':
+            # only integers from 2**63 on do not fit in int64
+            raise LiteralError('Integers must fit in 64 bits')
+        if array.dtype.kind == 'i':
+            # python ints become int32 tensors unless they don't fit
+            if (array.size == 0 or
+                    (array.min() >= _INT32_MIN and array.max() <= _INT32_MAX)):
+                array = array.astype(np.int32)
+            else:
+                array = array.astype(np.int64)
+        elif array.dtype.kind == 'f':
+            array = array.astype(np.float32)
+    return array
+
+
+def _check_ragged_list(value: Any, depth: int = 0) -> int:
+    """Checks a ragged nested list and returns its number of elements."""
+    if not isinstance(value, (list, tuple)):
+        if not isinstance(value, (bool, int, float, str)):
+            raise LiteralError(
+                'Tensors must contain numbers, booleans or strings')
+        return 1
+    if depth >= MAX_NUM_DIMENSIONS:
+        raise LiteralError(f'Tensors can have at most {MAX_NUM_DIMENSIONS} '
+                           f'dimensions')
+    return sum(_check_ragged_list(element, depth + 1) for element in value)
+
+
+def _list_shape(value: Any) -> Any:
+    """Returns the shape of a nested list, or None if it is ragged."""
+    if not isinstance(value, (list, tuple)):
+        return ()
+    shapes = {_list_shape(element) for element in value}
+    if len(shapes) > 1 or None in shapes:
+        return None
+    return (len(value),) + (shapes.pop() if shapes else ())
+
+
+def _list_to_array(value: Any) -> Any:
+    """Converts a nested list to an array, or keeps it if it is ragged."""
+    try:
+        return _to_array(value)
+    except LiteralError:
+        if _list_shape(value) is not None:
+            raise
+    num_elements = _check_ragged_list(value)
+    if num_elements > MAX_ELEMENTS:
+        raise LiteralError(f'Tensors can have at most {MAX_ELEMENTS} '
+                           f'elements, got {num_elements}')
+    return value
+
+
+def _split_arguments(text: str) -> List[str]:
+    """Splits call arguments at the commas outside brackets and strings."""
+    arguments = []
+    depth = 0
+    quote = None
+    start = 0
+    for position, character in enumerate(text):
+        if quote:
+            if character == quote and text[position - 1] != '\\':
+                quote = None
+        elif character in '\'"':
+            quote = character
+        elif character in '([{':
+            depth += 1
+        elif character in ')]}':
+            depth -= 1
+        elif character == ',' and depth == 0:
+            arguments.append(text[start:position].strip())
+            start = position + 1
+    arguments.append(text[start:].strip())
+    return [argument for argument in arguments if argument]
+
+
+def _parse_sparse_tensor(text: str) -> tf.SparseTensor:
+    arguments = {}
+    for position, argument in enumerate(_split_arguments(text)):
+        name, equals, value = argument.partition('=')
+        if equals and name.strip() in _SPARSE_ARGUMENT_NAMES:
+            name = name.strip()
+        elif position < len(_SPARSE_ARGUMENT_NAMES):
+            name, value = _SPARSE_ARGUMENT_NAMES[position], argument
+        else:
+            raise LiteralError(f'Unexpected argument {argument}')
+        arguments[name] = _parse_python_value(value)
+    if set(arguments) != set(_SPARSE_ARGUMENT_NAMES):
+        raise LiteralError('tf.SparseTensor needs indices, values and '
+                           'dense_shape')
+    try:
+        return tf.SparseTensor(
+            indices=_to_array(arguments['indices'], tf.int64),
+            values=_to_array(arguments['values']),
+            dense_shape=_to_array(arguments['dense_shape'], tf.int64))
+    except (ValueError, TypeError, tf.errors.InvalidArgumentError) as e:
+        raise LiteralError(f'Invalid sparse tensor: {e}') from None
+
+
+def _parse(text: str, depth: int) -> Any:
+    """Parses a literal nested in depth lists of non-Python literals."""
+    text = text.strip()
+    if text.startswith('tf.'):
+        match = _CALL.match(text)
+        if match is None:
+            return _parse_dtype(text)
+        function, arguments = match.groups()
+        if function != 'constant':
+            return _parse_sparse_tensor(arguments)
+        match = _CONSTANT_ARGUMENTS.match(arguments)
+        dtype = match.group('dtype')
+        return _to_array(_parse_python_value(match.group('value')),
+                         _parse_dtype(dtype) if dtype else None)
+
+    try:
+        value = _parse_python_value(text)
+    except LiteralError:
+        if not (text.startswith('[') and text.endswith(']')):
+            raise
+        # a list of tensors or dtypes, like [tf.constant([1]), tf.int32]
+        if depth >= MAX_NUM_DIMENSIONS:
+            raise LiteralError(f'Lists can have at most {MAX_NUM_DIMENSIONS} '
+                               f'dimensions') from None
+        return [_parse(element, depth + 1)
+                for element in _split_arguments(text[1:-1])]
+    if isinstance(value, (list, tuple)):
+        return _list_to_array(value)
+    return value
+
+
+def parse_literal(text: str) -> Any:
+    """Parses an input or output literal.
+
+    Returns a Python scalar, a NumPy array, a tf.SparseTensor, a tf.DType,
+    or a Python list of these for ragged lists and lists of tensors.
+
+    Raises:
+        LiteralError: if the text is not an accepted literal or is too large.
+    """
+    if not isinstance(text, str):
+        raise LiteralError(f'Expected a string, got {type(text).__name__}')
+    if len(text) > MAX_LITERAL_LENGTH:
+        raise LiteralError(f'Literals can have at most {MAX_LITERAL_LENGTH} '
+                           f'characters')
+    return _parse(text, 0)
+
+
+def parse_constants(text: str) -> List[Any]:
+    """Parses the list of scalar constants of a problem, like [0, tf.int32]."""
+    text = text.strip()
+    if not text.startswith('[') or not text.endswith(']'):
+        raise LiteralError('Constants must be a list')
+    constants = []
+    for argument in _split_arguments(text[1:-1]):
+        constant = parse_literal(argument)
+        if isinstance(constant, (np.ndarray, tf.SparseTensor, list, tuple)):
+            raise LiteralError(f'Constants must be scalars, got {argument}')
+        constants.append(constant)
+    return constants
@@ -6,13 +6,23 @@ URLs include:
 """
 import flask
 import flask_cors
-import threading
 
 
 import INTENT
-from INTENT import utils, session
-from tf_coder.dataflow import dataflow
-from datetime import timezone, datetime
+from INTENT import utils, session, literal_parser, metrics
+from INTENT import solve_coalescer, solver_pool, validation_cache
+import gzip
+import json
+
+try:
+    import msgpack
+except ImportError:
+    # /poll answers in JSON only
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+# responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
 
 
 @INTENT.app.route('/', methods=['GET'])
@@ -31,34 +41,116 @@ def page_not_found(e):
     return html, 404
 
 
+@INTENT.app.errorhandler(literal_parser.LiteralError)
+def invalid_literal(e):
+    return str(e), 400
+
+
+@INTENT.app.errorhandler(validation_cache.Superseded)
+def superseded(e):
+    # the client sent a newer request and ignores this one
+    return 'Superseded by a newer request', 409
+
+
+@INTENT.app.errorhandler(solver_pool.Busy)
+def busy(e):
+    response = flask.jsonify({'busy': True, 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+
 @INTENT.app.route('/solve',
                      methods=['POST', 'OPTIONS', 'HEAD'])
 @flask_cors.cross_origin()
 def solve():
-    session_id = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+    """
+    The optional 'client_id' of the request identifies a browser tab: a new
+    /solve aborts the previous search of the same client. Identical
+    requests sent while a search for them runs share that search.
 
+    When the solvers are too busy, answers 503 with a Retry-After header
+    and {'busy': true, 'retry_after': seconds}.
+    """
     data = flask.request.json
 
     inputs_list, output_list = utils.get_inputs_and_output_list(data)
 
-    session.global_session_dict[session_id].inputs_list = inputs_list
+    # queue the search for the solver service
+    session_id = utils.start_problem(
+        solve_coalescer.spec_digest(data),
+        client_id=data.get('client_id'),
+        client=data.get('client_id') or flask.request.remote_addr,
+        inputs_list=inputs_list,
+        output_list=output_list,
+        constants=literal_parser.parse_constants(data['constraints']),
+        description=data['description'],
+        desired_op=list(data['desired_op'].keys()),
+        undesired_op=list(data['undesired_op'].keys()),
+        time_limit=float(data['timeout']),
+        number_of_solutions=int(data['sol_num']))
 
-    # worker thread in background
-    solver = threading.Thread(
-        target=utils.solve_problem,
-        kwargs={'inputs_list': inputs_list,
-                'output_list': output_list,
-                'constants': eval(data['constraints']),
-                'description': data['description'],
-                'desired_op': list(data['desired_op'].keys()),
-                'undesired_op': list(data['undesired_op'].keys()),
-                'time_limit': float(data['timeout']),
-                'number_of_solutions': int(data['sol_num']),
-                'session_id': session_id})
+    return flask.jsonify({'session_id': session_id})
 
-    solver.start()
 
-    return flask.jsonify({'session_id': session_id})
+@INTENT.app.route('/resume/<int:session_id>',
+                     methods=['POST', 'OPTIONS', 'HEAD'])
+@flask_cors.cross_origin()
+def resume(session_id):
+    """
+    request:
+    {
+        'timeout': double, // extra seconds to search for
+        'sol_num': int, // number of extra solutions to find
+    }
+
+    Continues the finished search of a session from where it stopped, so
+    searching longer only costs the new work. New solutions are reported
+    by /poll and /stream as usual.
+    """
+    status = session.store.get_status(session_id)
+    if status is None:
+        flask.abort(404)
+    if not status.completed or not status.resumable:
+        # the previous search is still running, or its state is gone
+        return flask.jsonify({'session_id': session_id, 'resumed': False})
+
+    data = flask.request.json
+    resumed = utils.resume_problem_request(
+        session_id,
+        client=data.get('client_id') or flask.request.remote_addr,
+        time_limit=float(data['timeout']),
+        number_of_solutions=int(data['sol_num']))
+
+    return flask.jsonify({'session_id': session_id, 'resumed': resumed})
+
+
+def _compact_response(data):
+    """Encodes data for the client, or answers 304 if it already has it.
+
+    data is sent in msgpack if the client accepts it and msgpack is
+    installed, else in JSON without whitespace, and is gzip-ed if the client
+    accepts it. The ETag is computed from the encoded data.
+    """
+    request = flask.request
+    mimetypes = ['application/json', MSGPACK_MIMETYPE]
+    if (msgpack is not None and
+            request.accept_mimetypes.best_match(mimetypes) == MSGPACK_MIMETYPE):
+        body = msgpack.packb(data)
+        mimetype = MSGPACK_MIMETYPE
+    else:
+        body = json.dumps(data, separators=(',', ':')).encode()
+        mimetype = 'application/json'
+
+    response = flask.Response(body, mimetype=mimetype)
+    response.add_etag()
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    if 'gzip' in request.accept_encodings and len(body) >= GZIP_MIN_SIZE:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        # a compressed response is a different representation
+        etag, _ = response.get_etag()
+        response.set_etag(etag + '-gzip')
+    return response.make_conditional(request)
 
 
 @INTENT.app.route('/poll/<int:session_id>',
@@ -66,6 +158,10 @@ def solve():
 @flask_cors.cross_origin()
 def poll(session_id):
     """
+    request arguments:
+        since: int, // number of solutions already received, 0 by default
+        graphs_since: int, // graphs cursor of the previous response
+
     response:
     {        
         'completed': bool,
@@ -91,39 +187,78 @@ def poll(session_id):
             'example1': {...},
             ...,
         }
+        'graphs_ready': {
+            'solution0': bool, // false while its graphs are being traced
+            'solution1': bool,
+            ...,
+        }
+        'cursor': {
+            'since': int,
+            'graphs_since': int,
+        }
+        'queue': { // null unless the search waits for a solver
+            'position': int, // number of searches starting before it
+            'estimated_start': double, // estimated seconds until it starts
+        }
     }
+
+    Only the solutions from index since on, and the graphs of the solutions
+    from index graphs_since on, are returned, so polls send the cursor of
+    the previous response to only get what is new. Graphs can be sent twice
+    when they are traced out of order. Polls without a cursor get
+    everything.
+
+    The response has an ETag and is answered with 304 Not Modified if
+    nothing changed. It is gzip-ed if accepted, and encoded with msgpack
+    for requests accepting application/msgpack when msgpack is installed.
     """
-    session_info = session.global_session_dict[session_id]
-    solutions = session_info.response.solutions
-    graphs = session_info.response.graphs
-    inputs_list = session_info.inputs_list
-    n_unprocessed = len(session_info.asyn.solutions)
-    n_processed = len(session_info.response.solutions)
-    
-    session_info.response.completed = session_info.solver_completed
+    with metrics.REQUEST_LATENCY.time('poll'):
+        status = session.store.get_status(session_id)
+        if status is None:
+            flask.abort(404)
+        since = flask.request.args.get('since', 0, type=int)
+        graphs_since = flask.request.args.get('graphs_since', 0, type=int)
+        return _compact_response(utils.get_poll_response(
+            session_id, status, max(0, since), max(0, graphs_since))._asdict())
 
-    # conduct data provenance trace when new unprocessed solutions are found
-    for i in range(n_processed, n_unprocessed):
-        unprocessed_solution = \
-            session_info.asyn.solutions[i]
 
-        solutions[f'solution{i}'] = \
-            session.Solution(unprocessed_solution.expression,
-                             unprocessed_solution.weight,
-                             round(unprocessed_solution.time, 2))._asdict()
+@INTENT.app.route('/stream/<int:session_id>',
+                     methods=['GET'])
+@flask_cors.cross_origin()
+def stream(session_id):
+    """
+    request arguments:
+        since: int, // index of the first solution to send, 0 by default
+
+    Pushes the results of a session as Server-Sent Events instead of
+    re-sending everything on each /poll:
 
-        for j, inputs in enumerate(inputs_list):
-            value = dataflow.value_from_different_inputs(
-                    unprocessed_solution.value, inputs)
+        event: solution
+        data: {'index': int, 'expression': str, 'weight': int, 'time': double}
 
-            nodes, edges, trace_edges = \
-                dataflow.dataflow_generator(value)
+        event: graphs
+        data: {'index': int, 'graphs': {'example0': {'nodes': {...},
+                                                     'edges': {...},
+                                                     'trace_edges': {...}},
+                                        'example1': {...}, ...}}
 
-            graphs[f'example{j}'][f'solution{i}'] = \
-                session.Graph(nodes, edges, trace_edges)._asdict()
+        event: completed
+        data: {'num_solutions': int, 'resumable': bool}
 
-    # print(session_info.response.completed)
-    return flask.jsonify(session_info.response._asdict())
+    The graphs of a solution are sent once traced, after the solution and
+    possibly after later solutions. The stream ends after the completed
+    event; after /resume, a new stream with since set to num_solutions
+    sends the new solutions only.
+    """
+    if not session.store.exists(session_id):
+        flask.abort(404)
+    since = flask.request.args.get('since', 0, type=int)
+    return flask.Response(
+        flask.stream_with_context(utils.stream_events(session_id, since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache',
+                 # send each event through proxies without buffering
+                 'X-Accel-Buffering': 'no'})
 
 
 @INTENT.app.route('/abort/<int:session_id>',
@@ -131,11 +266,9 @@ def poll(session_id):
 @flask_cors.cross_origin()
 def abort(session_id):
     # aborting an unexsiting session_id has no effects
-    if session_id in session.global_session_dict:
-        session_info = session.global_session_dict[session_id]
-        session_info.asyn.aborted = True
-    # colab_interface.run_value_search_from_colab (in solver thread)
-    # will terminate immediately and session_id will be poped after 5s
+    if session.store.exists(session_id):
+        # the solver service stops the search within a second
+        utils.abort_problem(session_id)
     return ''
 
 
@@ -149,6 +282,8 @@ def validate():
         'inputs': {...}, // the same structure as in /solve
         'outputs': {...}, // the same structure as in /solve
         'solutions': {'solution0': str, ...}, 
+        'client_id': str, // optional, a newer /validate with the same
+                          // client_id makes this one answer 409
     }
 
     response:
@@ -170,23 +305,51 @@ def validate():
         'example1': {...},
     }
     """
-    request_data = flask.request.json
-    if 'session_id' not in request_data:
-        asyn_solutions = []
-    else:
-        asyn_solutions = session.global_session_dict[request_data['session_id']].asyn.solutions
+    with metrics.REQUEST_LATENCY.time('validate'):
+        request_data = flask.request.json
+
+        # print(utils.validate_solutions(request_data))
+        return flask.jsonify(utils.validate_solutions(request_data))
 
-    # print(utils.validate_solutions(request_data, asyn_solutions))
-    return flask.jsonify(utils.validate_solutions(request_data, asyn_solutions))
+
+@INTENT.app.route('/ready', methods=['GET'])
+def ready():
+    """
+    response:
+    {
+        'ready': bool, // whether requests are served at steady-state speed
+        'tracing_warmed_up': bool,
+        'solver_workers': int,
+        'solver_workers_ready': int,
+    }
+
+    Answers 503 until the server is warmed up, see INTENT_PREWARM. Without
+    it, the server is ready once the solver processes warmed up and a first
+    /validate traced a solution.
+    """
+    is_ready, readiness = utils.get_readiness()
+    return flask.jsonify(readiness), 200 if is_ready else 503
+
+
+@INTENT.app.route('/metrics', methods=['GET'])
+def metrics_view():
+    """
+    Metrics of this web process in the Prometheus text format: active and
+    queued sessions, solve and first solution latencies, values explored,
+    operation applications, /poll and /validate latencies, tracing times
+    and resident memory. See metrics.py.
+    """
+    utils.update_load_metrics()
+    return flask.Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 ################################################################################
 @INTENT.app.route('/show_dict', methods=['GET'])
 def show_dict():
-    """Get current global dict status (only for test)"""
-    return str(session.global_session_dict)
+    """Get current session ids (only for test)"""
+    return str(session.store.session_ids())
 
 @INTENT.app.route('/clear_dict', methods=['GET'])
 def clear_dict():
-    """Get current global dict status (only for test)"""
-    return str(session.global_session_dict)
+    """Get current session ids (only for test)"""
+    return str(session.store.session_ids())
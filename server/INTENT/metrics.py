@@ -0,0 +1,291 @@
+"""
+Metrics of the INTENT server, in the Prometheus text format.
+
+The metrics are kept in this process and rendered by /metrics, without a
+client library. The solver processes report the statistics of each search
+once it stops, aggregated per operation and per weight, so searches don't
+pay for metrics on every operation application.
+
+Each web process has its own metrics; the search metrics are recorded by the
+process running the solver service, which serves them itself when it runs
+on its own, see serve().
+"""
+import http.server
+import math
+import resource
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# buckets of the histograms of request latencies, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# buckets of the histograms of search times, in seconds
+SEARCH_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    """A metric with one value per combination of label values."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _samples(self) -> List[Tuple[str, Tuple, float]]:
+        """Returns the (suffix, label values, value) of each sample."""
+        with self._lock:
+            return [('', labels, value)
+                    for labels, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self._samples():
+            names = self.labels + ('le',) * (len(labels) - len(self.labels))
+            lines.append(f'{self.name}{suffix}'
+                         f'{_format_labels(names, labels)} '
+                         f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value set when it changes, or read by a function on each render."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = (),
+                 function: Callable[[], float] = None):
+        super().__init__(name, documentation, labels)
+        self._function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def _samples(self):
+        if self._function is not None:
+            self.set(self._function())
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # one count per bucket, then the sum
+                counts = self._values[labels] = [0] * len(self.buckets) + [0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-1] += value
+
+    def time(self, *labels: str) -> '_Timer':
+        """Returns a context manager observing the time spent in it."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for labels, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(('_bucket', labels + (_format_value(bound),),
+                                    cumulative))
+                samples.append(('_sum', labels, counts[-1]))
+                samples.append(('_count', labels, cumulative))
+        return samples
+
+
+class _Timer(object):
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start,
+                                *self._labels)
+
+
+def resident_memory_bytes() -> float:
+    """Returns the resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # the peak instead, where /proc is missing; in kilobytes on Linux
+        # and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_registry = []  # type: List[_Metric]
+_registry_lock = threading.Lock()
+
+
+def register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Returns all registered metrics in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return ''.join(metric.render() for metric in metrics)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int) -> None:
+    """Serves /metrics on port, on a thread, for processes without Flask."""
+    server = http.server.ThreadingHTTPServer(('', port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def record_search(statistics: Dict) -> None:
+    """Records the statistics of a search sent by a solver process.
+
+    statistics is the dict of solver_pool.search_statistics.
+    """
+    elapsed_time = statistics['elapsed_time']
+    num_values = sum(statistics['values_by_weight'])
+    SEARCH_TIME.inc(elapsed_time)
+    SEARCH_VALUES.inc(num_values)
+    if elapsed_time > 0:
+        SEARCH_VALUES_PER_SECOND.observe(num_values / elapsed_time)
+    for weight, count in enumerate(statistics['values_by_weight']):
+        if count:
+            VALUES_BY_WEIGHT.inc(count, str(weight))
+    for name, (count, successes, apply_time) in \
+            statistics['operations'].items():
+        OPERATION_APPLICATIONS.inc(count, name)
+        OPERATION_SUCCESSES.inc(successes, name)
+        OPERATION_TIME.inc(apply_time, name)
+
+
+PROCESS_RESIDENT_MEMORY = register(Gauge(
+    'intent_process_resident_memory_bytes',
+    'Resident memory size of the web process in bytes.',
+    function=resident_memory_bytes))
+ACTIVE_SESSIONS = register(Gauge(
+    'intent_active_sessions',
+    'Sessions whose search is queued or running.'))
+QUEUED_SEARCHES = register(Gauge(
+    'intent_queued_searches',
+    'Searches waiting for a solver process.'))
+RUNNING_SEARCHES = register(Gauge(
+    'intent_running_searches',
+    'Searches running in a solver process.'))
+REFUSED_SEARCHES = register(Counter(
+    'intent_refused_searches_total',
+    'Searches refused because the solvers were busy.'))
+SOLVE_LATENCY = register(Histogram(
+    'intent_solve_latency_seconds',
+    'Seconds from /solve until its search completed.',
+    buckets=SEARCH_BUCKETS))
+FIRST_SOLUTION_LATENCY = register(Histogram(
+    'intent_first_solution_latency_seconds',
+    'Seconds from /solve until the first solution was found.',
+    buckets=SEARCH_BUCKETS))
+SOLUTION_CACHE_HITS = register(Counter(
+    'intent_solution_cache_hits_total',
+    'Searches answered from the solution cache without searching.'))
+SEARCH_TIME = register(Counter(
+    'intent_search_seconds_total',
+    'Seconds spent searching in the solver processes.'))
+SEARCH_VALUES = register(Counter(
+    'intent_search_values_total',
+    'Values explored by the searches.'))
+SEARCH_VALUES_PER_SECOND = register(Histogram(
+    'intent_search_values_per_second',
+    'Values explored per second by each search.',
+    buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)))
+VALUES_BY_WEIGHT = register(Counter(
+    'intent_search_values_by_weight_total',
+    'Values explored by the searches, by weight.',
+    labels=['weight']))
+OPERATION_APPLICATIONS = register(Counter(
+    'intent_operation_applications_total',
+    'Applications of each operation in the searches.',
+    labels=['operation']))
+OPERATION_SUCCESSES = register(Counter(
+    'intent_operation_successes_total',
+    'Successful applications of each operation in the searches.',
+    labels=['operation']))
+OPERATION_TIME = register(Counter(
+    'intent_operation_seconds_total',
+    'Seconds spent applying each operation in the searches.',
+    labels=['operation']))
+REQUEST_LATENCY = register(Histogram(
+    'intent_request_latency_seconds',
+    'Seconds spent answering requests, by endpoint.',
+    labels=['endpoint']))
+TRACE_TIME = register(Histogram(
+    'intent_trace_seconds',
+    'Seconds spent tracing the dataflow graph of a solution on one example.'))
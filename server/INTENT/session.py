@@ -1,12 +1,72 @@
-from typing import Dict, Text, Union, Tuple
+"""
+Session state of the INTENT server.
+
+Sessions are kept in a SessionStore. The web side creates sessions, queues
+jobs for the solver service and reads the sessions to answer /poll. The
+solver service takes the jobs, adds solutions and updates the status of the
+sessions, see solver_service. InMemorySessionStore keeps sessions in the
+server process. SqliteSessionStore keeps them in a database file, so several
+web worker processes and the solver service can share them. Set
+INTENT_SESSION_DB to the path of the database to use it.
+
+Session ids are random, so sessions created at the same time by different
+processes get different ids.
+
+/stream waits for changes of a session with wait_for_update. The in-memory
+store wakes it up as soon as the solver side writes; stores shared across
+processes can't be notified, so it looks at the session again periodically.
+"""
+import json
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
 from collections import defaultdict, namedtuple
-from tf_coder import asyn_utils
 
 Solution = namedtuple('Solution', ['expression', 'weight', 'time'])
 Graph = namedtuple('Graph', ['nodes', 'edges', 'trace_edges'])
 
 Validation = namedtuple('Validation', ['match', 'exception', 'eval_output', 'graphs'])
 
+# completed: whether the search finished
+# resumable: whether a solver process keeps the search state for /resume
+# abort_requested: whether /abort was called for the running search
+# expires_at: time.time() after which the session is removed, None while
+#     solving
+# admitted: whether the solver service accepted the last job of the session
+# retry_after: seconds after which to retry a search the solver service
+#     refused because it was busy, None otherwise
+# queue_position: number of searches starting before the search of the
+#     session, None unless it waits for a solver process
+# queue_wait: estimated seconds until the search starts, None unless it waits
+Status = namedtuple('Status', ['completed', 'resumable', 'abort_requested',
+                               'expires_at', 'admitted', 'retry_after',
+                               'queue_position', 'queue_wait'])
+
+NEW_STATUS = Status(completed=False, resumable=False, abort_requested=False,
+                    expires_at=None, admitted=False, retry_after=None,
+                    queue_position=None, queue_wait=None)
+
+# A /solve or /resume queued for the solver service. kind is
+# solver_pool.SOLVE or solver_pool.RESUME, spec the solve_coalescer digest of
+# a /solve, client_id and client identify the user, and kwargs are the
+# arguments of utils.solve_problem or utils.resume_problem.
+JobRequest = namedtuple('JobRequest', ['kind', 'session_id', 'spec',
+                                       'client_id', 'client', 'kwargs'])
+
+# seconds a finished session is kept before the janitor removes it
+WAITTIME = 20 * 60
+# session ids fit in a JavaScript number
+SESSION_ID_BITS = 53
+
+# seconds between two removals of expired sessions
+JANITOR_INTERVAL = 60
+# seconds between two reads of a session that can't notify its changes
+UPDATE_CHECK_INTERVAL = 0.5
+
 
 class Response(object):
 
@@ -14,22 +74,418 @@ class Response(object):
         self.completed = False
         self.solutions = dict()
         self.graphs = defaultdict(dict)
+        self.graphs_ready = dict()
+        self.cursor = dict()
+        # position in the solver queue, None once the search started
+        self.queue = None
 
     def _asdict(self):
         return {
             'completed': self.completed,
             'solutions': self.solutions,
-            'graphs': self.graphs
+            'graphs': self.graphs,
+            'graphs_ready': self.graphs_ready,
+            'cursor': self.cursor,
+            'queue': self.queue
         }
 
 
-class Session(object):
+class SessionStore(object):
+    """Stores the inputs, solutions, graphs and status of every session.
+
+    graphs are the dataflow graphs of one solution, a list with the Graph
+    dict of each example.
+    """
+
+    def create(self, inputs_list: List) -> int:
+        """Creates a session with a new random id, and returns the id."""
+        while True:
+            session_id = secrets.randbits(SESSION_ID_BITS)
+            if session_id and self._insert(session_id, inputs_list):
+                return session_id
+
+    def _insert(self, session_id: int, inputs_list: List) -> bool:
+        """Adds a new session, returns False if the id is already used."""
+        raise NotImplementedError()
+
+    def exists(self, session_id: int) -> bool:
+        return self.get_status(session_id) is not None
+
+    def get_inputs_list(self, session_id: int) -> Optional[List]:
+        raise NotImplementedError()
+
+    def add_solution(self, session_id: int,
+                     solution: Solution) -> Optional[int]:
+        """Returns the index of the solution, None if there's no session."""
+        raise NotImplementedError()
+
+    def get_solutions(self, session_id: int,
+                      start: int = 0) -> List[Solution]:
+        """Returns the solutions from index start on."""
+        raise NotImplementedError()
+
+    def set_graphs(self, session_id: int, solution_index: int,
+                   graphs: List[Dict]) -> None:
+        raise NotImplementedError()
+
+    def get_graphs(self, session_id: int,
+                   start: int = 0) -> Dict[int, List[Dict]]:
+        """Returns the graphs computed so far, by solution index.
+
+        Only the graphs of solutions from index start on are returned.
+        """
+        raise NotImplementedError()
+
+    def get_status(self, session_id: int) -> Optional[Status]:
+        """Returns the Status of a session, or None if it does not exist."""
+        raise NotImplementedError()
+
+    def update_status(self, session_id: int, **changes) -> None:
+        """Changes some fields of the Status of a session."""
+        raise NotImplementedError()
+
+    def remove_expired(self, now: float) -> None:
+        """Removes the sessions whose expiry time has passed."""
+        raise NotImplementedError()
+
+    def session_ids(self) -> List[int]:
+        raise NotImplementedError()
+
+    def get_version(self, session_id: int) -> int:
+        """Returns a number that changes whenever the session changes."""
+        return 0
+
+    def wait_for_update(self, session_id: int, version: int,
+                        timeout: float) -> None:
+        """Blocks until the version of the session differs from version.
+
+        Returns after timeout seconds at most. It may return earlier
+        without any change, so the caller reads the session again.
+        """
+        time.sleep(min(timeout, UPDATE_CHECK_INTERVAL))
+
+    def enqueue_job(self, job: JobRequest) -> None:
+        """Queues a job for the solver service."""
+        raise NotImplementedError()
+
+    def take_jobs(self) -> List[JobRequest]:
+        """Removes the queued jobs and returns them, oldest first."""
+        raise NotImplementedError()
+
+    def wait_for_jobs(self, timeout: float) -> None:
+        """Blocks until a job may be queued, timeout seconds at most."""
+        time.sleep(min(timeout, UPDATE_CHECK_INTERVAL))
+
+    def set_solver_state(self, state: Dict) -> None:
+        """Publishes the state of the solver service, see solver_service."""
+        raise NotImplementedError()
+
+    def get_solver_state(self) -> Optional[Dict]:
+        """Returns the last published state of the solver service, if any."""
+        raise NotImplementedError()
+
+
+class _MemorySession(object):
+
+    def __init__(self, inputs_list):
+        self.inputs_list = inputs_list
+        self.solutions = []
+        self.graphs = {}
+        self.status = NEW_STATUS
+        self.version = 0
+
+
+class InMemorySessionStore(SessionStore):
+    """Keeps sessions in the memory of the server process."""
 
     def __init__(self):
-        self.asyn = asyn_utils.Asyn()
-        self.solver_completed = False
-        self.response = Response()  # /poll response
-        self.inputs_list = []
+        self._sessions: Dict[int, _MemorySession] = {}
+        self._jobs: List[JobRequest] = []
+        self._solver_state = None
+        # notified whenever a session changes or a job is queued
+        self._lock = threading.Condition()
+
+    def _changed(self, session_info):
+        """Wakes up the waiters of a session. Requires the lock."""
+        session_info.version += 1
+        self._lock.notify_all()
+
+    def _insert(self, session_id, inputs_list):
+        with self._lock:
+            if session_id in self._sessions:
+                return False
+            self._sessions[session_id] = _MemorySession(inputs_list)
+            return True
+
+    def get_inputs_list(self, session_id):
+        with self._lock:
+            session_info = self._sessions.get(session_id)
+            return session_info.inputs_list if session_info else None
+
+    def add_solution(self, session_id, solution):
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+            session_info = self._sessions[session_id]
+            session_info.solutions.append(solution)
+            self._changed(session_info)
+            return len(session_info.solutions) - 1
+
+    def get_solutions(self, session_id, start=0):
+        with self._lock:
+            session_info = self._sessions.get(session_id)
+            return session_info.solutions[start:] if session_info else []
+
+    def set_graphs(self, session_id, solution_index, graphs):
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id].graphs[solution_index] = graphs
+                self._changed(self._sessions[session_id])
+
+    def get_graphs(self, session_id, start=0):
+        with self._lock:
+            session_info = self._sessions.get(session_id)
+            if session_info is None:
+                return {}
+            return {solution_index: graphs for solution_index, graphs
+                    in session_info.graphs.items() if solution_index >= start}
+
+    def get_status(self, session_id):
+        with self._lock:
+            session_info = self._sessions.get(session_id)
+            return session_info.status if session_info else None
+
+    def update_status(self, session_id, **changes):
+        with self._lock:
+            if session_id in self._sessions:
+                session_info = self._sessions[session_id]
+                session_info.status = session_info.status._replace(**changes)
+                self._changed(session_info)
+
+    def remove_expired(self, now):
+        with self._lock:
+            for session_id, session_info in list(self._sessions.items()):
+                expires_at = session_info.status.expires_at
+                if expires_at is not None and expires_at <= now:
+                    del self._sessions[session_id]
+                    self._changed(session_info)
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def get_version(self, session_id):
+        with self._lock:
+            session_info = self._sessions.get(session_id)
+            return session_info.version if session_info else -1
+
+    def wait_for_update(self, session_id, version, timeout):
+        with self._lock:
+            self._lock.wait_for(
+                lambda: (session_id not in self._sessions or
+                         self._sessions[session_id].version != version),
+                timeout)
+
+    def enqueue_job(self, job):
+        with self._lock:
+            self._jobs.append(job)
+            self._lock.notify_all()
+
+    def take_jobs(self):
+        with self._lock:
+            jobs, self._jobs = self._jobs, []
+            return jobs
+
+    def wait_for_jobs(self, timeout):
+        with self._lock:
+            self._lock.wait_for(lambda: self._jobs, timeout)
+
+    def set_solver_state(self, state):
+        with self._lock:
+            self._solver_state = dict(state)
+
+    def get_solver_state(self):
+        with self._lock:
+            return self._solver_state
+
+
+class SqliteSessionStore(SessionStore):
+    """Keeps sessions in a SQLite database shared by several processes."""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, timeout=30,
+                                           check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            # readers do not wait for the solver's writes
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'session_id INTEGER PRIMARY KEY, inputs_list BLOB NOT NULL, '
+                'completed INTEGER NOT NULL, resumable INTEGER NOT NULL, '
+                'abort_requested INTEGER NOT NULL, expires_at REAL, '
+                'admitted INTEGER NOT NULL, retry_after REAL, '
+                'queue_position INTEGER, queue_wait REAL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS solutions ('
+                'session_id INTEGER NOT NULL, solution_index INTEGER NOT NULL, '
+                'expression TEXT NOT NULL, weight INTEGER NOT NULL, '
+                'time REAL NOT NULL, graphs TEXT, '
+                'PRIMARY KEY (session_id, solution_index))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'job BLOB NOT NULL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS solver_state ('
+                'id INTEGER PRIMARY KEY CHECK (id = 0), state TEXT NOT NULL)')
+
+    def _execute(self, sql, parameters=()):
+        with self._lock, self._connection:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _insert(self, session_id, inputs_list):
+        try:
+            self._execute(
+                'INSERT INTO sessions (session_id, inputs_list, '
+                f'{", ".join(Status._fields)}) VALUES '
+                f'(?, ?, {", ".join("?" * len(Status._fields))})',
+                # inputs hold NumPy arrays and dtypes, which JSON can't
+                # encode; only the server writes them, so they are safe to
+                # unpickle
+                (session_id, pickle.dumps(inputs_list)) + tuple(NEW_STATUS))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def get_inputs_list(self, session_id):
+        rows = self._execute(
+            'SELECT inputs_list FROM sessions WHERE session_id = ?',
+            (session_id,))
+        return pickle.loads(rows[0][0]) if rows else None
+
+    def add_solution(self, session_id, solution):
+        # the index is computed in the same statement, so concurrent
+        # writers can't use the same index
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO solutions '
+                'SELECT session_id, (SELECT COUNT(*) FROM solutions '
+                'WHERE session_id = ?), ?, ?, ?, NULL FROM sessions '
+                'WHERE session_id = ?',
+                (session_id, solution.expression, solution.weight,
+                 solution.time, session_id))
+            if not cursor.rowcount:
+                return None
+            return self._connection.execute(
+                'SELECT solution_index FROM solutions WHERE rowid = ?',
+                (cursor.lastrowid,)).fetchone()[0]
+
+    def get_solutions(self, session_id, start=0):
+        rows = self._execute(
+            'SELECT expression, weight, time FROM solutions '
+            'WHERE session_id = ? AND solution_index >= ? '
+            'ORDER BY solution_index', (session_id, start))
+        return [Solution(*row) for row in rows]
+
+    def set_graphs(self, session_id, solution_index, graphs):
+        self._execute(
+            'UPDATE solutions SET graphs = ? '
+            'WHERE session_id = ? AND solution_index = ?',
+            (json.dumps(graphs), session_id, solution_index))
+
+    def get_graphs(self, session_id, start=0):
+        rows = self._execute(
+            'SELECT solution_index, graphs FROM solutions '
+            'WHERE session_id = ? AND solution_index >= ? '
+            'AND graphs IS NOT NULL', (session_id, start))
+        return {solution_index: json.loads(graphs)
+                for solution_index, graphs in rows}
+
+    def get_status(self, session_id):
+        rows = self._execute(
+            f'SELECT {", ".join(Status._fields)} '
+            'FROM sessions WHERE session_id = ?', (session_id,))
+        if not rows:
+            return None
+        status = Status(*rows[0])
+        return status._replace(
+            completed=bool(status.completed),
+            resumable=bool(status.resumable),
+            abort_requested=bool(status.abort_requested),
+            admitted=bool(status.admitted))
+
+    def update_status(self, session_id, **changes):
+        if not changes:
+            return
+        for field in changes:
+            if field not in Status._fields:
+                raise ValueError(f'Unknown status field {field}')
+        assignments = ', '.join(f'{field} = ?' for field in changes)
+        self._execute(
+            f'UPDATE sessions SET {assignments} WHERE session_id = ?',
+            tuple(changes.values()) + (session_id,))
+
+    def remove_expired(self, now):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM solutions WHERE session_id IN ('
+                'SELECT session_id FROM sessions WHERE expires_at <= ?)',
+                (now,))
+            self._connection.execute(
+                'DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def session_ids(self):
+        return [row[0] for row in
+                self._execute('SELECT session_id FROM sessions')]
+
+    def enqueue_job(self, job):
+        self._execute('INSERT INTO jobs (job) VALUES (?)',
+                      (pickle.dumps(job),))
+
+    def take_jobs(self):
+        with self._lock, self._connection:
+            # take the jobs in one write transaction, so each job is taken
+            # once
+            self._connection.execute('BEGIN IMMEDIATE')
+            rows = self._connection.execute(
+                'SELECT job_id, job FROM jobs ORDER BY job_id').fetchall()
+            if rows:
+                self._connection.execute(
+                    'DELETE FROM jobs WHERE job_id <= ?', (rows[-1][0],))
+        return [pickle.loads(job) for _, job in rows]
+
+    def set_solver_state(self, state):
+        self._execute('INSERT OR REPLACE INTO solver_state VALUES (0, ?)',
+                      (json.dumps(state),))
+
+    def get_solver_state(self):
+        rows = self._execute('SELECT state FROM solver_state')
+        return json.loads(rows[0][0]) if rows else None
+
+
+def create_store():
+    """Creates the store selected by the INTENT_SESSION_DB variable."""
+    path = os.environ.get('INTENT_SESSION_DB')
+    if path:
+        return SqliteSessionStore(path)
+    return InMemorySessionStore()
+
+
+store: SessionStore = create_store()
+
+_janitor = None
+
+
+def _janitor_loop():
+    while True:
+        time.sleep(JANITOR_INTERVAL)
+        store.remove_expired(time.time())
 
 
-global_session_dict: Dict[int, Session] = defaultdict(Session)
+def start_janitor():
+    """Starts the thread removing expired sessions, if not started yet."""
+    global _janitor
+    if _janitor is None:
+        _janitor = threading.Thread(target=_janitor_loop, daemon=True)
+        _janitor.start()
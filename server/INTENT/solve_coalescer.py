@@ -0,0 +1,139 @@
+"""
+Sharing of searches between identical /solve requests.
+
+Sessions that send the same /solve while a search for it is running
+subscribe to that search instead of starting another one, and receive all
+of its solutions and graphs. A search is identified by the id of the
+session that started it, which the solver pool uses as its job id.
+
+The coalescer also remembers the latest session of each client, so a new
+/solve from a client can abort the search the client no longer looks at.
+"""
+import collections
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional
+
+# keys of a /solve request that define the search
+SPEC_KEYS = ['inputs', 'outputs', 'constraints', 'description',
+             'desired_op', 'undesired_op', 'timeout', 'sol_num']
+# number of clients whose latest session is remembered
+MAX_CLIENTS = 4096
+
+
+def spec_digest(request_data: Dict) -> str:
+    """Returns a digest of the parts of a /solve request defining the search."""
+    spec = {key: request_data.get(key) for key in SPEC_KEYS}
+    return hashlib.sha1(
+        json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class _Search(object):
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.session_ids = []
+        self.finished = False
+        self.num_solutions = 0
+        self.num_graphs = 0
+
+
+class SolveCoalescer(object):
+    """Tracks the sessions subscribed to each search.
+
+    lock must be held while copying or fanning out results, so a session
+    subscribing while a solution is reported receives it exactly once.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # search id -> _Search, until the search and its graphs are done
+        self._searches = {}
+        # spec digest -> id of the running search
+        self._running = {}
+        # session id -> search id
+        self._search_ids = {}
+        # client id -> latest session id
+        self._latest_sessions = collections.OrderedDict()
+
+    def join(self, spec: str, session_id: int) -> Optional[int]:
+        """Subscribes a session to the running search with the same spec.
+
+        Returns the id of that search, or None if there is none. In that
+        case the session starts a new search whose id is the session id.
+        """
+        with self.lock:
+            search_id = self._running.get(spec)
+            if search_id is None:
+                search_id = session_id
+                self._running[spec] = search_id
+                self._searches[search_id] = _Search(spec)
+            search = self._searches[search_id]
+            search.session_ids.append(session_id)
+            self._search_ids[session_id] = search_id
+            return search_id if search_id != session_id else None
+
+    def search_id(self, session_id: int) -> int:
+        with self.lock:
+            return self._search_ids.get(session_id, session_id)
+
+    def subscribers(self, search_id: int) -> List[int]:
+        """Returns the sessions receiving the results of a search."""
+        with self.lock:
+            search = self._searches.get(search_id)
+            # resumed searches are not shared
+            return list(search.session_ids) if search else [search_id]
+
+    def leave(self, session_id: int) -> None:
+        """Unsubscribes a session from its search."""
+        with self.lock:
+            search_id = self._search_ids.pop(session_id, session_id)
+            search = self._searches.get(search_id)
+            if search and session_id in search.session_ids:
+                search.session_ids.remove(session_id)
+
+    def add_solution(self, search_id: int) -> None:
+        with self.lock:
+            search = self._searches.get(search_id)
+            if search:
+                search.num_solutions += 1
+
+    def add_graphs(self, search_id: int) -> None:
+        with self.lock:
+            search = self._searches.get(search_id)
+            if search:
+                search.num_graphs += 1
+                self._forget_if_done(search_id)
+
+    def stop_sharing(self, search_id: int) -> None:
+        """Stops new sessions from subscribing to a search."""
+        with self.lock:
+            search = self._searches.get(search_id)
+            if search and self._running.get(search.spec) == search_id:
+                del self._running[search.spec]
+
+    def finish(self, search_id: int) -> None:
+        """Records that a search ended."""
+        with self.lock:
+            self.stop_sharing(search_id)
+            if search_id in self._searches:
+                self._searches[search_id].finished = True
+                self._forget_if_done(search_id)
+
+    def _forget_if_done(self, search_id: int) -> None:
+        """Drops a search once it ended and all its graphs were sent."""
+        search = self._searches[search_id]
+        if search.finished and search.num_graphs >= search.num_solutions:
+            del self._searches[search_id]
+            for session_id in search.session_ids:
+                self._search_ids.pop(session_id, None)
+
+    def replace_latest(self, client_id: str, session_id: int) -> Optional[int]:
+        """Records the latest session of a client, returns the previous one."""
+        with self.lock:
+            previous = self._latest_sessions.pop(client_id, None)
+            self._latest_sessions[client_id] = session_id
+            while len(self._latest_sessions) > MAX_CLIENTS:
+                self._latest_sessions.popitem(last=False)
+            return previous
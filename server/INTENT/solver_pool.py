@@ -0,0 +1,558 @@
+"""
+Pool of solver processes for the INTENT server.
+
+Searches run in a bounded number of spawned worker processes instead of one
+thread per request, so they use several cores and do not hold the GIL of the
+web server. Each worker warms up TF-Coder once and then runs jobs one at a
+time. Solutions are sent back to the server process through a queue as soon
+as the search records them.
+
+Each worker runs TF with TF_THREADS threads, so the workers share the cores
+instead of each sizing its thread pools to all of them. By default there
+are as many workers as fit in the cores and the memory of the machine.
+
+A worker keeps the search states of its last searches, so /resume jobs are
+sent to the worker that ran the original search.
+
+Jobs are admitted and scheduled in front of the workers. The queue is
+bounded, new searches are refused with Busy when they would wait too long,
+a client runs a bounded number of searches at a time, and searches with
+an earlier deadline, their submission time plus their time limit, start
+first. So short interactive searches pass long ones, and long ones still
+start eventually.
+
+After each job, a worker sends the statistics of the search, aggregated
+per operation and per weight, for the metrics of the server. Searches
+answered from the solution cache are reported as cache hits instead.
+
+Workers are spawned by default. With the forkserver start method, a fork
+server imports TF-Coder once and forks the workers from it, so they share
+the imported modules copy-on-write and start faster. TensorFlow is only
+initialized in the workers, after the fork.
+"""
+import collections
+import heapq
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from tf_coder import asyn_utils
+
+# threads of the TF intra-op and inter-op thread pools of each solver
+# process, so that the processes together don't oversubscribe the cores
+TF_THREADS = int(os.environ.get('INTENT_SOLVER_TF_THREADS', 1))
+# bytes of memory used by each solver process: TF, the description handler
+# and the tensor features model, and the values of its searches
+WORKER_MEMORY = int(os.environ.get('INTENT_SOLVER_WORKER_MEMORY', 2 << 30))
+
+
+def _physical_memory() -> Optional[int]:
+    """Returns the bytes of physical memory, None if unknown."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def default_num_workers() -> int:
+    """Returns as many solver processes as fit in the cores and memory.
+
+    One core is left for the server process, and half the memory for the
+    rest of the machine.
+    """
+    num_workers = max(1, ((os.cpu_count() or 1) - 1) // TF_THREADS)
+    memory = _physical_memory()
+    if memory is not None:
+        num_workers = min(num_workers, memory // 2 // WORKER_MEMORY)
+    return max(1, num_workers)
+
+
+# number of solver processes
+NUM_WORKERS = int(os.environ.get('INTENT_SOLVER_WORKERS', 0)) or \
+    default_num_workers()
+# number of finished searches each worker keeps for /resume
+MAX_SEARCH_STATES = 2
+# seconds between checks that the workers are alive and of abort requests
+LIVENESS_INTERVAL = 1.0
+# 'spawn' or 'forkserver'
+START_METHOD = os.environ.get('INTENT_START_METHOD', 'spawn')
+# modules the fork server imports before forking workers
+PRELOAD_MODULES = ['tf_coder.value_search.colab_interface']
+# number of jobs waiting for a worker beyond which searches are refused
+MAX_PENDING = int(os.environ.get('INTENT_MAX_PENDING', 32))
+# seconds of estimated queue wait beyond which searches are refused
+MAX_QUEUE_WAIT = float(os.environ.get('INTENT_MAX_QUEUE_WAIT', 120))
+# number of jobs of one client running at the same time
+MAX_RUNNING_PER_CLIENT = int(
+    os.environ.get('INTENT_MAX_RUNNING_PER_CLIENT', 1))
+
+# job kinds
+SOLVE = 'solve'
+RESUME = 'resume'
+
+# event kinds, sent from the workers to the server process
+_READY = 'ready'
+_SOLUTION = 'solution'
+_DONE = 'done'
+_STATISTICS = 'statistics'
+_CACHE_HIT = 'cache_hit'
+
+Job = NamedTuple('Job', [
+    ('kind', str),
+    ('session_id', int),
+    ('kwargs', Dict),
+    ('client', Optional[str]),
+    ('submitted_at', float),
+])
+
+QueueInfo = NamedTuple('QueueInfo', [
+    ('position', int),  # number of jobs starting before this one
+    ('estimated_wait', float),  # seconds until it starts
+])
+
+
+class Busy(Exception):
+    """Raised when a search is refused because the solvers are busy."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'The solvers are busy, retry after {retry_after} s')
+        # whole seconds, as in the Retry-After header
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def _time_limit(job: Job) -> float:
+    return float(job.kwargs.get('time_limit', 0))
+
+
+def _deadline(job: Job) -> float:
+    """Jobs with earlier deadlines start first."""
+    return job.submitted_at + _time_limit(job)
+
+
+class _SolutionStream(list):
+    """Solutions of a search, also sent to the server process when added."""
+
+    def __init__(self, session_id, events):
+        super().__init__()
+        self._session_id = session_id
+        self._events = events
+
+    def append(self, solution):
+        super().append(solution)
+        self._events.put((_SOLUTION, self._session_id, solution.expression,
+                          solution.weight, solution.time))
+
+
+class _WorkerAsyn(asyn_utils.Asyn):
+    """Asyn whose abort flag is shared with the server process."""
+
+    def __init__(self, session_id, events, abort_event):
+        # Asyn.__init__ would clear an abort sent before the job started
+        # pylint: disable=super-init-not-called
+        self._abort_event = abort_event
+        self.solutions = _SolutionStream(session_id, events)
+        self.completed = False
+        self.changed = threading.Condition()
+
+    @property
+    def aborted(self):
+        return self._abort_event.is_set()
+
+    @aborted.setter
+    def aborted(self, aborted):
+        if aborted:
+            self._abort_event.set()
+        else:
+            self._abort_event.clear()
+
+
+def search_statistics(state) -> Dict:
+    """Returns the totals of a value_search.SearchState so far.
+
+    The dict has the search time, the number of values of each weight, and
+    the applications, successes and time of each operation, if the search
+    records OperationStatistics.
+    """
+    operations = {}
+    if state.statistics is not None:
+        statistics = state.statistics
+        operations = {
+            name: (statistics.operation_apply_count[name],
+                   statistics.operation_apply_successes[name],
+                   statistics.operation_apply_time[name])
+            for name in statistics.all_operation_names}
+    return {
+        'elapsed_time': state.elapsed_time,
+        'values_by_weight': [len(values) for values in state.values_by_weight],
+        'operations': operations,
+    }
+
+
+def _statistics_difference(after: Dict, before: Optional[Dict]) -> Dict:
+    """Returns the statistics of the part of a search after before."""
+    if before is None:
+        return after
+    no_operation = (0, 0, 0.0)
+    return {
+        'elapsed_time': after['elapsed_time'] - before['elapsed_time'],
+        'values_by_weight': [
+            count - previous for count, previous in zip(
+                after['values_by_weight'], before['values_by_weight'])],
+        'operations': {
+            name: tuple(total - previous for total, previous in zip(
+                totals, before['operations'].get(name, no_operation)))
+            for name, totals in after['operations'].items()},
+    }
+
+
+def _limit_tf_threads() -> None:
+    """Sizes the TF thread pools of this process to TF_THREADS.
+
+    Must run before TF executes its first operation in this process.
+    """
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+    tf.config.threading.set_intra_op_parallelism_threads(TF_THREADS)
+    tf.config.threading.set_inter_op_parallelism_threads(TF_THREADS)
+
+
+def _worker_main(index, jobs, events, abort_event):
+    """Runs jobs in a worker process until it receives None."""
+    _limit_tf_threads()
+    from INTENT import utils  # pylint: disable=import-outside-toplevel
+    utils.warm_up()
+    events.put((_READY, index))
+
+    # session id -> value_search.SearchState, most recently used last
+    search_states = collections.OrderedDict()
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        asyn = _WorkerAsyn(job.session_id, events, abort_event)
+        state = None
+        try:
+            if job.kind == SOLVE:
+                results = utils.solve_problem(asyn=asyn, **job.kwargs)
+                state = results.search_state
+                if state is None:
+                    # answered from the solution cache, without searching
+                    events.put((_CACHE_HIT,))
+                else:
+                    statistics = search_statistics(state)
+            else:
+                state = search_states.pop(job.session_id, None)
+                if state is not None:
+                    before = search_statistics(state)
+                    utils.resume_problem(state, asyn, **job.kwargs)
+                    statistics = _statistics_difference(
+                        search_statistics(state), before)
+            if state is not None:
+                events.put((_STATISTICS, statistics))
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            state = None
+
+        evicted = []
+        if state is not None:
+            search_states[job.session_id] = state
+            while len(search_states) > MAX_SEARCH_STATES:
+                evicted.append(search_states.popitem(last=False)[0])
+        events.put((_DONE, index, job.session_id, state is not None,
+                    evicted))
+
+
+class _Worker(object):
+    """The server-side handle of a worker process."""
+
+    def __init__(self, context, index, events):
+        self.jobs = context.Queue()
+        self.abort_event = context.Event()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(index, self.jobs, events, self.abort_event),
+            daemon=True)
+        self.process.start()
+        # session id of the running job, None if idle
+        self.session_id = None
+        # client, start time and time limit of the running job
+        self.client = None
+        self.started_at = 0.0
+        self.time_limit = 0.0
+
+
+class SolverPool(object):
+    """Runs solve and resume jobs on a bounded pool of worker processes.
+
+    Jobs wait in a queue until a worker is free. Results are reported with the
+    callbacks, which run on a collector thread of the server process:
+      on_solution(session_id, expression, weight, time)
+      on_done(session_id, resumable)
+      on_statistics(statistics), optional, with the search_statistics of
+        each search, or of the resumed part of a resumed search
+      on_cache_hit(), optional, for each search answered from the solution
+        cache
+    The optional should_abort(session_id) callback is checked periodically
+    for queued and running jobs, for aborts requested by other processes.
+
+    client identifies who submitted a job, for the per-client limit.
+    """
+
+    def __init__(self,
+                 on_solution: Callable[[int, str, int, float], None],
+                 on_done: Callable[[int, bool], None],
+                 num_workers: int = NUM_WORKERS,
+                 should_abort: Optional[Callable[[int], bool]] = None,
+                 start_method: str = START_METHOD,
+                 on_statistics: Optional[Callable[[Dict], None]] = None,
+                 on_cache_hit: Optional[Callable[[], None]] = None):
+        self._on_solution = on_solution
+        self._on_done = on_done
+        self._on_statistics = on_statistics
+        self._on_cache_hit = on_cache_hit
+        self._should_abort = should_abort
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._context.set_forkserver_preload(PRELOAD_MODULES)
+        self._events = self._context.Queue()
+        self._lock = threading.Lock()
+        # notified when a worker becomes ready
+        self._ready_changed = threading.Condition(self._lock)
+        # indices of the workers that finished warming up
+        self._ready = set()
+        self._workers = [_Worker(self._context, index, self._events)
+                         for index in range(max(1, num_workers))]
+        self._pending = []  # type: List[Job]
+        # session id -> index of the worker keeping its search state
+        self._state_owners = {}
+        self._collector = threading.Thread(target=self._collect,
+                                           daemon=True)
+        self._collector.start()
+
+    def solve(self, session_id: int, client: Optional[str] = None,
+              **kwargs) -> None:
+        """Queues a new search, see utils.solve_problem for the kwargs.
+
+        Raises:
+            Busy: if the queue is full, or the search would wait more than
+                MAX_QUEUE_WAIT seconds.
+        """
+        job = Job(SOLVE, session_id, kwargs, client, time.time())
+        with self._lock:
+            if len(self._pending) >= MAX_PENDING:
+                raise Busy(self._estimated_wait(job))
+            wait = self._estimated_wait(job)
+            if wait > MAX_QUEUE_WAIT:
+                raise Busy(wait)
+            self._pending.append(job)
+            self._dispatch()
+
+    def resume(self, session_id: int, client: Optional[str] = None,
+               **kwargs) -> bool:
+        """Queues the continuation of a finished search.
+
+        Returns False if no worker keeps the state of the search. Resumed
+        searches are not refused, since their session is already admitted.
+        """
+        with self._lock:
+            if session_id not in self._state_owners:
+                return False
+            self._pending.append(
+                Job(RESUME, session_id, kwargs, client, time.time()))
+            self._dispatch()
+        return True
+
+    def queue_info(self, session_id: int) -> Optional[QueueInfo]:
+        """Returns the queue position of a job, None if it is not queued."""
+        with self._lock:
+            for position, job in enumerate(
+                    sorted(self._pending, key=_deadline)):
+                if job.session_id == session_id:
+                    return QueueInfo(position, self._estimated_wait(job))
+        return None
+
+    def queue_infos(self) -> Dict[int, QueueInfo]:
+        """Returns the QueueInfo of every queued job, by session id."""
+        with self._lock:
+            return {job.session_id: QueueInfo(position,
+                                              self._estimated_wait(job))
+                    for position, job in enumerate(
+                        sorted(self._pending, key=_deadline))}
+
+    def num_workers(self) -> int:
+        return len(self._workers)
+
+    def num_pending(self) -> int:
+        """Returns the number of jobs waiting for a worker."""
+        with self._lock:
+            return len(self._pending)
+
+    def num_running(self) -> int:
+        with self._lock:
+            return sum(1 for worker in self._workers
+                       if worker.session_id is not None)
+
+    def num_ready(self) -> int:
+        """Returns the number of workers that finished warming up."""
+        with self._lock:
+            return len(self._ready)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until all workers are warmed up, returns whether they are."""
+        with self._lock:
+            return self._ready_changed.wait_for(
+                lambda: len(self._ready) == len(self._workers), timeout)
+
+    def is_resumable(self, session_id: int) -> bool:
+        with self._lock:
+            return session_id in self._state_owners
+
+    def abort(self, session_id: int) -> None:
+        """Aborts the queued or running search of a session."""
+        dropped = False
+        with self._lock:
+            for job in list(self._pending):
+                if job.session_id == session_id:
+                    self._pending.remove(job)
+                    dropped = True
+            for worker in self._workers:
+                if worker.session_id == session_id:
+                    worker.abort_event.set()
+        if dropped:
+            self._on_done(session_id, self.is_resumable(session_id))
+
+    def close(self) -> None:
+        """Stops the workers after their current jobs."""
+        with self._lock:
+            self._pending.clear()
+            for worker in self._workers:
+                worker.jobs.put(None)
+
+    def _estimated_wait(self, job: Job) -> float:
+        """Estimates the seconds until a job starts. Requires the lock.
+
+        Running jobs are assumed to use all their time limit, and the jobs
+        with earlier deadlines to start first on the first free worker.
+        """
+        now = time.time()
+        free_times = [
+            max(now, worker.started_at + worker.time_limit)
+            if worker.session_id is not None else now
+            for worker in self._workers]
+        heapq.heapify(free_times)
+        for other in sorted(self._pending, key=_deadline):
+            if other is job or _deadline(other) > _deadline(job):
+                break
+            start = heapq.heappop(free_times)
+            heapq.heappush(free_times, start + _time_limit(other))
+        return free_times[0] - now
+
+    def _dispatch(self) -> None:
+        """Sends pending jobs to idle workers. Requires the lock."""
+        running_per_client = collections.Counter(
+            worker.client for worker in self._workers
+            if worker.session_id is not None and worker.client is not None)
+        for job in sorted(self._pending, key=_deadline):
+            if (job.client is not None and
+                    running_per_client[job.client] >= MAX_RUNNING_PER_CLIENT):
+                continue
+            if job.kind == RESUME:
+                candidates = [self._state_owners.get(job.session_id)]
+            else:
+                candidates = range(len(self._workers))
+            for index in candidates:
+                if index is None:
+                    continue
+                worker = self._workers[index]
+                if worker.session_id is not None:
+                    continue
+                self._pending.remove(job)
+                worker.session_id = job.session_id
+                worker.client = job.client
+                worker.started_at = time.time()
+                worker.time_limit = _time_limit(job)
+                running_per_client[job.client] += 1
+                # the worker must not see an abort of its previous job
+                worker.abort_event.clear()
+                worker.jobs.put(job)
+                break
+
+    def _collect(self) -> None:
+        """Handles events from the workers, and does periodic checks."""
+        last_check_time = time.time()
+        while True:
+            try:
+                event = self._events.get(timeout=LIVENESS_INTERVAL)
+                if event[0] == _SOLUTION:
+                    self._on_solution(*event[1:])
+                elif event[0] == _STATISTICS:
+                    if self._on_statistics is not None:
+                        self._on_statistics(event[1])
+                elif event[0] == _CACHE_HIT:
+                    if self._on_cache_hit is not None:
+                        self._on_cache_hit()
+                elif event[0] == _READY:
+                    with self._lock:
+                        self._ready.add(event[1])
+                        self._ready_changed.notify_all()
+                else:
+                    self._finish(*event[1:])
+            except queue.Empty:
+                pass
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            if time.time() - last_check_time >= LIVENESS_INTERVAL:
+                last_check_time = time.time()
+                try:
+                    self._restart_dead_workers()
+                    self._check_abort_requests()
+                except Exception:  # pylint: disable=broad-except
+                    traceback.print_exc()
+
+    def _check_abort_requests(self) -> None:
+        if self._should_abort is None:
+            return
+        with self._lock:
+            session_ids = set(job.session_id for job in self._pending)
+            session_ids.update(worker.session_id for worker in self._workers
+                               if worker.session_id is not None)
+        for session_id in session_ids:
+            if self._should_abort(session_id):
+                self.abort(session_id)
+
+    def _finish(self, index: int, session_id: int, resumable: bool,
+                evicted: List[int]) -> None:
+        with self._lock:
+            self._workers[index].session_id = None
+            for evicted_session_id in evicted:
+                if self._state_owners.get(evicted_session_id) == index:
+                    del self._state_owners[evicted_session_id]
+            if resumable:
+                self._state_owners[session_id] = index
+            else:
+                self._state_owners.pop(session_id, None)
+            self._dispatch()
+        self._on_done(session_id, resumable)
+
+    def _restart_dead_workers(self) -> None:
+        failed_session_ids = []  # type: List[Optional[int]]
+        with self._lock:
+            for index, worker in enumerate(self._workers):
+                if worker.process.is_alive():
+                    continue
+                failed_session_ids.append(worker.session_id)
+                self._ready.discard(index)
+                self._state_owners = {
+                    session_id: owner
+                    for session_id, owner in self._state_owners.items()
+                    if owner != index}
+                self._workers[index] = _Worker(self._context, index,
+                                               self._events)
+            self._dispatch()
+        for session_id in failed_session_ids:
+            if session_id is not None:
+                self._on_done(session_id, False)
@@ -0,0 +1,292 @@
+"""
+Solver service of the INTENT server.
+
+Web processes only create sessions, queue their /solve and /resume jobs in
+the session store, and read the results from it. The solver service takes
+the jobs from the store, runs them on the one SolverPool of the server, and
+writes the solutions, dataflow graphs and status of the sessions back to the
+store. So there is one pool of solver processes however many web processes
+serve requests, any web process can answer for any session, and the web
+tier can be scaled separately from the solvers.
+
+With INTENT_SOLVER_SERVICE unset or 'local', the web process runs the
+service on a thread. With several web processes, they share a database
+(INTENT_SESSION_DB), set INTENT_SOLVER_SERVICE to 'remote', and the service
+runs on its own:
+
+    python3 -m INTENT.solver_service
+
+The service publishes the state of its solver processes in the store, for
+/ready and /metrics. It serves its own metrics on
+INTENT_SOLVER_METRICS_PORT, if set.
+
+Identical /solve requests share searches, see solve_coalescer, and a new
+/solve of a client aborts the previous search of that client.
+"""
+import os
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from INTENT import metrics
+from INTENT import session
+from INTENT import solve_coalescer
+from INTENT import solver_pool
+from INTENT import trace_pool
+
+# 'local' to run the service in the web process, 'remote' if it runs on its
+# own
+MODE = os.environ.get('INTENT_SOLVER_SERVICE', 'local')
+# port of the /metrics of a service running on its own, none if unset
+METRICS_PORT = int(os.environ.get('INTENT_SOLVER_METRICS_PORT', 0))
+# database of the solutions of previously solved problems, persisted
+# across restarts; relative to the directory of the service
+SOLUTION_CACHE_PATH = os.environ.get('INTENT_SOLUTION_CACHE',
+                                     'solution_cache.sqlite')
+# seconds the service waits for new jobs before its periodic work
+JOB_POLL_INTERVAL = 0.5
+# seconds between two publications of the state of the service
+STATE_INTERVAL = 1.0
+
+
+class SolverService(object):
+    """Runs the jobs queued in the session store on a SolverPool."""
+
+    def __init__(self, store: Optional[session.SessionStore] = None,
+                 num_workers: int = solver_pool.NUM_WORKERS):
+        self._store = store if store is not None else session.store
+        self._solution_cache_path = os.path.abspath(SOLUTION_CACHE_PATH)
+        self._coalescer = solve_coalescer.SolveCoalescer()
+        self._trace_pool = trace_pool.TracePool(self._on_graphs)
+        self.pool = solver_pool.SolverPool(
+            self._on_solution, self._on_done, num_workers=num_workers,
+            should_abort=self._abort_requested,
+            on_statistics=metrics.record_search,
+            on_cache_hit=metrics.SOLUTION_CACHE_HITS.inc)
+        # search id -> time of its /solve, until its first solution and end
+        self._solve_times = {}
+        self._first_solution_pending = set()
+        # search id -> QueueInfo written to the sessions of a queued search
+        self._queue_infos: Dict[int, solver_pool.QueueInfo] = {}
+        self._last_state_time = 0.0
+        self._thread = None
+
+    def start(self) -> None:
+        """Runs the service on a thread of this process."""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        """Takes and runs the queued jobs, forever."""
+        session.start_janitor()
+        while True:
+            try:
+                for job in self._store.take_jobs():
+                    if job.kind == solver_pool.SOLVE:
+                        self._solve(job)
+                    else:
+                        self._resume(job)
+                self._update_queue_infos()
+                if time.time() - self._last_state_time >= STATE_INTERVAL:
+                    self._publish_state()
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            self._store.wait_for_jobs(JOB_POLL_INTERVAL)
+
+    def _solve(self, job: session.JobRequest) -> None:
+        """Starts the search of a new session, or shares a running one."""
+        session_id = job.session_id
+        if job.client_id is not None:
+            previous_session_id = self._coalescer.replace_latest(
+                job.client_id, session_id)
+            if previous_session_id is not None:
+                self._abort(previous_session_id)
+
+        with self._coalescer.lock:
+            search_id = self._coalescer.join(job.spec, session_id)
+            if search_id is not None:
+                # copy the results found so far from another subscriber
+                source = next(subscriber for subscriber
+                              in self._coalescer.subscribers(search_id)
+                              if subscriber != session_id)
+                for solution in self._store.get_solutions(source):
+                    self._store.add_solution(session_id, solution)
+                for index, graphs in self._store.get_graphs(source).items():
+                    self._store.set_graphs(session_id, index, graphs)
+                self._store.update_status(session_id, admitted=True)
+                return
+        try:
+            self._solve_times[session_id] = time.time()
+            self._first_solution_pending.add(session_id)
+            self.pool.solve(session_id, client=job.client,
+                            solution_cache_path=self._solution_cache_path,
+                            **job.kwargs)
+        except solver_pool.Busy as e:
+            metrics.REFUSED_SEARCHES.inc()
+            self._solve_times.pop(session_id, None)
+            self._first_solution_pending.discard(session_id)
+            self._store.update_status(session_id, retry_after=e.retry_after)
+            # also completes the sessions that subscribed in the meantime
+            self._on_done(session_id, False)
+            return
+        self._store.update_status(session_id, admitted=True)
+
+    def _resume(self, job: session.JobRequest) -> None:
+        """Continues the finished search of a session, if it is kept."""
+        session_id = job.session_id
+        if self.pool.is_resumable(session_id):
+            # admitted first: the resumed search may finish at once
+            self._store.update_status(session_id, admitted=True)
+            if self.pool.resume(session_id, client=job.client, **job.kwargs):
+                return
+        self._store.update_status(
+            session_id, completed=True, resumable=False, admitted=False,
+            expires_at=time.time() + session.WAITTIME)
+
+    def _abort(self, session_id: int) -> None:
+        """Aborts the search of a session.
+
+        A search shared with other sessions goes on for them.
+        """
+        search_id = self._coalescer.search_id(session_id)
+        with self._coalescer.lock:
+            subscribers = self._coalescer.subscribers(search_id)
+            if session_id in subscribers and len(subscribers) > 1:
+                self._leave(session_id)
+                return
+            self._coalescer.stop_sharing(search_id)
+        self.pool.abort(search_id)
+
+    def _leave(self, session_id: int) -> None:
+        """Completes a session subscribed to a search shared with others."""
+        self._coalescer.leave(session_id)
+        self._store.update_status(
+            session_id, completed=True, resumable=False,
+            expires_at=time.time() + session.WAITTIME)
+
+    def _abort_requested(self, search_id: int) -> bool:
+        """Whether all sessions subscribed to a search asked to abort it.
+
+        Called periodically by the pool. The sessions that asked to abort a
+        search shared with other sessions leave it.
+        """
+        with self._coalescer.lock:
+            subscribers = self._coalescer.subscribers(search_id)
+            aborting = []
+            for session_id in subscribers:
+                status = self._store.get_status(session_id)
+                if status is None or status.abort_requested:
+                    aborting.append(session_id)
+            if len(aborting) < len(subscribers):
+                for session_id in aborting:
+                    self._leave(session_id)
+                return False
+            self._coalescer.stop_sharing(search_id)
+            return True
+
+    def _on_solution(self, search_id, expression, weight, solution_time):
+        """Adds a solution found by a solver process to the sessions of a
+        search.
+
+        Its dataflow graphs are traced once in the background.
+        """
+        solution = session.Solution(expression, weight, solution_time)
+        solve_time = self._solve_times.get(search_id)
+        if (search_id in self._first_solution_pending and
+                solve_time is not None):
+            self._first_solution_pending.discard(search_id)
+            metrics.FIRST_SOLUTION_LATENCY.observe(time.time() - solve_time)
+        solution_index, traced_session_id = None, None
+        with self._coalescer.lock:
+            for session_id in self._coalescer.subscribers(search_id):
+                index = self._store.add_solution(session_id, solution)
+                if index is not None:
+                    # subscribers have the same solutions, so the same indices
+                    solution_index, traced_session_id = index, session_id
+            if solution_index is not None:
+                self._coalescer.add_solution(search_id)
+        if solution_index is not None:
+            self._trace_pool.submit(
+                search_id, solution_index, expression,
+                self._store.get_inputs_list(traced_session_id) or [])
+
+    def _on_graphs(self, search_id, solution_index, graphs):
+        with self._coalescer.lock:
+            for session_id in self._coalescer.subscribers(search_id):
+                self._store.set_graphs(session_id, solution_index, graphs)
+            self._coalescer.add_graphs(search_id)
+
+    def _on_done(self, search_id, resumable):
+        """Marks the search of the sessions subscribed to a search as
+        finished.
+
+        Only the session that started the search can resume it.
+        """
+        solve_time = self._solve_times.pop(search_id, None)
+        self._first_solution_pending.discard(search_id)
+        if solve_time is not None:
+            metrics.SOLVE_LATENCY.observe(time.time() - solve_time)
+        with self._coalescer.lock:
+            for session_id in self._coalescer.subscribers(search_id):
+                self._store.update_status(
+                    session_id, completed=True,
+                    resumable=resumable and session_id == search_id,
+                    queue_position=None, queue_wait=None,
+                    expires_at=time.time() + session.WAITTIME)
+            self._coalescer.finish(search_id)
+
+    def _update_queue_infos(self) -> None:
+        """Writes the queue position of the queued searches to their
+        sessions.
+
+        The estimated wait is only rewritten when it changes by a second.
+        """
+        queue_infos = self.pool.queue_infos()
+        for search_id in set(self._queue_infos) - set(queue_infos):
+            self._write_queue_info(search_id, None)
+        for search_id, queue_info in queue_infos.items():
+            previous = self._queue_infos.get(search_id)
+            if (previous is not None and
+                    previous.position == queue_info.position and
+                    abs(previous.estimated_wait -
+                        queue_info.estimated_wait) < 1):
+                queue_infos[search_id] = previous
+                continue
+            self._write_queue_info(search_id, queue_info)
+        self._queue_infos = queue_infos
+
+    def _write_queue_info(self, search_id, queue_info):
+        with self._coalescer.lock:
+            for session_id in self._coalescer.subscribers(search_id):
+                self._store.update_status(
+                    session_id,
+                    queue_position=(queue_info.position
+                                    if queue_info is not None else None),
+                    queue_wait=(round(queue_info.estimated_wait, 1)
+                                if queue_info is not None else None))
+
+    def _publish_state(self) -> None:
+        """Publishes the load and the readiness of the solver processes."""
+        self._last_state_time = time.time()
+        self._store.set_solver_state({
+            'num_workers': self.pool.num_workers(),
+            'num_ready': self.pool.num_ready(),
+            'num_pending': self.pool.num_pending(),
+            'num_running': self.pool.num_running(),
+            'updated_at': self._last_state_time,
+        })
+
+
+def main():
+    """Runs the solver service on its own, for INTENT_SOLVER_SERVICE=remote."""
+    if not isinstance(session.store, session.SqliteSessionStore):
+        raise SystemExit('Set INTENT_SESSION_DB to the database shared '
+                         'with the web processes')
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    SolverService().run()
+
+
+if __name__ == '__main__':
+    main()
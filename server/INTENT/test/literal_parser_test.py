@@ -0,0 +1,136 @@
+"""Tests for literal_parser.py."""
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from INTENT import literal_parser
+from INTENT.literal_parser import LiteralError, parse_constants, parse_literal
+
+
+class LiteralParserTest(unittest.TestCase):
+
+    def assert_array(self, value, expected, dtype):
+        self.assertIsInstance(value, np.ndarray)
+        self.assertEqual(value.dtype, dtype)
+        self.assertEqual(value.tolist(), expected)
+
+    def test_scalars(self):
+        for text, expected in [('1', 1), ('-2.5', -2.5), ('True', True),
+                               ("'abc'", 'abc'), ('"abc"', 'abc')]:
+            value = parse_literal(text)
+            self.assertEqual(value, expected)
+            self.assertIs(type(value), type(expected))
+
+    def test_dtypes(self):
+        self.assertEqual(parse_literal('tf.int32'), tf.int32)
+        self.assertEqual(parse_literal(' tf.float32 '), tf.float32)
+        for text in ['tf.int33', 'tf.constant', 'tf.nn']:
+            with self.assertRaises(LiteralError):
+                parse_literal(text)
+
+    def test_lists_get_the_dtype_of_tf_constant(self):
+        self.assert_array(parse_literal('[[1, 2], [3, 4]]'),
+                          [[1, 2], [3, 4]], np.int32)
+        self.assert_array(parse_literal('[0.5, 1]'), [0.5, 1.0], np.float32)
+        self.assert_array(parse_literal('[True, False]'), [True, False],
+                          np.bool_)
+        self.assert_array(parse_literal('(1, 2,)'), [1, 2], np.int32)
+        self.assertEqual(parse_literal("['a', 'bc']").tolist(), ['a', 'bc'])
+
+    def test_tf_constant(self):
+        self.assert_array(parse_literal('tf.constant([1, 2])'), [1, 2],
+                          np.int32)
+        self.assert_array(parse_literal('tf.constant([1, 2], tf.int64)'),
+                          [1, 2], np.int64)
+        self.assert_array(
+            parse_literal('tf.constant([1, 2], dtype=tf.float32)'),
+            [1.0, 2.0], np.float32)
+        self.assert_array(parse_literal('tf.constant(3, tf.int64)'), 3,
+                          np.int64)
+
+    def test_sparse_tensor(self):
+        for text in [
+                'tf.SparseTensor([[0, 0], [1, 2]], [1.5, 2.5], [2, 3])',
+                'tf.SparseTensor(indices=[[0, 0], [1, 2]], '
+                'values=[1.5, 2.5], dense_shape=[2, 3])',
+                'tf.sparse.SparseTensor([[0, 0], [1, 2]], [1.5, 2.5], '
+                'dense_shape=[2, 3])']:
+            value = parse_literal(text)
+            self.assertIsInstance(value, tf.SparseTensor)
+            self.assertEqual(value.indices.numpy().tolist(), [[0, 0], [1, 2]])
+            self.assertEqual(value.values.numpy().tolist(), [1.5, 2.5])
+            self.assertEqual(value.dense_shape.numpy().tolist(), [2, 3])
+        for text in ['tf.SparseTensor([[0, 0]], [1])',
+                     'tf.SparseTensor([[0, 0]], [1], [2, 2], [3])',
+                     'tf.SparseTensor([[0, 0]], [1], shape=[2, 2])']:
+            with self.assertRaises(LiteralError):
+                parse_literal(text)
+
+    def test_int64_overflow(self):
+        self.assert_array(parse_literal('[1, 2147483648]'), [1, 2**31],
+                          np.int64)
+        self.assert_array(parse_literal('[-2147483649]'), [-2**31 - 1],
+                          np.int64)
+        for text in ['[9223372036854775808]', '[18446744073709551616]',
+                     'tf.constant([9223372036854775808])']:
+            with self.assertRaises(LiteralError):
+                parse_literal(text)
+
+    def test_ragged_lists_stay_python_lists(self):
+        self.assertEqual(parse_literal('[[1, 2], [3]]'), [[1, 2], [3]])
+        self.assertEqual(parse_literal('[[1], []]'), [[1], []])
+        with self.assertRaises(LiteralError):
+            parse_literal('[[1, 2], [None]]')
+        with self.assertRaises(LiteralError):
+            parse_literal('tf.constant([[1, 2], [3]])')
+
+    def test_lists_of_tensors(self):
+        value = parse_literal('[tf.constant([1, 2]), tf.constant([3.5])]')
+        self.assertIsInstance(value, list)
+        self.assertEqual(len(value), 2)
+        self.assert_array(value[0], [1, 2], np.int32)
+        self.assert_array(value[1], [3.5], np.float32)
+        self.assertEqual(parse_literal('[tf.int32, 0]'), [tf.int32, 0])
+
+    def test_size_limits(self):
+        with self.assertRaises(LiteralError):
+            parse_literal(' ' * (literal_parser.MAX_LITERAL_LENGTH + 1))
+        with self.assertRaises(LiteralError):
+            parse_literal(str([0] * (literal_parser.MAX_ELEMENTS + 1)))
+        too_deep = 1
+        for _ in range(literal_parser.MAX_NUM_DIMENSIONS + 1):
+            too_deep = [too_deep]
+        with self.assertRaises(LiteralError):
+            parse_literal(str(too_deep))
+        with self.assertRaises(LiteralError):
+            parse_literal(str([[0] * literal_parser.MAX_ELEMENTS, [0]]))
+        with self.assertRaises(LiteralError):
+            parse_literal('[' * 7 + 'tf.int32' + ']' * 7)
+
+    def test_rejects_code(self):
+        for text in ["__import__('os').system('true')",
+                     'tf.constant([1]).numpy()',
+                     'tf.io.read_file("/etc/passwd")',
+                     'tf.constant(__import__("os"))',
+                     '[tf.constant([1]), open("/etc/passwd")]',
+                     'in1.shape',
+                     '{1: 2}',
+                     'None',
+                     'NaN']:
+            with self.assertRaises(LiteralError):
+                parse_literal(text)
+        with self.assertRaises(LiteralError):
+            parse_literal(1)
+
+    def test_parse_constants(self):
+        self.assertEqual(parse_constants('[0, 1.5, tf.int32]'),
+                         [0, 1.5, tf.int32])
+        self.assertEqual(parse_constants('[]'), [])
+        for text in ['0', '[[1, 2]]', '[[[1], []]]', '[tf.constant([1])]']:
+            with self.assertRaises(LiteralError):
+                parse_constants(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for metrics.py."""
+import math
+import re
+import unittest
+
+from INTENT import metrics
+
+_SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)'
+                     r'(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+_UNESCAPES = {'\\\\': '\\', '\\n': '\n', '\\"': '"'}
+
+
+def parse(text):
+    """Parses the Prometheus text format.
+
+    Returns {name: (kind, documentation)} and a list of samples
+    (name, labels dict, value).
+    """
+    families = {}
+    samples = []
+    assert text.endswith('\n')
+    for line in text[:-1].split('\n'):
+        if line.startswith('# HELP '):
+            name, documentation = line[len('# HELP '):].split(' ', 1)
+            families[name] = (None, documentation)
+        elif line.startswith('# TYPE '):
+            name, kind = line[len('# TYPE '):].split(' ')
+            assert name in families, f'TYPE before HELP: {line}'
+            families[name] = (kind, families[name][1])
+        else:
+            match = _SAMPLE.match(line)
+            assert match is not None, f'Invalid sample: {line!r}'
+            labels = {}
+            position = 0
+            text_labels = match.group('labels') or ''
+            while position < len(text_labels):
+                label = _LABEL.match(text_labels, position)
+                assert label is not None, f'Invalid labels: {line!r}'
+                labels[label.group(1)] = re.sub(
+                    r'\\.', lambda m: _UNESCAPES[m.group(0)], label.group(2))
+                position = label.end()
+            samples.append((match.group('name'), labels,
+                            float(match.group('value'))))
+    return families, samples
+
+
+def sample_values(samples, name, **labels):
+    return [value for sample_name, sample_labels, value in samples
+            if sample_name == name and
+            all(sample_labels.get(k) == v for k, v in labels.items())]
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        counter = metrics.Counter('test_total', 'A counter.', labels=['op'])
+        counter.inc(2, 'a')
+        counter.inc(1, 'a')
+        counter.inc(0.5, 'b')
+        gauge = metrics.Gauge('test_gauge', 'A gauge.', function=lambda: 7)
+        families, samples = parse(counter.render() + gauge.render())
+        self.assertEqual(families, {'test_total': ('counter', 'A counter.'),
+                                    'test_gauge': ('gauge', 'A gauge.')})
+        self.assertEqual(sample_values(samples, 'test_total', op='a'), [3])
+        self.assertEqual(sample_values(samples, 'test_total', op='b'), [0.5])
+        self.assertEqual(sample_values(samples, 'test_gauge'), [7])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'A histogram.',
+                                      labels=['endpoint'],
+                                      buckets=(1, 0.1, 10))
+        for value in [0.05, 0.1, 0.5, 5, 50]:
+            histogram.observe(value, 'poll')
+        families, samples = parse(histogram.render())
+        self.assertEqual(families['test_seconds'][0], 'histogram')
+        buckets = [(labels['le'], value) for name, labels, value in samples
+                   if name == 'test_seconds_bucket']
+        self.assertEqual(buckets, [('0.1', 2), ('1', 3), ('10', 4),
+                                   ('+Inf', 5)])
+        for name, labels, _ in samples:
+            self.assertEqual(labels['endpoint'], 'poll')
+        self.assertEqual(sample_values(samples, 'test_seconds_count'), [5])
+        self.assertAlmostEqual(
+            sample_values(samples, 'test_seconds_sum')[0], 55.65)
+
+    def test_histogram_timer(self):
+        histogram = metrics.Histogram('test_timer_seconds', 'A timer.')
+        with histogram.time():
+            pass
+        _, samples = parse(histogram.render())
+        self.assertEqual(sample_values(samples, 'test_timer_seconds_bucket',
+                                       le='+Inf'), [1])
+        self.assertFalse(math.isnan(
+            sample_values(samples, 'test_timer_seconds_sum')[0]))
+
+    def test_labels_are_escaped(self):
+        counter = metrics.Counter('test_escaped_total', 'Escaping.',
+                                  labels=['operation'])
+        name = 'tf.where(x, "a\\b",\n y)'
+        counter.inc(1, name)
+        text = counter.render()
+        self.assertEqual(len(text.rstrip('\n').split('\n')), 3)
+        _, samples = parse(text)
+        self.assertEqual(samples, [('test_escaped_total',
+                                    {'operation': name}, 1)])
+
+    def test_record_search_aggregates_statistics(self):
+        statistics = {
+            'elapsed_time': 2.0,
+            'values_by_weight': [0, 3, 0, 5],
+            'operations': {'tf.add(x, y)': (10, 4, 0.25),
+                           'tf.cast(x, dtype)': (2, 2, 0.5)},
+        }
+        _, before = parse(metrics.render())
+        metrics.record_search(statistics)
+        metrics.record_search(statistics)
+        families, after = parse(metrics.render())
+
+        def delta(name, **labels):
+            return (sum(sample_values(after, name, **labels)) -
+                    sum(sample_values(before, name, **labels)))
+
+        self.assertEqual(families['intent_search_values_total'][0], 'counter')
+        self.assertAlmostEqual(delta('intent_search_seconds_total'), 4.0)
+        self.assertEqual(delta('intent_search_values_total'), 16)
+        self.assertEqual(
+            delta('intent_search_values_by_weight_total', weight='1'), 6)
+        self.assertEqual(
+            delta('intent_search_values_by_weight_total', weight='3'), 10)
+        self.assertEqual(
+            sample_values(after, 'intent_search_values_by_weight_total',
+                          weight='2'), [])
+        self.assertEqual(delta('intent_operation_applications_total',
+                               operation='tf.add(x, y)'), 20)
+        self.assertEqual(delta('intent_operation_successes_total',
+                               operation='tf.cast(x, dtype)'), 4)
+        self.assertAlmostEqual(delta('intent_operation_seconds_total',
+                                     operation='tf.cast(x, dtype)'), 1.0)
+        # 8 values in 2 seconds, twice
+        self.assertEqual(delta('intent_search_values_per_second_bucket',
+                               le='+Inf'), 2)
+        self.assertEqual(delta('intent_search_values_per_second_bucket',
+                               le='100'), 2)
+
+    def test_render_documents_every_sample(self):
+        families, samples = parse(metrics.render())
+        self.assertIn('intent_solution_cache_hits_total', families)
+        for name, _, _ in samples:
+            family = re.sub(r'_(bucket|sum|count)$', '', name)
+            self.assertTrue(name in families or family in families, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
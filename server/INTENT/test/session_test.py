@@ -0,0 +1,210 @@
+"""Tests for the session stores of session.py, in memory and in SQLite."""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from INTENT import session
+from INTENT.session import JobRequest, Solution
+
+
+class StoreTests(object):
+    """Tests run on every SessionStore, see the subclasses."""
+
+    def make_store(self):
+        raise NotImplementedError()
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.make_store()
+
+    def test_create(self):
+        # tuples and bytes do not survive JSON
+        inputs_list = [[[1, 2], (3, 4)], [b'in', 'abc', 2.5]]
+        first = self.store.create(inputs_list)
+        second = self.store.create(inputs_list)
+        self.assertNotEqual(first, second)
+        for session_id in [first, second]:
+            self.assertGreater(session_id, 0)
+            self.assertLess(session_id, 2 ** session.SESSION_ID_BITS)
+        self.assertEqual(self.store.get_inputs_list(first), inputs_list)
+        self.assertEqual(self.store.get_status(first), session.NEW_STATUS)
+        self.assertTrue(self.store.exists(first))
+        self.assertCountEqual(self.store.session_ids(), [first, second])
+        self.assertFalse(self.store.exists(first + second))
+        self.assertIsNone(self.store.get_inputs_list(first + second))
+        self.assertIsNone(self.store.get_status(first + second))
+
+    def test_create_retries_used_ids(self):
+        used = self.store.create([])
+        with mock.patch.object(session.secrets, 'randbits',
+                               side_effect=[used, 0, used + 1]):
+            self.assertEqual(self.store.create([]), used + 1)
+
+    def test_solutions(self):
+        session_id = self.store.create([])
+        solutions = [Solution('tf.add(in1, in2)', 3, 0.5),
+                     Solution('tf.transpose(in1)', 2, 1.25)]
+        for index, solution in enumerate(solutions):
+            self.assertEqual(self.store.add_solution(session_id, solution),
+                             index)
+        self.assertEqual(self.store.get_solutions(session_id), solutions)
+        self.assertEqual(self.store.get_solutions(session_id, 1),
+                         solutions[1:])
+        self.assertEqual(self.store.get_solutions(session_id, 2), [])
+        self.assertIsNone(self.store.add_solution(session_id + 1,
+                                                  solutions[0]))
+        self.assertEqual(self.store.get_solutions(session_id + 1), [])
+
+    def test_graphs(self):
+        session_id = self.store.create([])
+        for index in range(3):
+            self.store.add_solution(session_id, Solution(f'in{index}', 1, 0.0))
+        graphs = [{'nodes': {'n0': {'value': '1'}}, 'edges': [],
+                   'trace_edges': {}}]
+        self.store.set_graphs(session_id, 2, graphs)
+        self.store.set_graphs(session_id, 0, graphs)
+        self.assertEqual(self.store.get_graphs(session_id),
+                         {0: graphs, 2: graphs})
+        self.assertEqual(self.store.get_graphs(session_id, 1), {2: graphs})
+        self.assertEqual(self.store.get_graphs(session_id + 1), {})
+
+    def test_update_status(self):
+        session_id = self.store.create([])
+        version = self.store.get_version(session_id)
+        self.store.update_status(session_id, completed=True, resumable=True,
+                                 expires_at=12.5, queue_position=3)
+        status = self.store.get_status(session_id)
+        self.assertIs(status.completed, True)
+        self.assertIs(status.resumable, True)
+        self.assertIs(status.abort_requested, False)
+        self.assertEqual(status.expires_at, 12.5)
+        self.assertEqual(status.queue_position, 3)
+        self.assertIsNone(status.retry_after)
+        if isinstance(self.store, session.InMemorySessionStore):
+            self.assertNotEqual(self.store.get_version(session_id), version)
+        # updating a removed session does nothing
+        self.store.update_status(session_id + 1, completed=True)
+
+    def test_remove_expired(self):
+        expired = self.store.create([])
+        kept = self.store.create([])
+        running = self.store.create([])
+        self.store.add_solution(expired, Solution('in1', 1, 0.0))
+        self.store.update_status(expired, completed=True, expires_at=10.0)
+        self.store.update_status(kept, completed=True, expires_at=20.0)
+        self.store.remove_expired(15.0)
+        self.assertCountEqual(self.store.session_ids(), [kept, running])
+        self.assertEqual(self.store.get_solutions(expired), [])
+        self.assertIsNone(self.store.get_status(expired))
+
+    def test_janitor_removes_expired_sessions(self):
+        session_id = self.store.create([])
+        self.store.update_status(session_id, expires_at=time.time())
+        with mock.patch.object(session, 'store', self.store), \
+                mock.patch.object(session, 'JANITOR_INTERVAL', 0.01):
+            threading.Thread(target=session._janitor_loop,  # pylint: disable=protected-access
+                             daemon=True).start()
+            deadline = time.time() + 5
+            while self.store.exists(session_id) and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertFalse(self.store.exists(session_id))
+
+    def test_jobs(self):
+        self.assertEqual(self.store.take_jobs(), [])
+        jobs = [JobRequest('solve', 1, 'spec', 'tab', 'tab',
+                           {'inputs_list': [(1, 2)], 'time_limit': 5.0}),
+                JobRequest('resume', 1, None, None, None,
+                           {'time_limit': 1.0})]
+        for job in jobs:
+            self.store.enqueue_job(job)
+        self.assertEqual(self.store.take_jobs(), jobs)
+        self.assertEqual(self.store.take_jobs(), [])
+
+    def test_wait_for_jobs_returns_on_timeout(self):
+        start = time.time()
+        self.store.wait_for_jobs(0.05)
+        self.assertLess(time.time() - start, 5)
+
+    def test_solver_state(self):
+        self.assertIsNone(self.store.get_solver_state())
+        state = {'num_workers': 2, 'num_ready': 1, 'num_pending': 0,
+                 'num_running': 1, 'updated_at': 12.5}
+        self.store.set_solver_state(state)
+        self.assertEqual(self.store.get_solver_state(), state)
+        self.store.set_solver_state(dict(state, num_ready=2))
+        self.assertEqual(self.store.get_solver_state()['num_ready'], 2)
+
+
+class InMemorySessionStoreTest(StoreTests, unittest.TestCase):
+
+    def make_store(self):
+        return session.InMemorySessionStore()
+
+    def test_wait_for_update(self):
+        session_id = self.store.create([])
+        version = self.store.get_version(session_id)
+        timer = threading.Timer(0.05, self.store.update_status,
+                                (session_id,), {'completed': True})
+        timer.start()
+        self.store.wait_for_update(session_id, version, 5)
+        timer.join()
+        self.assertTrue(self.store.get_status(session_id).completed)
+
+
+class SqliteSessionStoreTest(StoreTests, unittest.TestCase):
+
+    def make_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sessions.sqlite')
+        return session.SqliteSessionStore(self.path)
+
+    def test_sessions_are_shared_between_connections(self):
+        other_store = session.SqliteSessionStore(self.path)
+        session_id = self.store.create([[1, 2]])
+        other_store.add_solution(session_id, Solution('in1', 1, 0.0))
+        other_store.update_status(session_id, admitted=True)
+        self.assertEqual(self.store.get_solutions(session_id),
+                         [Solution('in1', 1, 0.0)])
+        self.assertIs(self.store.get_status(session_id).admitted, True)
+        self.assertEqual(other_store.get_inputs_list(session_id), [[1, 2]])
+
+    def test_jobs_are_taken_once_across_connections(self):
+        num_jobs = 200
+        stores = [session.SqliteSessionStore(self.path) for _ in range(2)]
+        taken = [[] for _ in stores]
+
+        def take(index):
+            deadline = time.time() + 30
+            while (sum(len(jobs) for jobs in taken) < num_jobs and
+                   time.time() < deadline):
+                taken[index].extend(stores[index].take_jobs())
+
+        threads = [threading.Thread(target=take, args=(index,))
+                   for index in range(len(stores))]
+        for thread in threads:
+            thread.start()
+        for session_id in range(num_jobs):
+            self.store.enqueue_job(
+                JobRequest('solve', session_id, None, None, None, {}))
+        for thread in threads:
+            thread.join()
+
+        session_ids = [job.session_id for jobs in taken for job in jobs]
+        self.assertCountEqual(session_ids, range(num_jobs))
+        # each connection takes the jobs in the order they were queued
+        for jobs in taken:
+            self.assertEqual([job.session_id for job in jobs],
+                             sorted(job.session_id for job in jobs))
+
+    def test_unknown_status_field(self):
+        session_id = self.store.create([])
+        with self.assertRaises(ValueError):
+            self.store.update_status(session_id, unknown=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
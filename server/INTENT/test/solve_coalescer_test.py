@@ -0,0 +1,164 @@
+"""Tests for solve_coalescer.py and the sharing of searches by the solver
+service."""
+import unittest
+from unittest import mock
+
+from INTENT import session, solve_coalescer
+
+
+class SpecDigestTest(unittest.TestCase):
+
+    def test_only_spec_keys_matter(self):
+        request = {'inputs': {'1': {'1': '[1]'}}, 'outputs': {}, 'timeout': 5}
+        self.assertEqual(
+            solve_coalescer.spec_digest(request),
+            solve_coalescer.spec_digest(dict(request, client_id='tab')))
+        self.assertNotEqual(
+            solve_coalescer.spec_digest(request),
+            solve_coalescer.spec_digest(dict(request, timeout=10)))
+
+
+class SolveCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = solve_coalescer.SolveCoalescer()
+
+    def test_join_shares_running_search(self):
+        self.assertIsNone(self.coalescer.join('spec', 1))
+        self.assertEqual(self.coalescer.join('spec', 2), 1)
+        self.assertIsNone(self.coalescer.join('other spec', 3))
+        self.assertEqual(self.coalescer.subscribers(1), [1, 2])
+        self.assertEqual(self.coalescer.subscribers(3), [3])
+        self.assertEqual(self.coalescer.search_id(2), 1)
+        self.assertEqual(self.coalescer.search_id(3), 3)
+        # sessions without a shared search, like resumed ones
+        self.assertEqual(self.coalescer.search_id(4), 4)
+        self.assertEqual(self.coalescer.subscribers(4), [4])
+
+    def test_leave_while_others_remain(self):
+        self.coalescer.join('spec', 1)
+        self.coalescer.join('spec', 2)
+        self.coalescer.join('spec', 3)
+        self.coalescer.leave(2)
+        self.assertEqual(self.coalescer.subscribers(1), [1, 3])
+        self.assertEqual(self.coalescer.search_id(2), 2)
+        # the session that started the search can leave it too
+        self.coalescer.leave(1)
+        self.assertEqual(self.coalescer.subscribers(1), [3])
+        self.assertEqual(self.coalescer.join('spec', 4), 1)
+        self.assertEqual(self.coalescer.subscribers(1), [3, 4])
+
+    def test_stop_sharing(self):
+        self.coalescer.join('spec', 1)
+        self.coalescer.stop_sharing(1)
+        self.assertIsNone(self.coalescer.join('spec', 2))
+        self.assertEqual(self.coalescer.subscribers(1), [1])
+        self.assertEqual(self.coalescer.subscribers(2), [2])
+
+    def test_finish_without_solutions_forgets_search(self):
+        self.coalescer.join('spec', 1)
+        self.coalescer.join('spec', 2)
+        self.coalescer.finish(1)
+        self.assertEqual(self.coalescer.subscribers(1), [1])
+        self.assertEqual(self.coalescer.search_id(2), 2)
+        self.assertIsNone(self.coalescer.join('spec', 3))
+
+    def test_search_is_forgotten_once_all_graphs_are_sent(self):
+        self.coalescer.join('spec', 1)
+        self.coalescer.join('spec', 2)
+        self.coalescer.add_solution(1)
+        self.coalescer.add_solution(1)
+        self.coalescer.add_graphs(1)
+        self.coalescer.finish(1)
+        # finished, but the graphs of a solution are still traced
+        self.assertIsNone(self.coalescer.join('spec', 3))
+        self.assertEqual(self.coalescer.subscribers(1), [1, 2])
+        self.assertEqual(self.coalescer.search_id(2), 1)
+        self.coalescer.add_graphs(1)
+        self.assertEqual(self.coalescer.subscribers(1), [1])
+        self.assertEqual(self.coalescer.search_id(2), 2)
+        # late results of a forgotten search are ignored
+        self.coalescer.add_solution(1)
+        self.coalescer.add_graphs(1)
+        self.coalescer.finish(1)
+
+    def test_graphs_before_finish(self):
+        self.coalescer.join('spec', 1)
+        self.coalescer.add_solution(1)
+        self.coalescer.add_graphs(1)
+        self.assertEqual(self.coalescer.search_id(1), 1)
+        self.coalescer.finish(1)
+        self.assertEqual(self.coalescer.subscribers(1), [1])
+
+    def test_replace_latest(self):
+        self.assertIsNone(self.coalescer.replace_latest('tab', 1))
+        self.assertEqual(self.coalescer.replace_latest('tab', 2), 1)
+        self.assertIsNone(self.coalescer.replace_latest('other tab', 3))
+        self.assertEqual(self.coalescer.replace_latest('tab', 4), 2)
+
+    def test_replace_latest_forgets_least_recent_clients(self):
+        with mock.patch.object(solve_coalescer, 'MAX_CLIENTS', 2):
+            self.coalescer.replace_latest('a', 1)
+            self.coalescer.replace_latest('b', 2)
+            self.coalescer.replace_latest('a', 3)
+            self.coalescer.replace_latest('c', 4)
+            # b was the least recently active client
+            self.assertIsNone(self.coalescer.replace_latest('b', 5))
+            self.assertEqual(self.coalescer.replace_latest('c', 6), 4)
+            self.assertIsNone(self.coalescer.replace_latest('a', 7))
+
+
+class SolverServiceSharingTest(unittest.TestCase):
+    """The aborts of shared searches, without solver processes."""
+
+    def setUp(self):
+        # imported here: the solver service imports TF-Coder
+        from INTENT import solver_service  # pylint: disable=import-outside-toplevel
+        self.store = session.InMemorySessionStore()
+        with mock.patch.object(solver_service.solver_pool, 'SolverPool'), \
+                mock.patch.object(solver_service.trace_pool, 'TracePool'):
+            self.service = solver_service.SolverService(store=self.store)
+        self.pool = self.service.pool
+        self.pool.solve.return_value = None
+
+    def _solve(self, spec, client_id=None):
+        session_id = self.store.create([[1]])
+        self.service._solve(session.JobRequest(  # pylint: disable=protected-access
+            'solve', session_id, spec, client_id, client_id,
+            {'time_limit': 1}))
+        return session_id
+
+    def test_shared_search_goes_on_until_all_sessions_abort(self):
+        first = self._solve('spec')
+        second = self._solve('spec')
+        self.pool.solve.assert_called_once()
+        self.assertTrue(self.store.get_status(second).admitted)
+
+        self.store.update_status(first, abort_requested=True)
+        self.assertFalse(self.service._abort_requested(first))  # pylint: disable=protected-access
+        # the aborting session left the search, completed
+        self.assertTrue(self.store.get_status(first).completed)
+        self.assertFalse(self.store.get_status(second).completed)
+
+        self.store.update_status(second, abort_requested=True)
+        self.assertTrue(self.service._abort_requested(first))  # pylint: disable=protected-access
+        # a new identical /solve starts a new search
+        self._solve('spec')
+        self.assertEqual(self.pool.solve.call_count, 2)
+
+    def test_new_solve_of_client_aborts_previous_search(self):
+        first = self._solve('spec', client_id='tab')
+        self._solve('other spec', client_id='tab')
+        self.pool.abort.assert_called_once_with(first)
+
+    def test_new_solve_of_client_leaves_shared_search(self):
+        first = self._solve('spec', client_id='tab')
+        second = self._solve('spec', client_id='other tab')
+        self._solve('other spec', client_id='other tab')
+        self.pool.abort.assert_not_called()
+        self.assertTrue(self.store.get_status(second).completed)
+        self.assertFalse(self.store.get_status(first).completed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+"""Tests for solver_pool.py, with spawned solver processes."""
+import queue
+import time
+import unittest
+from unittest import mock
+
+from INTENT import solver_pool
+
+# seconds to wait for the workers to warm up
+READY_TIMEOUT = 300
+# seconds to wait for a search to end
+DONE_TIMEOUT = 120
+
+INPUTS_LIST = [[[[1, 2], [3, 4]]]]
+# transposed, found at once
+SOLVABLE_OUTPUT_LIST = [[[1, 3], [2, 4]]]
+# not found, so the search runs until its time limit
+UNSOLVABLE_OUTPUT_LIST = [[[1000, -77], [5, 123456]]]
+
+
+def _problem(output_list, time_limit, number_of_solutions=1):
+    return dict(inputs_list=INPUTS_LIST, output_list=output_list,
+                constants=[], description='', desired_op=[],
+                undesired_op=[], time_limit=time_limit,
+                number_of_solutions=number_of_solutions)
+
+
+def trivial(time_limit=5, **kwargs):
+    return _problem(SOLVABLE_OUTPUT_LIST, time_limit, **kwargs)
+
+
+def unsolvable(time_limit):
+    return _problem(UNSOLVABLE_OUTPUT_LIST, time_limit)
+
+
+class SolverPoolTest(unittest.TestCase):
+    """Runs a pool of two spawned workers, shared by the tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.solutions = queue.Queue()
+        cls.done = queue.Queue()
+        cls.pool = solver_pool.SolverPool(
+            lambda *solution: cls.solutions.put(solution),
+            lambda *done: cls.done.put(done),
+            num_workers=2, start_method='spawn')
+        if not cls.pool.wait_until_ready(READY_TIMEOUT):
+            raise RuntimeError('The workers did not warm up')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def setUp(self):
+        self.next_session_id = int(time.time() * 1000)
+
+    def tearDown(self):
+        # the tests leave the pool idle
+        deadline = time.time() + DONE_TIMEOUT
+        while ((self.pool.num_running() or self.pool.num_pending()) and
+               time.time() < deadline):
+            time.sleep(0.1)
+        self.assertEqual(self.pool.num_running(), 0)
+        while not self.done.empty():
+            self.done.get()
+        while not self.solutions.empty():
+            self.solutions.get()
+
+    def solve(self, problem, client=None):
+        self.next_session_id += 1
+        self.pool.solve(self.next_session_id, client=client, **problem)
+        return self.next_session_id
+
+    def wait_done(self, num_sessions):
+        """Returns the (session id, resumable) of the next ended searches."""
+        return [self.done.get(timeout=DONE_TIMEOUT)
+                for _ in range(num_sessions)]
+
+    def test_solve(self):
+        session_id = self.solve(trivial())
+        self.assertEqual(self.wait_done(1), [(session_id, True)])
+        solution = self.solutions.get_nowait()
+        self.assertEqual(solution[:2], (session_id, 'tf.transpose(in1)'))
+
+    def test_earlier_deadlines_start_first(self):
+        # both workers run a long search, the second one much longer
+        first = self.solve(unsolvable(2), client='a')
+        second = self.solve(unsolvable(8), client='b')
+        late = self.solve(trivial(time_limit=30), client='c')
+        early = self.solve(trivial(time_limit=1), client='d')
+        self.assertEqual(self.pool.num_running(), 2)
+        self.assertEqual(self.pool.queue_info(early).position, 0)
+        self.assertEqual(self.pool.queue_info(late).position, 1)
+        self.assertIsNone(self.pool.queue_info(first))
+        self.assertEqual(set(self.pool.queue_infos()), {early, late})
+        # one worker is free until the second search ends, and runs the
+        # queued searches one after the other
+        ended = [session_id for session_id, _ in self.wait_done(4)]
+        self.assertEqual(ended, [first, early, late, second])
+
+    def test_running_searches_per_client_are_limited(self):
+        with mock.patch.object(solver_pool, 'MAX_RUNNING_PER_CLIENT', 1):
+            first = self.solve(unsolvable(2), client='a')
+            second = self.solve(trivial(), client='a')
+            # a worker is free, but not for client a
+            self.assertEqual(self.pool.num_running(), 1)
+            self.assertEqual(self.pool.queue_info(second).position, 0)
+            other = self.solve(trivial(), client='b')
+            self.assertEqual(self.wait_done(1), [(other, True)])
+            ended = [session_id for session_id, _ in self.wait_done(2)]
+        self.assertEqual(ended, [first, second])
+
+    def test_busy_when_queue_is_full(self):
+        with mock.patch.object(solver_pool, 'MAX_PENDING', 1):
+            running = [self.solve(unsolvable(2)) for _ in range(2)]
+            queued = self.solve(trivial())
+            with self.assertRaises(solver_pool.Busy) as context:
+                self.solve(trivial())
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+        self.assertLessEqual(context.exception.retry_after, 3)
+        ended = [session_id for session_id, _ in self.wait_done(3)]
+        self.assertCountEqual(ended, running + [queued])
+
+    def test_busy_when_wait_is_too_long(self):
+        with mock.patch.object(solver_pool, 'MAX_QUEUE_WAIT', 0.5):
+            running = [self.solve(unsolvable(3)) for _ in range(2)]
+            with self.assertRaises(solver_pool.Busy) as context:
+                self.solve(trivial())
+        # the workers are free in about 3 seconds
+        self.assertIn(context.exception.retry_after, [2, 3])
+        self.assertCountEqual([session_id for session_id, _
+                               in self.wait_done(2)], running)
+
+    def test_abort_queued_search(self):
+        running = [self.solve(unsolvable(2)) for _ in range(2)]
+        queued = self.solve(trivial())
+        self.pool.abort(queued)
+        self.assertEqual(self.wait_done(1), [(queued, False)])
+        self.assertEqual(self.pool.num_pending(), 0)
+        self.assertCountEqual([session_id for session_id, _
+                               in self.wait_done(2)], running)
+
+    def test_resume_after_finished_search(self):
+        session_id = self.solve(trivial(number_of_solutions=1))
+        self.assertEqual(self.wait_done(1), [(session_id, True)])
+        self.assertTrue(self.pool.is_resumable(session_id))
+        first_solution = self.solutions.get_nowait()
+        self.assertEqual(first_solution[0], session_id)
+
+        self.assertTrue(self.pool.resume(session_id, time_limit=2,
+                                         number_of_solutions=1))
+        self.assertEqual(self.wait_done(1), [(session_id, True)])
+        # the resumed search finds new solutions only
+        while not self.solutions.empty():
+            solution = self.solutions.get_nowait()
+            self.assertEqual(solution[0], session_id)
+            self.assertNotEqual(solution[1], first_solution[1])
+
+        self.assertFalse(self.pool.resume(session_id + 1000, time_limit=1,
+                                          number_of_solutions=1))
+
+    def test_killed_worker_is_restarted(self):
+        running = self.solve(unsolvable(30))
+        worker = next(worker for worker in self.pool._workers  # pylint: disable=protected-access
+                      if worker.session_id == running)
+        owner = self.pool._workers.index(worker)  # pylint: disable=protected-access
+        worker.process.kill()
+        # the search of the killed worker ends, and can't be resumed
+        self.assertEqual(self.wait_done(1), [(running, False)])
+        self.assertFalse(self.pool.is_resumable(running))
+        new_worker = self.pool._workers[owner]  # pylint: disable=protected-access
+        self.assertIsNot(new_worker, worker)
+        self.assertTrue(self.pool.wait_until_ready(READY_TIMEOUT))
+        self.assertEqual(self.pool.num_ready(), 2)
+        session_id = self.solve(trivial())
+        self.assertEqual(self.wait_done(1), [(session_id, True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 import json
+from unittest import mock
 from tf_coder import asyn_utils
 from tf_coder.value_search import colab_interface, value_search_settings
 
-from INTENT import utils
+from INTENT import trace_pool, utils
 
 
 if __name__ == '__main__':
@@ -20,9 +21,44 @@ if __name__ == '__main__':
                 }
         }
     
-    res = utils.validate_solutions(request_data, [])
+    res = utils.validate_solutions(request_data)
     print(json.dumps(request_data, indent=4))
     print(json.dumps(res, indent=4))
+    assert res['example0']['solution0']['match']
+    assert not res['example1']['solution0']['match']
+    # the outermost call of solution2 fails on every example
+    for example in ['example0', 'example1']:
+        validation = res[example]['solution2']
+        assert validation['exception'] and not validation['match']
+        assert validation['graphs']['nodes'] is None
+
+    # case 3
+    # validate and trace a broadcasting solution
+    request_data = \
+        {
+            'inputs': {'1': {'1': '[[1,2,3]]', '2': '[[1],[2],[3]]'}},
+            'outputs': {'1': {'1': '[[2,3,4],[3,4,5],[4,5,6]]'}},
+            'solutions': {'solution0': 'tf.add(in1, in2)'}
+        }
+    res = utils.validate_solutions(request_data)
+    validation = res['example0']['solution0']
+    assert validation['match'] and not validation['exception']
+    assert validation['graphs']['nodes'] is not None
+    inputs_list, _ = utils.get_inputs_and_output_list(request_data)
+    graph = trace_pool.trace_graph('tf.add(in1, in2)', inputs_list[0])
+    assert graph['nodes'] is not None and graph['trace_edges'] is not None
+
+    # case 4
+    # a solution that runs but cannot be traced is reported as failed
+    request_data['solutions'] = {'solution0': 'tf.subtract(in1, in2)',
+                                 'solution1': 'tf.add(in2, in1)'}
+    with mock.patch.object(utils.dataflow, 'dataflow_generator',
+                           side_effect=RuntimeError('trace failed')):
+        res = utils.validate_solutions(request_data)
+    for validation in res['example0'].values():
+        assert validation['exception'] and not validation['match']
+        assert 'trace failed' in validation['eval_output']
+        assert validation['graphs']['nodes'] is None
     
     # case 2
     # first find the solution in the cache, if can not find
@@ -35,5 +71,5 @@ if __name__ == '__main__':
     #     value_search_settings.default_settings(), asyn)
     # asyn_solutions = asyn.solutions
     # print(asyn_solutions)
-    # res = utils.validate_solutions(request_data, asyn_solutions)
+    # res = utils.validate_solutions(request_data)
     # print(res)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Tests for validation_cache.py."""
+import unittest
+from unittest import mock
+
+from INTENT import validation_cache
+
+
+class ValidationCacheTest(unittest.TestCase):
+
+    def test_digest(self):
+        self.assertEqual(validation_cache.digest({'a': 1, 'b': [2]}),
+                         validation_cache.digest({'b': [2], 'a': 1}))
+        self.assertNotEqual(validation_cache.digest(['in1', 'out1']),
+                            validation_cache.digest(['in1', 'out2']))
+
+    def test_results_evict_least_recently_used(self):
+        cache = validation_cache.ValidationCache(max_results=2)
+        cache.put_result(('a', 'e'), {'match': True})
+        cache.put_result(('b', 'e'), {'match': False})
+        # using a makes b the least recently used
+        self.assertEqual(cache.get_result(('a', 'e')), {'match': True})
+        cache.put_result(('c', 'e'), {'match': True})
+        self.assertIsNone(cache.get_result(('b', 'e')))
+        self.assertIsNotNone(cache.get_result(('a', 'e')))
+        self.assertIsNotNone(cache.get_result(('c', 'e')))
+        self.assertIsNone(cache.get_result(('a', 'other example')))
+
+    def test_example_caches_evict_least_recently_used(self):
+        cache = validation_cache.ValidationCache(max_examples=2)
+        first = cache.example_cache('1')
+        second = cache.example_cache('2')
+        self.assertIsNot(first, second)
+        self.assertIs(cache.example_cache('1'), first)
+        cache.example_cache('3')
+        self.assertIs(cache.example_cache('1'), first)
+        self.assertIsNot(cache.example_cache('2'), second)
+
+    def test_trim_replaces_large_dicts(self):
+        example_cache = validation_cache.ExampleCache()
+        with mock.patch.object(validation_cache, 'MAX_SUBEXPRESSIONS', 2):
+            example_cache.values.update(a=1, b=2)
+            example_cache.traces.update(a=1, b=2, c=3)
+            example_cache.trim()
+            # at the limit, kept
+            self.assertEqual(example_cache.values, {'a': 1, 'b': 2})
+            self.assertEqual(example_cache.traces, {})
+
+            # a request holding the dict keeps its content
+            values = example_cache.values
+            values['c'] = 3
+            example_cache.trim()
+            self.assertEqual(example_cache.values, {})
+            self.assertEqual(values, {'a': 1, 'b': 2, 'c': 3})
+
+    def test_example_cache_is_trimmed_when_used(self):
+        cache = validation_cache.ValidationCache()
+        with mock.patch.object(validation_cache, 'MAX_SUBEXPRESSIONS', 1):
+            cache.example_cache('1').values.update(a=1, b=2)
+            self.assertEqual(cache.example_cache('1').values, {})
+
+
+class LatestRequestsTest(unittest.TestCase):
+
+    def test_newer_request_supersedes(self):
+        latest = validation_cache.LatestRequests()
+        first = latest.start('tab')
+        latest.check('tab', first)
+        second = latest.start('tab')
+        with self.assertRaises(validation_cache.Superseded):
+            latest.check('tab', first)
+        latest.check('tab', second)
+        # other clients are independent
+        latest.check('other tab', latest.start('other tab'))
+        latest.check('tab', second)
+
+    def test_forgotten_clients_are_not_superseded(self):
+        latest = validation_cache.LatestRequests(max_clients=2)
+        first = latest.start('a')
+        latest.start('b')
+        latest.start('c')
+        # a was forgotten, so its request can't be known to be superseded
+        latest.check('a', first)
+        self.assertEqual(latest.start('a'), 1)
+
+    def test_active_clients_are_kept(self):
+        latest = validation_cache.LatestRequests(max_clients=2)
+        latest.start('a')
+        latest.start('b')
+        latest.start('a')
+        latest.start('c')
+        # b was the least recently active
+        self.assertEqual(latest.start('a'), 3)
+        self.assertEqual(latest.start('b'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
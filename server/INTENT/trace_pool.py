@@ -0,0 +1,81 @@
+"""
+Pool computing the dataflow graphs of solutions for the INTENT server.
+
+Solutions are traced as soon as the solver pool reports them, on a few
+threads of the server process, so /poll and /stream only read graphs that
+are ready instead of tracing on the request thread. Each example of a
+solution is traced as a separate task.
+"""
+import os
+import threading
+from concurrent import futures
+from typing import Callable, Dict, List
+
+from tf_coder.dataflow import dataflow
+from INTENT import metrics
+from INTENT import session
+
+# number of tracing threads
+NUM_WORKERS = int(os.environ.get('INTENT_TRACE_WORKERS', 2))
+
+
+def trace_graph(expression: str, inputs: List) -> Dict:
+    """Returns the Graph dict of a solution on the inputs of one example."""
+    with metrics.TRACE_TIME.time():
+        try:
+            value = dataflow.value_from_text(expression, inputs)
+            nodes, edges, trace_edges = dataflow.dataflow_generator(value)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f'Could not trace solution {expression}: {e}')
+            nodes, edges, trace_edges = None, None, None
+    return session.Graph(nodes, edges, trace_edges)._asdict()
+
+
+class _PendingGraphs(object):
+    """The graphs of one solution, stored once all examples are traced."""
+
+    def __init__(self, num_examples):
+        self.graphs = [None] * num_examples
+        self.num_remaining = num_examples
+        self.lock = threading.Lock()
+
+
+class TracePool(object):
+    """Traces solutions on a pool of threads.
+
+    on_graphs(session_id, solution_index, graphs) is called on a tracing
+    thread with the Graph dict of each example once they are all ready.
+    """
+
+    def __init__(self,
+                 on_graphs: Callable[[int, int, List[Dict]], None],
+                 num_workers: int = NUM_WORKERS):
+        self._on_graphs = on_graphs
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max(1, num_workers), thread_name_prefix='trace')
+
+    def submit(self, session_id: int, solution_index: int, expression: str,
+               inputs_list: List[List]) -> None:
+        """Queues the tracing of a solution on every example."""
+        if not inputs_list:
+            self._on_graphs(session_id, solution_index, [])
+            return
+        pending = _PendingGraphs(len(inputs_list))
+        for example_index, inputs in enumerate(inputs_list):
+            future = self._executor.submit(trace_graph, expression, inputs)
+            future.add_done_callback(
+                lambda future, example_index=example_index: self._traced(
+                    session_id, solution_index, pending, example_index,
+                    future))
+
+    def _traced(self, session_id, solution_index, pending, example_index,
+                future):
+        with pending.lock:
+            pending.graphs[example_index] = future.result()
+            pending.num_remaining -= 1
+            if pending.num_remaining:
+                return
+        self._on_graphs(session_id, solution_index, pending.graphs)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -1,25 +1,67 @@
+import json
+import threading
 import time
 from collections import defaultdict
 from tf_coder.value_search import colab_interface
+from tf_coder.value_search import solution_cache
+from tf_coder.value_search import value as value_module
 from tf_coder.value_search import value_search
 from tf_coder.value_search import value_search_settings as settings_module
+from tf_coder.benchmarks import all_benchmarks
 from tf_coder.benchmarks import benchmark as benchmark_module
 from tf_coder.dataflow import dataflow
+from tf_coder.dataflow import dataflow_utils
+from INTENT import literal_parser
+from INTENT import metrics
 from INTENT import session
+from INTENT import solver_pool
+from INTENT import solver_service
+from INTENT import trace_pool
+from INTENT import validation_cache
 
-WAITTIME = 20 * 60
 UPWEIRGHT = 3
+# seconds after which an idle /stream sends a comment, so that proxies and
+# browsers keep the connection open
+STREAM_KEEPALIVE = 15
+# seconds of the search run by each solver process when it warms up
+WARM_UP_SEARCH_TIME = 5
+# seconds prewarm() waits for the solver processes
+PREWARM_TIMEOUT = 300
+# seconds /solve and /resume wait for the solver service to accept their job
+ADMISSION_TIMEOUT = 5
+# seconds after which the published state of the solver service is stale
+SOLVER_STATE_TIMEOUT = 10
+# solution traced by prewarm() to warm up the web process
+WARM_UP_SOLUTION = 'tf.add(in1, tf.transpose(in1))'
+WARM_UP_INPUT = '[[1, 2], [3, 4]]'
+# results and evaluated subexpressions of /validate
+VALIDATION_CACHE = validation_cache.ValidationCache()
+# the latest /validate of each client
+LATEST_VALIDATIONS = validation_cache.LatestRequests()
+
+# the solver service run by this process, if INTENT_SOLVER_SERVICE is local
+_solver_service = None
+_solver_service_lock = threading.Lock()
+# whether the tracing code of this process is warmed up
+_tracing_warmed_up = False
+# path -> solution_cache.SolutionCache opened by this process
+_solution_caches = {}
+_solution_caches_lock = threading.Lock()
 
 
 def get_inputs_and_output_list(request_data):
+    """Parses the examples of a request, see literal_parser for the syntax.
+
+    Raises literal_parser.LiteralError for invalid inputs or outputs.
+    """
     inputs_list, output_list = [], []
 
     for inputs, output in \
             zip(request_data['inputs'].values(),
                 request_data['outputs'].values()):
         inputs_list.append(list(map(
-            lambda i: eval(i), inputs.values())))
-        output_list.append(eval(output['1']))
+            literal_parser.parse_literal, inputs.values())))
+        output_list.append(literal_parser.parse_literal(output['1']))
 
     return inputs_list, output_list
 
@@ -35,81 +77,391 @@ def get_settings(desired_op, undesired_op, time_limit,
         'max_solutions': number_of_solutions,
         'require_all_inputs_used': True,
         'require_one_input_used': False,
+        'multi_example_search': True,
 
         'operations.undesired_multiplier': UPWEIRGHT,
         'operations.desired_multiplier': 1 / UPWEIRGHT,
         'operations.desired_operations': desired_op,
-        'operations.undesired_operations': undesired_op
+        'operations.undesired_operations': undesired_op,
+        'operations.use_numpy_backend': True,
+        # share operation applications with earlier searches in this process
+        'operations.use_global_application_cache': True,
+        # aggregated per operation, reported to /metrics
+        'printing.statistics': True,
     })
 
 
+def warm_up():
+    """Warms up TF-Coder once per solver process.
+
+    Loads the description handler and the tensor features model, and runs a
+    small search so that the first search of a user doesn't pay for the
+    first use of TF operations.
+    """
+    if colab_interface.WARMED_UP:
+        return
+    colab_interface.warm_up()
+    value_search.run_value_search(
+        benchmark=all_benchmarks.find_benchmark_with_name('simple_cast'),
+        settings=get_settings(desired_op=[], undesired_op=[],
+                              time_limit=WARM_UP_SEARCH_TIME,
+                              number_of_solutions=1))
+
+
+def prewarm(timeout=PREWARM_TIMEOUT):
+    """Warms up the server before it accepts requests.
+
+    Starts the solver service if this process runs it, whose solver
+    processes warm up in parallel, and traces a small solution in this
+    process for /poll and /validate. Blocks until the solver processes are
+    warmed up or timeout seconds passed.
+    """
+    global _tracing_warmed_up
+    service = ensure_solver_service()
+    inputs = [literal_parser.parse_literal(WARM_UP_INPUT)]
+    trace_pool.trace_graph(WARM_UP_SOLUTION, inputs)
+    dataflow.value_from_text(WARM_UP_SOLUTION, inputs)
+    _tracing_warmed_up = True
+    if service is not None and not service.pool.wait_until_ready(timeout):
+        print(f'Solver processes not warmed up after {timeout} seconds')
+
+
+def _get_solver_state():
+    """Returns the state published by the solver service, None if stale."""
+    state = session.store.get_solver_state()
+    if (state is None or
+            time.time() - state['updated_at'] > SOLVER_STATE_TIMEOUT):
+        return None
+    return state
+
+
+def get_readiness():
+    """Returns whether the server is warmed up, and the details for /ready.
+
+    Without prewarm(), the server is ready once it traced a first solution
+    for /validate and the solver processes warmed up. Starts the solver
+    service if this process runs it.
+    """
+    ensure_solver_service()
+    state = _get_solver_state()
+    num_workers = state['num_workers'] if state else 0
+    num_ready = state['num_ready'] if state else 0
+    ready = (_tracing_warmed_up and num_workers > 0 and
+             num_ready == num_workers)
+    return ready, {
+        'ready': ready,
+        'tracing_warmed_up': _tracing_warmed_up,
+        'solver_workers': num_workers,
+        'solver_workers_ready': num_ready,
+    }
+
+
+def _get_solution_cache(path):
+    """Returns the solution cache stored at path, opening it on first use."""
+    if path is None:
+        return None
+    with _solution_caches_lock:
+        if path not in _solution_caches:
+            _solution_caches[path] = solution_cache.SolutionCache(path)
+        return _solution_caches[path]
+
+
 def solve_problem(inputs_list, output_list, constants,
-                  description, session_id, **argvs):
-    """Specifies a problem to run TF-Coder on. Edit this function!"""
-    session_info = session.global_session_dict[session_id]
-    if not colab_interface.WARMED_UP:
-        colab_interface.warm_up()
+                  description, asyn, solution_cache_path=None, **argvs):
+    """Specifies a problem to run TF-Coder on. Edit this function!
+
+    Runs in a solver process. Solutions are reported through asyn.
+    solution_cache_path is the absolute path of the solution cache, which
+    the web process passes in, or None to search without it.
+    """
+    warm_up()
     settings = get_settings(**argvs)
-    colab_interface.run_value_search_from_colab(
+    return colab_interface.run_value_search_from_colab(
         inputs_list, output_list, constants,
-        description, settings, session_info.asyn)
-    # session_info.response.completed = True
-    session_info.solver_completed = True
-    # clear session after waiting for 20 minutes
-    time.sleep(WAITTIME)
-    session.global_session_dict.pop(session_id)
-
- 
-def validate_solutions(request_data, asyn_solutions):
+        description, settings, asyn,
+        solution_cache=_get_solution_cache(solution_cache_path))
+
+
+def resume_problem(search_state, asyn, time_limit, number_of_solutions):
+    """Continues a search, keeping its previous work.
+
+    Runs in the solver process that ran the search.
+    """
+    value_search.resume_value_search(
+        search_state,
+        extra_time=time_limit,
+        extra_solutions=number_of_solutions,
+        asyn=asyn)
+
+
+def ensure_solver_service():
+    """Starts the solver service in this process, if it runs it.
+
+    Returns the service, None if it runs in another process.
+    """
+    global _solver_service
+    if solver_service.MODE != 'local':
+        return None
+    with _solver_service_lock:
+        if _solver_service is None:
+            _solver_service = solver_service.SolverService()
+            _solver_service.start()
+        return _solver_service
+
+
+def _wait_for_admission(session_id, timeout=ADMISSION_TIMEOUT):
+    """Returns the Status of a session once the solver service handled its
+    job, or after timeout seconds.
+    """
+    deadline = time.time() + timeout
+    while True:
+        version = session.store.get_version(session_id)
+        status = session.store.get_status(session_id)
+        if (status is None or status.admitted or status.completed or
+                time.time() >= deadline):
+            return status
+        session.store.wait_for_update(session_id, version,
+                                      deadline - time.time())
+
+
+def start_problem(spec, client_id=None, client=None, **kwargs):
+    """Creates a session and queues its search, see solve_problem for kwargs.
+
+    Returns the id of the session. If a search with the same spec digest
+    is running, the session receives its results instead. A previous
+    session of the same client_id is aborted. client identifies the user
+    for the limits of the solver pool.
+
+    Raises:
+        solver_pool.Busy: if the solver service refuses the search. The
+            session is then marked completed.
+    """
+    ensure_solver_service()
+    session_id = session.store.create(kwargs['inputs_list'])
+    session.store.enqueue_job(session.JobRequest(
+        solver_pool.SOLVE, session_id, spec, client_id, client, kwargs))
+    status = _wait_for_admission(session_id)
+    if status is not None and status.retry_after is not None:
+        raise solver_pool.Busy(status.retry_after)
+    return session_id
+
+
+def resume_problem_request(session_id, client=None, **kwargs):
+    """Queues the continuation of the finished search of a session.
+
+    Returns False if the search state is gone. kwargs are those of
+    resume_problem.
+    """
+    ensure_solver_service()
+    session.store.update_status(session_id, completed=False,
+                                abort_requested=False, admitted=False,
+                                expires_at=None)
+    session.store.enqueue_job(session.JobRequest(
+        solver_pool.RESUME, session_id, None, None, client, kwargs))
+    status = _wait_for_admission(session_id)
+    # not handled yet: the service is busy and will resume it
+    return status is not None and (status.admitted or not status.completed)
+
+
+def abort_problem(session_id):
+    """Aborts the search of a session, from any web worker.
+
+    The solver service checks the abort requests in the session store. A
+    search shared with other sessions goes on for them.
+    """
+    session.store.update_status(session_id, abort_requested=True)
+
+
+def update_load_metrics():
+    """Sets the gauges of the sessions and searches, for /metrics."""
+    num_active = 0
+    for session_id in session.store.session_ids():
+        status = session.store.get_status(session_id)
+        if status is not None and not status.completed:
+            num_active += 1
+    metrics.ACTIVE_SESSIONS.set(num_active)
+    state = _get_solver_state()
+    if state is not None:
+        metrics.QUEUED_SEARCHES.set(state['num_pending'])
+        metrics.RUNNING_SEARCHES.set(state['num_running'])
+
+
+def _solution_response(solution):
+    return session.Solution(solution.expression, solution.weight,
+                            round(solution.time, 2))._asdict()
+
+
+def get_poll_response(session_id, status, since=0, graphs_since=0):
+    """Builds the /poll response from the graphs traced so far.
+
+    Only the solutions from index since on, and the graphs of the solutions
+    from index graphs_since on, are included. The cursor of the response
+    gives the values to send in the next poll.
+    """
+    solutions = session.store.get_solutions(session_id, since)
+    graphs = session.store.get_graphs(session_id, graphs_since)
+
+    response = session.Response()
+    response.completed = status.completed
+    if status.queue_position is not None:
+        response.queue = {
+            'position': status.queue_position,
+            'estimated_start': status.queue_wait,
+        }
+    for i, solution in enumerate(solutions, since):
+        response.solutions[f'solution{i}'] = _solution_response(solution)
+        response.graphs_ready[f'solution{i}'] = i in graphs
+    for i, solution_graphs in graphs.items():
+        response.graphs_ready[f'solution{i}'] = True
+        for j, graph in enumerate(solution_graphs):
+            response.graphs[f'example{j}'][f'solution{i}'] = graph
+
+    # graphs are traced out of order, so the graphs cursor stops at the
+    # first solution whose graphs are not ready
+    next_graphs_since = graphs_since
+    while next_graphs_since in graphs:
+        next_graphs_since += 1
+    response.cursor = {'since': since + len(solutions),
+                       'graphs_since': next_graphs_since}
+    return response
+
+
+def _server_sent_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_events(session_id, since=0):
+    """Yields the Server-Sent Events of a session for /stream.
+
+    Every solution from index since on is sent in a 'solution' event as soon
+    as the solver finds it, and in a 'graphs' event with its dataflow graphs
+    once they are traced. A 'completed' event ends the stream when the
+    search finishes and all graphs were sent.
+    """
+    num_sent_solutions = since
+    # indices of the sent solutions whose graphs are not sent yet
+    waiting_for_graphs = set()
+    last_sent_time = time.time()
+    while True:
+        version = session.store.get_version(session_id)
+        # the status is read first: the solutions of a completed search are
+        # all stored before it is marked completed
+        status = session.store.get_status(session_id)
+        if status is None:
+            # the session expired
+            return
+        new_solutions = session.store.get_solutions(session_id,
+                                                    num_sent_solutions)
+        for solution in new_solutions:
+            yield _server_sent_event('solution', {
+                'index': num_sent_solutions, **_solution_response(solution)})
+            waiting_for_graphs.add(num_sent_solutions)
+            num_sent_solutions += 1
+            last_sent_time = time.time()
+        if waiting_for_graphs:
+            graphs = session.store.get_graphs(session_id,
+                                              min(waiting_for_graphs))
+            for index in sorted(waiting_for_graphs & set(graphs)):
+                yield _server_sent_event('graphs', {
+                    'index': index,
+                    'graphs': {f'example{j}': graph
+                               for j, graph in enumerate(graphs[index])}})
+                waiting_for_graphs.remove(index)
+                last_sent_time = time.time()
+        if status.completed and not waiting_for_graphs:
+            yield _server_sent_event('completed', {
+                'num_solutions': num_sent_solutions,
+                'resumable': status.resumable})
+            return
+
+        idle_time = time.time() - last_sent_time
+        if idle_time >= STREAM_KEEPALIVE:
+            yield ': keepalive\n\n'
+            last_sent_time = time.time()
+            idle_time = 0
+        session.store.wait_for_update(session_id, version,
+                                      STREAM_KEEPALIVE - idle_time)
+
+
+def _validate_solution(text_solution, inputs, output, example_cache):
+    """Returns the Validation dict of a solution on one example."""
+    global _tracing_warmed_up
+    no_graphs = session.Graph(None, None, None)._asdict()
+    # solutions found by tf-coder and solutions provided by the user are
+    # both rebuilt from their text, reusing the subexpressions evaluated
+    # before an edit
+    try:
+        value = dataflow.value_from_text(text_solution, inputs,
+                                         example_cache.values)
+        error = 'The solution raises an exception'
+    except Exception as e:  # pylint: disable=broad-except
+        value, error = None, str(e)
+    if value is None:
+        # report the error of eval() if the expression does not run at all,
+        # or if its outermost operation fails
+        match, exception, eval_output = value_search._check_application(
+            text_solution, benchmark_module.Example(inputs, output))
+        if not exception:
+            match, exception, eval_output = False, True, error
+        return session.Validation(
+            match, exception, eval_output, no_graphs)._asdict()
+
+    try:
+        output_value = value_module.OutputValue(output)
+        match = output_value == value
+        eval_output = dataflow_utils.object_to_string(
+            output_value.value if match else value.value)
+    except Exception as e:  # pylint: disable=broad-except
+        return session.Validation(
+            False, True, str(e), no_graphs)._asdict()
+
+    try:
+        nodes, edges, trace_edges = \
+            dataflow.dataflow_generator(value, example_cache.traces)
+    except Exception as e:  # pylint: disable=broad-except
+        return session.Validation(
+            False, True, f'Could not trace the solution: {e}',
+            no_graphs)._asdict()
+    # the first trace warms up tracing as prewarm() does
+    _tracing_warmed_up = True
+    return session.Validation(
+        match, False, eval_output,
+        session.Graph(nodes, edges, trace_edges)._asdict())._asdict()
+
+
+def validate_solutions(request_data):
+    """Validates every solution on every example of a /validate request.
+
+    Results are cached by the text of the solution and of the example.
+    Raises validation_cache.Superseded when a newer request with the same
+    client_id arrives before the work that is not cached starts.
+    """
     response = defaultdict(defaultdict)
+    client_id = request_data.get('client_id')
+    if client_id is not None:
+        request_number = LATEST_VALIDATIONS.start(client_id)
 
     inputs_list, output_list = get_inputs_and_output_list(request_data)
     text_solutions = request_data['solutions'].values()
+    example_texts = zip(request_data['inputs'].values(),
+                        request_data['outputs'].values())
 
-    asyn_text_solutions = [solution.expression for solution in asyn_solutions]
-
-    for i_example, (inputs, output) in enumerate(zip(inputs_list, output_list)):
+    for i_example, (inputs, output, (inputs_text, output_text)) in \
+            enumerate(zip(inputs_list, output_list, example_texts)):
+        example_digest = validation_cache.digest([inputs_text, output_text])
+        example_cache = VALIDATION_CACHE.example_cache(
+            validation_cache.digest(inputs_text))
 
         for i_solution, text_solution in enumerate(text_solutions):
+            key = (dataflow.normalize_expression(text_solution),
+                   example_digest)
+            result = VALIDATION_CACHE.get_result(key)
+            if result is None:
+                if client_id is not None:
+                    LATEST_VALIDATIONS.check(client_id, request_number)
+                result = _validate_solution(text_solution, inputs, output,
+                                            example_cache)
+                VALIDATION_CACHE.put_result(key, result)
+            response[f'example{i_example}'][f'solution{i_solution}'] = result
 
-            
-            match, exception, eval_output = value_search._check_application(
-                text_solution, benchmark_module.Example(inputs, output))
-
-            # exception occurs during eval()
-            if exception:
-                response[f'example{i_example}'][f'solution{i_solution}'] = \
-                    session.Validation(
-                        match, exception, eval_output,
-                        session.Graph(None, None, None)._asdict())._asdict()
-                continue
-
-            # text_solution is searched by tf-coder before
-            value = None
-            if text_solution in asyn_text_solutions:
-                index = asyn_text_solutions.index(text_solution)
-                value = asyn_solutions[index].value
-                value = dataflow.value_from_different_inputs(value, inputs)
-            else:  # text_solution is provided by user
-                try:
-                    value = dataflow.value_from_text(text_solution, inputs)
-                except Exception as e:
-                    match = False
-                    exception = True
-                    eval_output = str(e)
-                    response[f'example{i_example}'][f'solution{i_solution}'] = \
-                        session.Validation(
-                            match, exception, eval_output,
-                            session.Graph(None, None, None)._asdict())._asdict()
-                    continue
-
-            nodes, edges, trace_edges = \
-                dataflow.dataflow_generator(value)
-
-            response[f'example{i_example}'][f'solution{i_solution}'] = \
-                session.Validation(
-                    match, exception, eval_output,
-                    session.Graph(nodes, edges, trace_edges)._asdict())._asdict()
-
-    return response        
-        
\ No newline at end of file
+    return response
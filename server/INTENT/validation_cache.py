@@ -0,0 +1,129 @@
+"""
+Caches of /validate.
+
+INTENT validates the solutions again after every edit, so most of each
+solution was already evaluated and traced on the same examples. The results
+of whole (solution, example) pairs are kept by their text, and the values
+and provenance traces of subexpressions are kept by the text of the inputs
+of each example, so an edited solution only evaluates and traces the
+edited subexpressions.
+
+Clients can validate on every keystroke, so a /validate is dropped when a
+newer one from the same client arrives before it is done.
+"""
+import collections
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# number of (solution, example) results kept
+MAX_RESULTS = 4096
+# number of examples whose subexpressions are kept
+MAX_EXAMPLES = 64
+# number of subexpressions kept per example, beyond which they are dropped
+MAX_SUBEXPRESSIONS = 10000
+# number of clients whose latest /validate is remembered
+MAX_CLIENTS = 4096
+
+
+class Superseded(Exception):
+    """Raised when a newer /validate of the same client arrived."""
+
+
+def digest(data: Any) -> str:
+    """Returns a digest of JSON data, like the texts of a request."""
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class ExampleCache(object):
+    """The subexpressions evaluated on the inputs of one example.
+
+    values maps normalized subexpressions to their Values, for
+    dataflow.value_from_text, and traces maps subexpressions to their
+    provenance traces, for dataflow.dataflow_generator.
+
+    Concurrent /validate of the same example share the dicts without a
+    lock: they only get and set single items, which the GIL makes atomic,
+    and two requests evaluating the same subexpression store equal
+    results. trim() replaces a dict instead of clearing it, so requests
+    that already hold it are not affected.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.traces = {}
+
+    def trim(self) -> None:
+        """Drops the subexpressions if there are too many."""
+        if len(self.values) > MAX_SUBEXPRESSIONS:
+            self.values = {}
+        if len(self.traces) > MAX_SUBEXPRESSIONS:
+            self.traces = {}
+
+
+class ValidationCache(object):
+    """Least recently used results and example caches of /validate."""
+
+    def __init__(self, max_results: int = MAX_RESULTS,
+                 max_examples: int = MAX_EXAMPLES):
+        self._max_results = max_results
+        self._max_examples = max_examples
+        self._results = collections.OrderedDict()
+        self._examples = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_result(self, key: Tuple[str, str]) -> Optional[Dict]:
+        """Returns the Validation dict of (solution, example digest)."""
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def put_result(self, key: Tuple[str, str], result: Dict) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self._max_results:
+                self._results.popitem(last=False)
+
+    def example_cache(self, inputs_digest: str) -> ExampleCache:
+        """Returns the subexpression cache of the inputs of an example."""
+        with self._lock:
+            example_cache = self._examples.get(inputs_digest)
+            if example_cache is None:
+                example_cache = ExampleCache()
+                self._examples[inputs_digest] = example_cache
+                while len(self._examples) > self._max_examples:
+                    self._examples.popitem(last=False)
+            else:
+                self._examples.move_to_end(inputs_digest)
+            example_cache.trim()
+            return example_cache
+
+
+class LatestRequests(object):
+    """Numbers the requests of each client to find superseded ones."""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS):
+        self._max_clients = max_clients
+        self._latest = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, client_id: str) -> int:
+        """Records a new request of a client, returns its number."""
+        with self._lock:
+            number = self._latest.pop(client_id, 0) + 1
+            self._latest[client_id] = number
+            while len(self._latest) > self._max_clients:
+                self._latest.popitem(last=False)
+            return number
+
+    def check(self, client_id: str, number: int) -> None:
+        """Raises Superseded if the client sent a newer request."""
+        with self._lock:
+            latest = self._latest.get(client_id, number)
+        if latest != number:
+            raise Superseded()
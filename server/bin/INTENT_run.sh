@@ -5,14 +5,16 @@ DEFAULT_PORT=8000
 
 usage()
 {
-  echo "Usage: $0 [ -p PORT ]"
+  echo "Usage: $0 [ -p PORT ] [ -w ]"
+  echo "  -w  warm up the solvers before accepting requests"
   exit 2
 }
 
-while getopts 'p:?h' c
+while getopts 'p:w?h' c
 do
   case $c in
     p) PORT=$OPTARG ;;
+    w) export INTENT_PREWARM=1 ;;
     h|?) usage ;; esac
 done
 
@@ -0,0 +1,17 @@
+#!/bin/bash
+# INTENTSolver
+#
+# Runs the solver service on its own, for several web processes sharing the
+# session database. Start the web processes with the same INTENT_SESSION_DB
+# and INTENT_SOLVER_SERVICE=remote.
+
+if [ -z "$INTENT_SESSION_DB" ]; then
+  echo "Set INTENT_SESSION_DB to the database shared with the web processes"
+  exit 2
+fi
+
+BIN_DIR=$(dirname $0)
+export PYTHONPATH="$BIN_DIR/../../tensorflow-coder"
+export INTENT_SOLVER_SERVICE=remote
+
+python3 -m INTENT.solver_service
@@ -1,4 +1,10 @@
 BIN_DIR=$(dirname $0)
 export PYTHONPATH="$BIN_DIR/../../tensorflow-coder"
 
-python3 -m INTENT.test.utils_test
\ No newline at end of file
+python3 -m INTENT.test.utils_test
+python3 -m INTENT.test.literal_parser_test
+python3 -m INTENT.test.metrics_test
+python3 -m INTENT.test.validation_cache_test
+python3 -m INTENT.test.solve_coalescer_test
+python3 -m INTENT.test.session_test
+python3 -m INTENT.test.solver_pool_test
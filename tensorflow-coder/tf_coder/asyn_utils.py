@@ -1,7 +1,38 @@
 """Async flag for the server"""
 
+import threading
+
+
 class Asyn:
   def __init__(self):
     self.aborted = False
     self.solutions = []
-    
\ No newline at end of file
+    # Set when the search stops, whatever the reason.
+    self.completed = False
+    # Notified when solutions are added and when the search completes.
+    self.changed = threading.Condition()
+
+  def notify(self):
+    """Wakes up the threads waiting for a change of the search."""
+    with self.changed:
+      self.changed.notify_all()
+
+  def finish(self):
+    """Marks the search as completed and wakes up the waiting threads."""
+    with self.changed:
+      self.completed = True
+      self.changed.notify_all()
+
+  def wait_for_solutions(self, num_seen, timeout=None):
+    """Blocks until there are more than num_seen solutions or the search ends.
+
+    Args:
+      num_seen: The number of solutions the caller already handled.
+      timeout: The maximum number of seconds to wait, or None to wait forever.
+
+    Returns:
+      False if the timeout elapsed without any change, else True.
+    """
+    with self.changed:
+      return self.changed.wait_for(
+          lambda: len(self.solutions) > num_seen or self.completed, timeout)
@@ -0,0 +1,55 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for asyn_utils.py."""
+
+import threading
+
+from absl.testing import absltest
+from tf_coder import asyn_utils
+
+
+class AsynTest(absltest.TestCase):
+
+  def test_wait_for_solutions_times_out(self):
+    asyn = asyn_utils.Asyn()
+    self.assertFalse(asyn.wait_for_solutions(0, timeout=0.01))
+
+  def test_wait_for_solutions_wakes_up_on_notify(self):
+    asyn = asyn_utils.Asyn()
+
+    def add_solution():
+      asyn.solutions.append('solution')
+      asyn.notify()
+
+    thread = threading.Timer(0.01, add_solution)
+    thread.start()
+    self.assertTrue(asyn.wait_for_solutions(0, timeout=10))
+    self.assertLen(asyn.solutions, 1)
+    self.assertFalse(asyn.wait_for_solutions(1, timeout=0.01))
+    thread.join()
+
+  def test_wait_for_solutions_wakes_up_on_finish(self):
+    asyn = asyn_utils.Asyn()
+    thread = threading.Timer(0.01, asyn.finish)
+    thread.start()
+    self.assertTrue(asyn.wait_for_solutions(0, timeout=10))
+    self.assertTrue(asyn.completed)
+    self.assertEmpty(asyn.solutions)
+    thread.join()
+
+
+if __name__ == '__main__':
+  absltest.main()
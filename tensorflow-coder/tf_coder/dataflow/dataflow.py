@@ -1,5 +1,6 @@
-from typing import Dict, List, Tuple, Text, Any
+from typing import Dict, List, Optional, Tuple, Text, Any
 from collections import defaultdict
+import re
 import tensorflow as tf
 
 from tf_coder.value_search import value as value_module
@@ -7,6 +8,9 @@ from tf_coder.value_search import value_search as value_search_module
 from tf_coder.value_search import value_search_settings as settings_module
 from tf_coder.dataflow import dataflow_utils, trace
 
+# a string literal, or whitespace outside string literals
+_STRING_OR_WHITESPACE = re.compile(r'(\'[^\']*\'|"[^"]*")|\s+')
+
 
 def value_from_different_inputs(
     value: value_module.OperationValue, 
@@ -29,10 +33,49 @@ def value_from_different_inputs(
   return operation.apply(arg_values, settings_module.default_settings())
 
 
+def normalize_expression(expression: Text) -> Text:
+  """Removes the whitespace outside string literals of an expression."""
+  return _STRING_OR_WHITESPACE.sub(lambda match: match.group(1) or '',
+                                   expression)
+
+
 def value_from_text(
   expression: Text,
-  inputs: List[Any]
-) -> value_module.OperationValue:
+  inputs: List[Any],
+  cache: Optional[Dict[Text, value_module.Value]] = None
+) -> Optional[value_module.Value]:
+  """Evaluates an expression on inputs, keeping its structure.
+
+  Args:
+    expression: The expression to evaluate, e.g. 'tf.add(in1, in2)'.
+    inputs: The inputs of the example, a list or a dict by input name.
+    cache: An optional dict from normalized subexpressions to their values
+      on the same inputs. Subexpressions found there are not evaluated
+      again, and new subexpressions are added, so evaluating an edited
+      expression only evaluates the edited parts. Failed subexpressions are
+      not cached.
+
+  Returns:
+    The Value of the expression, or None if its outermost operation raises
+    an exception.
+  """
+  if cache is None:
+    return _value_from_text(expression, inputs, cache)
+  key = normalize_expression(expression)
+  value = cache.get(key)
+  if value is None:
+    value = _value_from_text(expression, inputs, cache)
+    if value is not None:
+      cache[key] = value
+  return value
+
+
+def _value_from_text(
+  expression: Text,
+  inputs: List[Any],
+  cache: Optional[Dict[Text, value_module.Value]]
+) -> Optional[value_module.Value]:
+  """Helper for value_from_text, which evaluates the arguments with cache."""
   # parse structure
   parsed_struct = dataflow_utils.parse_expression(expression)
   
@@ -50,18 +93,24 @@ def value_from_text(
   
   operation = dataflow_utils.find_operation_with_parsed_struct(parsed_struct)
   
-  arg_values = [value_from_text(arg, inputs) for arg in parsed_struct.list_of_args]
+  arg_values = [value_from_text(arg, inputs, cache)
+                for arg in parsed_struct.list_of_args]
     
   return operation.apply(arg_values, settings_module.default_settings())
   
 
 def dataflow_generator(
-    value: value_module.OutputValue
+    value: value_module.OutputValue,
+    trace_cache: Optional[Dict[Text, Any]] = None
 ) -> Tuple[Dict[Text, Dict[Text, Any]],         # value nodes
            List[Dict[Text, Any]],               # edges
            Dict[Text, List[Dict[Text, Any]]]]:  # trace edges
   """Return (nodes, edges) as in dataflow diagram.
 
+  trace_cache is an optional dict from subexpressions to their provenance
+  traces on the same inputs. Subexpressions found there are not traced
+  again, and new traces are added.
+
   The same intermediate values are merged with each other;
   The same constant values are merged with each other;
   The input values are not merged even if they have the same values,
@@ -136,7 +185,12 @@ def dataflow_generator(
     edges.append({"start": op_key, "end": value_node_key})
     
     # trace
-    trace_solutions = trace.trace(value)
+    if trace_cache is None:
+      trace_solutions = trace.trace(value)
+    else:
+      if expression not in trace_cache:
+        trace_cache[expression] = trace.trace(value)
+      trace_solutions = trace_cache[expression]
     
     for arg_value, arg_name in zip(arg_values, 
                                    dataflow_utils.separate_arg_names(operation)):
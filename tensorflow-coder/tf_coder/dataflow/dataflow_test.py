@@ -16,13 +16,18 @@
 """Tests for value_search.py."""
 
 from tf_coder.dataflow.dataflow import dataflow_generator
+from tf_coder.dataflow.dataflow import normalize_expression
+from tf_coder.dataflow.dataflow import value_from_text
 
+import mock
 import tensorflow as tf
 
 from absl import logging
 from absl.testing import absltest
 from absl.testing import parameterized
 
+from tf_coder.dataflow import dataflow_utils
+from tf_coder.dataflow import trace
 from tf_coder.value_search import all_operations
 from tf_coder.value_search import value as value_module
 from tf_coder.value_search import value_search_settings as settings_module
@@ -69,7 +74,47 @@ class DataFlowTest(parameterized.TestCase):
     result = operation.apply([self.in1, self.in2], self.settings)
     nodes, edges, trace_edges = dataflow_generator(result)
     self._check_no_type_printed(nodes)
-  
+
+  def test_normalize_expression(self):
+    self.assertEqual(normalize_expression(" tf.add( in1 , 'a b' ) "),
+                     "tf.add(in1,'a b')")
+
+  def test_value_from_text_reuses_cached_subexpressions(self):
+    inputs = [[[1, 2, 3]], [[1], [2], [3]]]
+    cache = {}
+    value = value_from_text('tf.add(in1, in2)', inputs, cache)
+    self.assertIn('tf.add(in1,in2)', cache)
+    self.assertIn('in2', cache)
+
+    with mock.patch.object(dataflow_utils, 'parse_expression',
+                           wraps=dataflow_utils.parse_expression) as parse:
+      edited = value_from_text('tf.multiply(tf.add(in1,in2), in2)', inputs,
+                               cache)
+    # Only the edited outer call is parsed and evaluated.
+    self.assertEqual(parse.call_count, 1)
+    self.assertIs(edited.operation_applications[0][1][0], value)
+    self.assertEqual(edited, value_from_text(
+        'tf.multiply(tf.add(in1, in2), in2)', inputs))
+
+  def test_value_from_text_does_not_cache_failures(self):
+    inputs = [[[1, 2], [3, 4]]]
+    cache = {}
+    self.assertIsNone(value_from_text('tf.argsort(in1, in1)', inputs, cache))
+    self.assertNotIn('tf.argsort(in1,in1)', cache)
+    self.assertNotIn(None, cache.values())
+    self.assertIn('in1', cache)
+
+  def test_dataflow_generator_reuses_cached_traces(self):
+    result = self.add_operation.apply([self.in1, self.in2], self.settings)
+    expected = dataflow_generator(result)
+    trace_cache = {}
+    self.assertEqual(dataflow_generator(result, trace_cache), expected)
+    self.assertIn('tf.add(in1, in2)', trace_cache)
+
+    with mock.patch.object(trace, 'trace') as trace_mock:
+      self.assertEqual(dataflow_generator(result, trace_cache), expected)
+    trace_mock.assert_not_called()
+
 
 if __name__ == '__main__':
   logging.set_verbosity(logging.ERROR)
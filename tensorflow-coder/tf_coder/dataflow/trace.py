@@ -166,7 +166,7 @@ def parse_differentiable_args(value, func_info, trace_info):
 
   with tf.GradientTape(persistent=True) as tape:
     output = operation.apply(
-        arg_values_copy, settings_module.default_settings).value
+        arg_values_copy, settings_module.default_settings()).value
     # squeeze output to a 1-D tensor;  
     squeezed_output = tf.reshape(output, [-1,])
     losses = [squeezed_output[i] for i in tf.range(squeezed_output.shape[0])]
@@ -351,7 +351,7 @@ def parse_stacklike_ops(value, func_info, trace_info):
 
   with tf.GradientTape(persistent=True) as tape:
     output = operation.apply(
-        arg_values_copy, settings_module.default_settings).value
+        arg_values_copy, settings_module.default_settings()).value
     squeezed_output = tf.reshape(output, [-1,])
     losses = [squeezed_output[i] for i in tf.range(squeezed_output.shape)]
 
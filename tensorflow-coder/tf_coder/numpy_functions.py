@@ -0,0 +1,338 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""NumPy equivalents of functions in tf_functions.py.
+
+During value search, applying a TensorFlow function to a tiny tensor is
+dominated by eager dispatch overhead. The functions here compute the same
+results with NumPy, where tensor arguments are given as NumPy arrays and other
+arguments are given as-is.
+
+Each function must produce exactly what the TensorFlow function would produce,
+bit for bit and including the dtype, or raise an exception. Any exception
+(including UnsupportedArgumentsError for argument kinds that are not handled
+here) causes the caller to fall back to TensorFlow, which decides whether the
+application actually fails.
+
+So only computations where NumPy and TensorFlow agree exactly are handled:
+integer arithmetic, correctly rounded float arithmetic, comparisons, sorting,
+and shape manipulation. Reductions and matmul of floats depend on the order of
+the additions, and transcendental functions on the math library, so they are
+left to TensorFlow. So is tf.math.reciprocal, whose float32 kernel is not
+correctly rounded (it gives 0.99999994 for 1.0).
+"""
+
+import numpy as np
+
+
+class UnsupportedArgumentsError(Exception):
+  """The arguments are not supported by the NumPy implementation."""
+
+
+# Dtypes for which TensorFlow arithmetic kernels are always available.
+_ARITHMETIC_DTYPES = (np.int32, np.int64, np.float32, np.float64)
+_FLOAT_DTYPES = (np.float32, np.float64)
+_INT_DTYPES = (np.int32, np.int64)
+
+
+def _require(condition):
+  if not condition:
+    raise UnsupportedArgumentsError()
+
+
+def _require_arrays(*args, dtypes=None):
+  """Requires the arguments to be arrays with one of the given dtypes."""
+  for arg in args:
+    _require(isinstance(arg, np.ndarray))
+    if dtypes is None:
+      _require(arg.dtype != np.object_)
+    else:
+      _require(arg.dtype in dtypes)
+
+
+def _require_same_dtype(*arrays):
+  _require(all(array.dtype == arrays[0].dtype for array in arrays))
+
+
+def _require_int(arg):
+  # TensorFlow does not accept bools as axes.
+  _require(type(arg) is int)  # pylint: disable=unidiomatic-typecheck
+
+
+def _int_list(arg):
+  """Returns an int sequence argument (list, tuple, or 1D array) as a list."""
+  if isinstance(arg, np.ndarray):
+    _require(arg.ndim == 1 and arg.dtype in _INT_DTYPES)
+    return arg.tolist()
+  _require(isinstance(arg, (list, tuple)))
+  for elem in arg:
+    _require_int(elem)
+  return list(arg)
+
+
+def _array_list(arg):
+  """Returns a sequence of arrays with the same dtype as a list."""
+  _require(isinstance(arg, (list, tuple)) and arg)
+  _require_arrays(*arg)
+  _require_same_dtype(*arg)
+  return list(arg)
+
+
+def _unary(np_function, dtypes):
+  """Creates an elementwise unary function."""
+  def function(x):
+    _require_arrays(x, dtypes=dtypes)
+    return np_function(x)
+  return function
+
+
+def _binary(np_function, dtypes):
+  """Creates an elementwise binary function with broadcasting."""
+  def function(x, y):
+    _require_arrays(x, y, dtypes=dtypes)
+    _require_same_dtype(x, y)
+    return np_function(x, y)
+  return function
+
+
+def _reduction(np_function, dtypes, keep_dtype=True):
+  """Creates a reduction over all axes or a given axis."""
+  def function(input_tensor, axis=None):
+    _require_arrays(input_tensor, dtypes=dtypes)
+    if axis is not None:
+      _require_int(axis)
+    if keep_dtype:
+      return np_function(input_tensor, axis=axis, dtype=input_tensor.dtype)
+    return np_function(input_tensor, axis=axis)
+  return function
+
+
+def _divide(x, y):
+  _require_arrays(x, y, dtypes=_ARITHMETIC_DTYPES)
+  _require_same_dtype(x, y)
+  # TensorFlow divides int32 and int64 tensors in float64, as NumPy does.
+  return np.true_divide(x, y)
+
+
+def _divide_no_nan(x, y):
+  _require_arrays(x, y, dtypes=_FLOAT_DTYPES)
+  _require_same_dtype(x, y)
+  return np.where(y == 0, np.zeros((), dtype=x.dtype), x / y)
+
+
+def _squared_difference(x, y):
+  _require_arrays(x, y, dtypes=_ARITHMETIC_DTYPES)
+  _require_same_dtype(x, y)
+  return np.square(x - y)
+
+
+def _equality(np_function):
+  """Creates an (in)equality test, which also supports bools."""
+  return _binary(np_function, _ARITHMETIC_DTYPES + (np.bool_,))
+
+
+def _reduce_any(input_tensor, axis):
+  _require_arrays(input_tensor, dtypes=(np.bool_,))
+  _require_int(axis)
+  return np.any(input_tensor, axis=axis)
+
+
+def _arg_reduction(np_function):
+  """Creates argmax or argmin."""
+  def function(input, axis):  # pylint: disable=redefined-builtin
+    # NumPy and TensorFlow treat NaNs differently.
+    _require_arrays(input, dtypes=_INT_DTYPES)
+    _require_int(axis)
+    return np_function(input, axis=axis).astype(np.int64)
+  return function
+
+
+def _argsort(values, axis):
+  _require_arrays(values, dtypes=_ARITHMETIC_DTYPES)
+  _require_int(axis)
+  return np.argsort(values, axis=axis, kind='stable').astype(np.int32)
+
+
+def _sort(values, axis):
+  _require_arrays(values, dtypes=_ARITHMETIC_DTYPES)
+  _require_int(axis)
+  return np.sort(values, axis=axis)
+
+
+def _sort_descending(values, axis):
+  return np.flip(_sort(values, axis), axis=axis)
+
+
+def _cumsum(x, axis):
+  _require_arrays(x, dtypes=_INT_DTYPES)
+  _require_int(axis)
+  return np.cumsum(x, axis=axis, dtype=x.dtype)
+
+
+def _cumsum_exclusive(x, axis):
+  result = np.roll(_cumsum(x, axis), 1, axis=axis)
+  first = [slice(None)] * x.ndim
+  first[axis] = 0
+  result[tuple(first)] = 0
+  return result
+
+
+def _expand_dims(input, axis):  # pylint: disable=redefined-builtin
+  _require_arrays(input)
+  _require_int(axis)
+  return np.expand_dims(input, axis)
+
+
+def _squeeze(input, axis=None):  # pylint: disable=redefined-builtin
+  _require_arrays(input)
+  if axis is not None:
+    _require_int(axis)
+  return np.squeeze(input, axis=axis)
+
+
+def _transpose(a, perm=None):
+  _require_arrays(a)
+  if perm is not None:
+    perm = _int_list(perm)
+    _require(all(axis >= 0 for axis in perm))
+  return np.transpose(a, perm)
+
+
+def _reshape(tensor, shape):
+  _require_arrays(tensor)
+  return np.reshape(tensor, _int_list(shape))
+
+
+def _reverse(tensor, axis):
+  _require_arrays(tensor)
+  axis = _int_list(axis)
+  _require(len(set(axis)) == len(axis))
+  return np.flip(tensor, axis=tuple(axis))
+
+
+def _tile(input, multiples):  # pylint: disable=redefined-builtin
+  _require_arrays(input)
+  multiples = _int_list(multiples)
+  _require(len(multiples) == input.ndim and min(multiples, default=0) >= 0)
+  return np.tile(input, multiples)
+
+
+def _like(np_function):
+  """Creates ones_like or zeros_like."""
+  def function(input):  # pylint: disable=redefined-builtin
+    _require_arrays(input, dtypes=_ARITHMETIC_DTYPES + (np.bool_,))
+    return np_function(input)
+  return function
+
+
+def _shape(input):  # pylint: disable=redefined-builtin
+  _require_arrays(input)
+  return np.array(input.shape, dtype=np.int32)
+
+
+def _where(condition, x=None, y=None):
+  _require_arrays(condition, dtypes=(np.bool_,))
+  if x is None and y is None:
+    return np.argwhere(condition).astype(np.int64)
+  _require_arrays(x, y, dtypes=_ARITHMETIC_DTYPES + (np.bool_,))
+  _require_same_dtype(x, y)
+  return np.where(condition, x, y)
+
+
+def _concat(values, axis):
+  _require_int(axis)
+  return np.concatenate(_array_list(values), axis=axis)
+
+
+def _stack(values, axis):
+  _require_int(axis)
+  return np.stack(_array_list(values), axis=axis)
+
+
+def _matmul(a, b):
+  _require_arrays(a, b, dtypes=_INT_DTYPES)
+  _require_same_dtype(a, b)
+  _require(a.ndim >= 2 and b.ndim >= 2)
+  return np.matmul(a, b)
+
+
+def _gather(params, indices):
+  _require_arrays(params)
+  _require_arrays(indices, dtypes=_INT_DTYPES)
+  # TensorFlow rejects negative indices, while NumPy counts from the end.
+  _require(indices.size == 0 or indices.min() >= 0)
+  return np.take(params, indices, axis=0)
+
+
+# Maps FunctionInfo names (from tf_functions.TF_FUNCTIONS) to NumPy functions
+# taking the same positional arguments.
+NUMPY_FUNCTIONS = {
+    'tf.abs(x)': _unary(np.abs, _ARITHMETIC_DTYPES),
+    'tf.add(x, y)': _binary(np.add, _ARITHMETIC_DTYPES),
+    'tf.argmax(input, axis)': _arg_reduction(np.argmax),
+    'tf.argmin(input, axis)': _arg_reduction(np.argmin),
+    'tf.argsort(values, axis, stable=True)': _argsort,
+    'tf.concat(values, axis)': _concat,
+    'tf.divide(x, y)': _divide,
+    'tf.equal(x, y)': _equality(np.equal),
+    'tf.expand_dims(input, axis)': _expand_dims,
+    'tf.gather(params, indices)': _gather,
+    'tf.greater(x, y)': _binary(np.greater, _ARITHMETIC_DTYPES),
+    'tf.greater_equal(x, y)': _binary(np.greater_equal, _ARITHMETIC_DTYPES),
+    'tf.math.ceil(x)': _unary(np.ceil, _FLOAT_DTYPES),
+    'tf.math.cumsum(x, axis)': _cumsum,
+    'tf.math.cumsum(x, axis, exclusive=True)': _cumsum_exclusive,
+    'tf.math.divide_no_nan(x, y)': _divide_no_nan,
+    'tf.math.floor(x)': _unary(np.floor, _FLOAT_DTYPES),
+    'tf.math.negative(x)': _unary(np.negative, _ARITHMETIC_DTYPES),
+    'tf.math.squared_difference(x, y)': _squared_difference,
+    'tf.matmul(a, b)': _matmul,
+    'tf.maximum(x, y)': _binary(np.maximum, _ARITHMETIC_DTYPES),
+    'tf.minimum(x, y)': _binary(np.minimum, _ARITHMETIC_DTYPES),
+    'tf.multiply(x, y)': _binary(np.multiply, _ARITHMETIC_DTYPES),
+    'tf.not_equal(x, y)': _equality(np.not_equal),
+    'tf.ones_like(input)': _like(np.ones_like),
+    'tf.reduce_any(input_tensor, axis)': _reduce_any,
+    'tf.reduce_max(input_tensor)': _reduction(np.max, _INT_DTYPES,
+                                              keep_dtype=False),
+    'tf.reduce_max(input_tensor, axis)': _reduction(np.max, _INT_DTYPES,
+                                                    keep_dtype=False),
+    'tf.reduce_min(input_tensor)': _reduction(np.min, _INT_DTYPES,
+                                              keep_dtype=False),
+    'tf.reduce_min(input_tensor, axis)': _reduction(np.min, _INT_DTYPES,
+                                                    keep_dtype=False),
+    'tf.reduce_prod(input_tensor, axis)': _reduction(np.prod, _INT_DTYPES),
+    'tf.reduce_sum(input_tensor)': _reduction(np.sum, _INT_DTYPES),
+    'tf.reduce_sum(input_tensor, axis)': _reduction(np.sum, _INT_DTYPES),
+    'tf.reshape(tensor, shape)': _reshape,
+    'tf.reverse(tensor, axis)': _reverse,
+    'tf.round(x)': _unary(np.round, _FLOAT_DTYPES),
+    'tf.shape(input)': _shape,
+    'tf.sign(x)': _unary(np.sign, _ARITHMETIC_DTYPES),
+    'tf.sort(values, axis)': _sort,
+    "tf.sort(values, axis, direction='DESCENDING')": _sort_descending,
+    'tf.sqrt(x)': _unary(np.sqrt, _FLOAT_DTYPES),
+    'tf.square(x)': _unary(np.square, _ARITHMETIC_DTYPES),
+    'tf.squeeze(input)': _squeeze,
+    'tf.squeeze(input, axis)': _squeeze,
+    'tf.stack(values, axis)': _stack,
+    'tf.subtract(x, y)': _binary(np.subtract, _ARITHMETIC_DTYPES),
+    'tf.tile(input, multiples)': _tile,
+    'tf.transpose(a)': _transpose,
+    'tf.transpose(a, perm)': _transpose,
+    'tf.where(condition)': _where,
+    'tf.where(condition, x, y)': _where,
+    'tf.zeros_like(input)': _like(np.zeros_like),
+}
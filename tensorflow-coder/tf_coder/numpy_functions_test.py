@@ -0,0 +1,134 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for numpy_functions.py."""
+
+import random
+
+from absl import logging
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+import tensorflow as tf
+from tf_coder import numpy_functions
+from tf_coder import tf_coder_utils
+from tf_coder import tf_functions
+from tf_coder.datasets import random_inputs
+from tf_coder.value_search import function_operation
+from tf_coder.value_search import value
+from tf_coder.value_search import value_search_settings as settings_module
+
+# The number of random argument lists to try for each function.
+NUM_TRIALS = 300
+
+
+def _exact_string(result_value):
+  """Returns a string of a Value's tensor, with floats written exactly.
+
+  Unlike tf_coder_utils.object_to_string(), floats are not rounded, so results
+  are only equal if they are equal bit for bit.
+  """
+  array = result_value.numpy_value()
+  return repr(result_value.dtype) + ':' + str(array.tolist())
+
+
+def _random_values():
+  """Returns a pool of Values to be used as random arguments."""
+  random.seed(0)
+  np.random.seed(0)
+  tensors = [random_inputs.generate_random_tensor(python_type)
+             for python_type in [int, int, float, float, bool] * 10]
+  values = [value.ConstantValue(tensor) for tensor in tensors]
+  values.extend(value.ConstantValue(i) for i in range(-2, 4))
+  values.extend(value.ConstantValue(shape)
+                for shape in [(-1,), (2, -1), (1, 0), (0, 1)])
+  for tensor_1, tensor_2 in zip(tensors, tensors[5:]):
+    values.append(value.ConstantValue([tensor_1, tensor_2]))
+    values.append(value.ConstantValue([tensor_1, tensor_1]))
+  return values
+
+
+class NumpyFunctionsTest(parameterized.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    super(NumpyFunctionsTest, cls).setUpClass()
+    cls.pool = _random_values()
+
+  def test_names_match_tf_functions(self):
+    tf_function_names = {function_info.name
+                         for function_info in tf_functions.TF_FUNCTIONS}
+    for name in numpy_functions.NUMPY_FUNCTIONS:
+      self.assertIn(name, tf_function_names)
+
+  @parameterized.named_parameters(
+      (name, name) for name in sorted(numpy_functions.NUMPY_FUNCTIONS))
+  def test_matches_tensorflow(self, function_info_name):
+    function_info = [function_info
+                     for function_info in tf_functions.TF_FUNCTIONS
+                     if function_info.name == function_info_name][0]
+    operation = function_operation.FunctionOperation(function_info)
+    tf_settings = settings_module.from_dict(
+        {'operations.use_numpy_backend': False})
+    numpy_settings = settings_module.from_dict(
+        {'operations.use_numpy_backend': True})
+
+    rng = random.Random(function_info_name)
+    for _ in range(NUM_TRIALS):
+      value_filters = rng.choice(operation._value_filters_list or
+                                 [[None] * operation.num_args])
+      arg_options = [[v for v in self.pool
+                      if value_filter is None or value_filter(v)]
+                     for value_filter in value_filters]
+      if not all(arg_options):
+        continue
+      arg_values = [rng.choice(options) for options in arg_options]
+      if not operation._passes_filters(arg_values, tf_settings):
+        continue
+
+      tf_result = operation.apply(arg_values, tf_settings)
+      numpy_result = operation.apply(arg_values, numpy_settings)
+      expression = operation.reconstruct_expression(arg_values)
+      if tf_result is None:
+        self.assertIsNone(numpy_result, expression)
+      else:
+        self.assertIsNotNone(numpy_result, expression)
+        self.assertEqual(_exact_string(numpy_result), _exact_string(tf_result),
+                         expression)
+
+  def test_numpy_results_are_not_converted_to_tensors(self):
+    function_info = [function_info
+                     for function_info in tf_functions.TF_FUNCTIONS
+                     if function_info.name == 'tf.add(x, y)'][0]
+    operation = function_operation.FunctionOperation(function_info)
+    settings = settings_module.from_dict({'operations.use_numpy_backend': True})
+    arg_values = [value.ConstantValue(np.array([1, 2], dtype=np.int32)),
+                  value.ConstantValue(np.array([3, 4], dtype=np.int32))]
+    result = operation.apply(arg_values, settings)
+    self.assertIsInstance(result.numpy_value(), np.ndarray)
+    self.assertNotIn('value', result.__dict__)
+    self.assertTrue(result.is_tensor)
+    self.assertEqual(result.dtype, tf.int32)
+    self.assertEqual(result.shape, [2])
+    # The tensor is created when it is needed, with the same fingerprint.
+    self.assertEqual(tf_coder_utils.object_to_string(result.value),
+                     'tf.int32:[4, 6]')
+    self.assertEqual(result, value.ConstantValue(tf.constant([4, 6])))
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.ERROR)
+
+  absltest.main()
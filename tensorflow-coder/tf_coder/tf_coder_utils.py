@@ -16,6 +16,7 @@
 """Utilities for TF-Coder."""
 
 import functools
+import hashlib
 import itertools
 import operator
 from typing import List
@@ -38,6 +39,9 @@ FLOAT_DTYPES = (tf.float32, tf.float64, tf.float16)
 # The prefix for the name of a TensorFlow function.
 TF_PREFIX = 'tf.'
 
+# The size in bytes of fingerprints computed by object_to_fingerprint().
+FINGERPRINT_SIZE = 16
+
 # Maps integral dtypes to their min and max values.
 INT_DTYPE_MIN_MAX = {
     tf.int8: (-2**7, 2**7 - 1),
@@ -178,6 +182,111 @@ def object_to_string(obj, decimals=limits.NUM_DECIMALS):
                    'and str={}.'.format(obj_type, obj))
 
 
+def _update_fingerprint_with_array(hasher, np_array, decimals):
+  """Feeds a NumPy array into `hasher`, quantized like tensor_to_string()."""
+  hasher.update(np_array.dtype.str.encode())
+  hasher.update(repr(np_array.shape).encode())
+  if np_array.dtype.kind == 'O':
+    # String tensors hold Python bytes objects; feed them length-prefixed.
+    for elem in np_array.flat:
+      elem = elem if isinstance(elem, bytes) else str(elem).encode()
+      hasher.update(len(elem).to_bytes(8, 'little'))
+      hasher.update(elem)
+    return
+  if np_array.dtype in [np.float32, np.float64]:
+    np_array = np.around(np_array, decimals=decimals)
+  if np_array.dtype.kind == 'f':
+    # All NaNs print as 'nan', so they must share a single bit pattern. Signed
+    # zeros print differently and are kept distinct.
+    np_array = np.where(np.isnan(np_array), np.nan, np_array).astype(
+        np_array.dtype)
+  np_array = np.ascontiguousarray(np_array,
+                                  dtype=np_array.dtype.newbyteorder('<'))
+  hasher.update(np_array.tobytes())
+
+
+def _update_fingerprint(hasher, obj, decimals):
+  """Recursively feeds `obj` into `hasher`. See object_to_fingerprint()."""
+  if isinstance(obj, tf.Tensor):
+    hasher.update(b'T' + repr(obj.dtype).encode())
+    _update_fingerprint_with_array(hasher, obj.numpy(), decimals)
+    return
+  if isinstance(obj, np.ndarray):
+    # The fingerprint of the tensor this array converts to.
+    hasher.update(b'T' + repr(tf.as_dtype(obj.dtype)).encode())
+    _update_fingerprint_with_array(hasher, obj, decimals)
+    return
+  if isinstance(obj, tf.SparseTensor):
+    hasher.update(b'S' + repr(obj.dtype).encode())
+    for component in (obj.indices, obj.values, obj.dense_shape):
+      _update_fingerprint_with_array(hasher, component.numpy(), decimals)
+    return
+
+  obj_type = type(obj)
+
+  if obj_type in (int, float, bool, str, tf.DType):
+    if obj_type == float:
+      obj = round(obj, decimals)
+    encoded = repr(obj).encode()
+    hasher.update(b'P' + len(encoded).to_bytes(8, 'little'))
+    hasher.update(encoded)
+    return
+
+  if obj_type == list or isinstance(obj, tuple):
+    hasher.update(b'L' + len(obj).to_bytes(8, 'little'))
+    for elem in obj:
+      _update_fingerprint(hasher, elem, decimals)
+    return
+
+  raise ValueError('object_to_fingerprint called with unsupported object; '
+                   'type={} and str={}.'.format(obj_type, obj))
+
+
+def object_to_fingerprint(obj, decimals=limits.NUM_DECIMALS):
+  """Computes a compact fixed-size digest of an object used for equality tests.
+
+  Two objects have the same fingerprint if and only if (barring hash
+  collisions) their object_to_string() representations are equal, i.e.,
+  floating-point values are rounded to `decimals` places and lists and tuples
+  with the same elements are considered the same. Unlike object_to_string(),
+  SparseTensor values are also rounded.
+
+  The fingerprint only depends on the object's contents, so it is stable across
+  processes and can be used to key persistent or shared caches.
+
+  Args:
+    obj: An object supported by object_to_string(), or a NumPy array, which
+      has the fingerprint of the tensor it converts to.
+    decimals: As described in tensor_to_string().
+
+  Returns:
+    A bytes object of length FINGERPRINT_SIZE.
+
+  Raises:
+    ValueError: If `obj` has an unsupported type.
+  """
+  hasher = hashlib.blake2b(digest_size=FINGERPRINT_SIZE)
+  _update_fingerprint(hasher, obj, decimals)
+  return hasher.digest()
+
+
+def combine_fingerprints(fingerprints):
+  """Combines a sequence of fingerprints into a single fingerprint.
+
+  Args:
+    fingerprints: A sequence of fingerprints from object_to_fingerprint().
+
+  Returns:
+    A bytes object of length FINGERPRINT_SIZE that depends on every fingerprint
+    and on their order.
+  """
+  hasher = hashlib.blake2b(digest_size=FINGERPRINT_SIZE)
+  hasher.update(b'C' + len(fingerprints).to_bytes(8, 'little'))
+  for fingerprint in fingerprints:
+    hasher.update(fingerprint)
+  return hasher.digest()
+
+
 @functools.lru_cache(maxsize=None)
 def generate_partitions(num_elements: int, num_parts: int) -> List[List[int]]:
   """Generates partitions of num_elements into num_parts nonnegative parts.
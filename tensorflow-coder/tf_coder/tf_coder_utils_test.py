@@ -20,6 +20,7 @@ import collections
 from absl import logging
 from absl.testing import absltest
 from absl.testing import parameterized
+import numpy as np
 import tensorflow as tf
 from tf_coder import tf_coder_utils
 
@@ -155,6 +156,67 @@ class TfCoderUtilsTest(parameterized.TestCase):
     with self.assertRaises(ValueError):
       tf_coder_utils.object_to_string({'key': 'value'})
 
+  @parameterized.named_parameters(
+      ('same_int_tensor', tf.constant([1, 2]), tf.constant([1, 2]), True),
+      ('different_int_tensor', tf.constant([1, 2]), tf.constant([1, 3]), False),
+      ('different_dtype', tf.constant([1, 2]), tf.constant([1, 2], tf.int64),
+       False),
+      ('different_shape', tf.constant([[1, 2]]), tf.constant([[1], [2]]),
+       False),
+      ('scalar_vs_vector', tf.constant(1), tf.constant([1]), False),
+      ('rounded_floats', tf.constant([1.000001]), tf.constant([1.0]), True),
+      ('unrounded_floats', tf.constant([1.0001]), tf.constant([1.0]), False),
+      ('signed_zeros', tf.constant([0.0]), tf.constant([-0.0]), False),
+      ('nans', tf.constant([float('nan')]), tf.constant([-float('nan')]), True),
+      ('strings', tf.constant(['a', 'bc']), tf.constant(['ab', 'c']), False),
+      ('tensor_vs_primitive', tf.constant(1), 1, False),
+      ('int_vs_float', 1, 1.0, False),
+      ('int_vs_bool', 1, True, False),
+      ('rounded_primitive_floats', 1.000001, 1.0, True),
+      ('list_vs_tuple', [1, tf.constant([2])], (1, tf.constant([2])), True),
+      ('nested_sequences', [[1], 2], [1, [2]], False),
+      ('dtypes', tf.int32, tf.int32, True))
+  def test_object_to_fingerprint_matches_object_to_string(self, obj_1, obj_2,
+                                                          expected_equal):
+    fingerprint_1 = tf_coder_utils.object_to_fingerprint(obj_1)
+    fingerprint_2 = tf_coder_utils.object_to_fingerprint(obj_2)
+    self.assertLen(fingerprint_1, tf_coder_utils.FINGERPRINT_SIZE)
+    self.assertEqual(fingerprint_1 == fingerprint_2, expected_equal)
+    self.assertEqual(tf_coder_utils.object_to_string(obj_1) ==
+                     tf_coder_utils.object_to_string(obj_2), expected_equal)
+
+  def test_object_to_fingerprint_is_stable(self):
+    # The fingerprint must not depend on the process, e.g., through hash().
+    self.assertEqual(tf_coder_utils.object_to_fingerprint(123).hex(),
+                     'd5567aa4ede510e6e66d5464fe72a979')
+
+  def test_object_to_fingerprint_sparse_tensor(self):
+    sparse_1 = tf.SparseTensor(indices=[[0, 0]], values=[1.000001],
+                               dense_shape=[2, 2])
+    sparse_2 = tf.SparseTensor(indices=[[0, 0]], values=[1.0],
+                               dense_shape=[2, 2])
+    sparse_3 = tf.SparseTensor(indices=[[0, 1]], values=[1.0],
+                               dense_shape=[2, 2])
+    self.assertEqual(tf_coder_utils.object_to_fingerprint(sparse_1),
+                     tf_coder_utils.object_to_fingerprint(sparse_2))
+    self.assertNotEqual(tf_coder_utils.object_to_fingerprint(sparse_2),
+                        tf_coder_utils.object_to_fingerprint(sparse_3))
+
+  def test_object_to_fingerprint_numpy_array_matches_tensor(self):
+    for array in [np.array([[1, 2], [3, 4]], dtype=np.int32),
+                  np.array([1.5, -0.0, np.nan], dtype=np.float32),
+                  np.array(True)]:
+      self.assertEqual(
+          tf_coder_utils.object_to_fingerprint(array),
+          tf_coder_utils.object_to_fingerprint(tf.convert_to_tensor(array)))
+    self.assertNotEqual(
+        tf_coder_utils.object_to_fingerprint(np.array([1], dtype=np.int32)),
+        tf_coder_utils.object_to_fingerprint(tf.constant([1], tf.int64)))
+
+  def test_object_to_fingerprint_raises_if_unsupported(self):
+    with self.assertRaises(ValueError):
+      tf_coder_utils.object_to_fingerprint({'key': 'value'})
+
   @parameterized.named_parameters(
       ('0_elements_1_part', 0, 1, [[0]]),
       ('0_elements_2_parts', 0, 2, [[0, 0]]),
@@ -522,6 +522,40 @@ REQUIRES_FILTERING = [
 ]
 
 
+# A list of operation names that act elementwise (with broadcasting) on tensor
+# arguments. Applying such an operation to arguments stacked along a new leading
+# axis is equivalent to applying it to each set of arguments separately.
+ELEMENTWISE_FUNCTIONS = [
+    # Unary.
+    'tf.abs(x)',
+    'tf.exp(x)',
+    'tf.math.ceil(x)',
+    'tf.math.floor(x)',
+    'tf.math.log(x)',
+    'tf.math.negative(x)',
+    'tf.math.reciprocal(x)',
+    'tf.math.reciprocal_no_nan(x)',
+    'tf.round(x)',
+    'tf.sign(x)',
+    'tf.sqrt(x)',
+    'tf.square(x)',
+
+    # Binary with broadcasting.
+    'tf.add(x, y)',
+    'tf.divide(x, y)',
+    'tf.equal(x, y)',
+    'tf.greater(x, y)',
+    'tf.greater_equal(x, y)',
+    'tf.math.divide_no_nan(x, y)',
+    'tf.math.squared_difference(x, y)',
+    'tf.maximum(x, y)',
+    'tf.minimum(x, y)',
+    'tf.multiply(x, y)',
+    'tf.not_equal(x, y)',
+    'tf.subtract(x, y)',
+]
+
+
 def parse_function_info_name(function_info):
   """Takes a FunctionInfo and returns (function_name, list_of_args).
 
@@ -13,9 +13,16 @@
 # limitations under the License.
 
 # Lint as: python3
-"""Manages all Operation objects used by value search."""
+"""Manages all Operation objects used by value search.
+
+Creating operations is slow (it inspects function signatures and sets up
+filters), so each operation is created once per process and shared. Shared
+operations must not be modified: a search that needs different weights uses
+copies made with Operation.with_weight().
+"""
 
 import inspect
+import threading
 from typing import List, Optional, Text, Dict, Any
 
 from tf_coder import tf_functions
@@ -24,25 +31,62 @@ from tf_coder.value_search import operation_base
 from tf_coder.value_search import python_operations
 
 
-def get_python_operations() -> List[operation_base.Operation]:
-  """Returns a list of Operation objects from the python_operations module."""
+# Kinds of operations in the registry.
+_TF = 'tf'
+_SPARSE = 'sparse'
+_PYTHON = 'python'
+
+# A map from kinds of operations to the shared Operation objects, and a map
+# from operation names to Operation objects. Both are created on first use.
+_registry = None  # type: Optional[Dict[Text, List[operation_base.Operation]]]
+_operations_by_name = None  # type: Optional[Dict[Text, operation_base.Operation]]
+_registry_lock = threading.Lock()
+
+
+def _create_registry() -> Dict[Text, List[operation_base.Operation]]:
+  """Creates the Operation objects of every kind."""
   operation_classes = inspect.getmembers(
       python_operations,
       lambda x: inspect.isclass(x) and not inspect.isabstract(x))
-  return [operation_class()
-          for unused_name, operation_class in operation_classes]
+  return {
+      _TF: [function_operation.FunctionOperation(function_info)
+            for function_info in tf_functions.TF_FUNCTIONS],
+      _SPARSE: [function_operation.FunctionOperation(function_info)
+                for function_info in tf_functions.SPARSE_FUNCTIONS],
+      _PYTHON: [operation_class()
+                for unused_name, operation_class in operation_classes],
+  }
+
+
+def _get_registry() -> Dict[Text, List[operation_base.Operation]]:
+  """Returns the shared Operation objects, creating them if needed."""
+  global _registry, _operations_by_name
+  with _registry_lock:
+    if _registry is None:
+      registry = _create_registry()
+      operations_by_name = {}
+      for operations in registry.values():
+        for operation in operations:
+          if operation.name in operations_by_name:
+            raise ValueError('Operation names were not unique.')
+          operations_by_name[operation.name] = operation
+      _registry, _operations_by_name = registry, operations_by_name
+    return _registry
+
+
+def get_python_operations() -> List[operation_base.Operation]:
+  """Returns a list of Operation objects from the python_operations module."""
+  return list(_get_registry()[_PYTHON])
 
 
 def get_tf_operations() -> List[operation_base.Operation]:
   """Returns a list of Operation objects for dense TensorFlow operations."""
-  return [function_operation.FunctionOperation(function_info)
-          for function_info in tf_functions.TF_FUNCTIONS]
+  return list(_get_registry()[_TF])
 
 
 def get_sparse_operations() -> List[operation_base.Operation]:
   """Returns a list of Operation objects for sparse operations."""
-  return [function_operation.FunctionOperation(function_info)
-          for function_info in tf_functions.SPARSE_FUNCTIONS]
+  return list(_get_registry()[_SPARSE])
 
 
 def get_operations(
@@ -62,9 +106,13 @@ def find_operation_with_name(
 ) -> operation_base.Operation:
   """Finds an operation with the given name, optionally within a given list."""
   if operation_list is None:
-    operation_list = get_operations(include_sparse_operations=True)
-  matching_operations = [op for op in operation_list
-                         if op.name == operation_name]
+    _get_registry()
+    if operation_name in _operations_by_name:
+      return _operations_by_name[operation_name]
+    matching_operations = []
+  else:
+    matching_operations = [op for op in operation_list
+                           if op.name == operation_name]
   if len(matching_operations) == 1:
     return matching_operations[0]
 
@@ -104,6 +104,17 @@ class AllOperationsTest(parameterized.TestCase):
         'tf.add(x, y)', operation_list=all_operations.get_tf_operations())
     self.assertEqual(operation.name, 'tf.add(x, y)')
 
+  def test_operations_are_shared(self):
+    operations_1 = all_operations.get_operations(include_sparse_operations=True)
+    operations_2 = all_operations.get_operations(include_sparse_operations=True)
+    self.assertIsNot(operations_1, operations_2)
+    for operation_1, operation_2 in zip(operations_1, operations_2):
+      self.assertIs(operation_1, operation_2)
+    self.assertIs(all_operations.find_operation_with_name('tf.add(x, y)'),
+                  all_operations.find_operation_with_name(
+                      'tf.add(x, y)',
+                      operation_list=all_operations.get_tf_operations()))
+
   def test_find_operation_with_name_raises_if_not_found(self):
     with self.assertRaises(ValueError):
       all_operations.find_operation_with_name('bad name')
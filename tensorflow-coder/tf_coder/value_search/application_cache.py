@@ -0,0 +1,209 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""A memo of operation applications, shared by searches.
+
+Searches apply operations to many of the same arguments: re-searching a
+problem with different operation weights repeats almost all applications, and
+small constants and common inputs recur across problems. Applications are
+identified by the operation name and the fingerprints of the arguments, which
+do not depend on operation weights or argument names, so results from one
+search can be reused in another one. Failures are remembered as well, since
+most applications fail.
+"""
+
+import collections
+import os
+import threading
+import weakref
+from typing import Dict, Optional, Sequence, Text, Tuple
+
+from tf_coder.value_search import value
+
+
+# The default maximum number of applications to remember.
+DEFAULT_MAX_SIZE = 2000000
+
+# The maximum number of applications remembered by the process-wide cache.
+GLOBAL_MAX_SIZE = 1000000
+
+# An application key: the operation name, the number of examples, and the
+# argument fingerprints.
+ApplicationKey = Tuple[Text, int, Tuple[bytes, ...]]
+
+# All caches, so their locks can be replaced in forked children.
+_all_caches = weakref.WeakSet()  # type: weakref.WeakSet
+
+_global_cache = None  # type: Optional[ApplicationCache]
+_global_cache_lock = threading.Lock()
+
+
+def _with_application(result: value.OperationValue,
+                      operation,
+                      arg_values: Optional[Sequence[value.Value]]
+                     ) -> value.OperationValue:
+  """Returns `result` as an application of `operation` on every example.
+
+  The counterparts of `result` on the other examples are applications of
+  `operation` to the arguments' counterparts. If `arg_values` is None, the
+  results are not applications of anything.
+  """
+  new_result = result.with_application(operation, arg_values)
+  if result.other_example_values is not None:
+    # Set the attribute directly to keep the cached fingerprint.
+    new_result.other_example_values = [
+        other.with_application(
+            operation,
+            None if arg_values is None else
+            [arg_value.for_example(index + 1) for arg_value in arg_values])
+        if isinstance(other, value.OperationValue) else other
+        for index, other in enumerate(result.other_example_values)]
+  return new_result
+
+
+class ApplicationCache(object):
+  """A size-bounded LRU cache mapping operation applications to their results.
+
+  The cache is thread-safe, so it may be shared by concurrent searches.
+  """
+
+  def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+    """Initializes an empty cache.
+
+    Args:
+      max_size: The maximum number of applications to remember. Once the cache
+        is full, the least recently used applications are forgotten.
+    """
+    self.max_size = max_size
+    # A map from application keys to results, where None means failure. The
+    # most recently used applications are last.
+    self._cache = collections.OrderedDict(
+    )  # type: Dict[ApplicationKey, Optional[value.OperationValue]]
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    _all_caches.add(self)
+
+  def __len__(self) -> int:
+    return len(self._cache)
+
+  @property
+  def hit_rate(self) -> float:
+    """The fraction of lookups that found a cached application."""
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+  def stats(self) -> Dict[Text, float]:
+    """Returns counters describing the use of this cache."""
+    return {'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate}
+
+  @staticmethod
+  def _key(operation_name: Text,
+           arg_values: Sequence[value.Value]) -> ApplicationKey:
+    # Results of multi-example searches also store their counterparts on the
+    # other examples, so they are kept apart from single-example results.
+    num_examples = max((arg_value.num_examples for arg_value in arg_values),
+                       default=1)
+    return (operation_name, num_examples,
+            tuple(arg_value.fingerprint() for arg_value in arg_values))
+
+  def lookup(self,
+             operation,
+             arg_values: Sequence[value.Value]
+            ) -> Tuple[bool, Optional[value.OperationValue]]:
+    """Looks up the result of applying an operation to arguments.
+
+    Args:
+      operation: The Operation being applied.
+      arg_values: The argument Values.
+
+    Returns:
+      A pair (found, result). If `found` is True, `result` is the cached result
+      (None if the application failed), recreated as an application of
+      `operation` to `arg_values`.
+    """
+    key = self._key(operation.name, arg_values)
+    with self._lock:
+      if key not in self._cache:
+        self.misses += 1
+        return False, None
+      self.hits += 1
+      self._cache.move_to_end(key)
+      cached_value = self._cache[key]
+    if cached_value is None:
+      return True, None
+    return True, _with_application(cached_value, operation, arg_values)
+
+  def store(self,
+            operation,
+            arg_values: Sequence[value.Value],
+            result: Optional[value.Value]) -> None:
+    """Remembers the result of applying an operation to arguments.
+
+    Args:
+      operation: The Operation that was applied.
+      arg_values: The argument Values.
+      result: The resulting Value, or None if the application failed.
+    """
+    if self.max_size <= 0:
+      return
+    if result is not None:
+      if not isinstance(result, value.OperationValue):
+        return
+      # Don't keep the arguments (and the rest of this search) alive, on any
+      # example.
+      result = _with_application(result, None, None)
+    key = self._key(operation.name, arg_values)
+    with self._lock:
+      self._cache[key] = result
+      self._cache.move_to_end(key)
+      while len(self._cache) > self.max_size:
+        self._cache.popitem(last=False)
+        self.evictions += 1
+
+  def clear(self) -> None:
+    """Forgets all applications and resets the counters."""
+    with self._lock:
+      self._cache.clear()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+
+def global_cache() -> ApplicationCache:
+  """Returns the process-wide ApplicationCache, creating it if needed."""
+  global _global_cache
+  with _global_cache_lock:
+    if _global_cache is None:
+      _global_cache = ApplicationCache(max_size=GLOBAL_MAX_SIZE)
+    return _global_cache
+
+
+def _reset_locks_after_fork() -> None:
+  """Replaces locks that another thread may have held while forking."""
+  global _global_cache_lock
+  _global_cache_lock = threading.Lock()
+  for cache in _all_caches:
+    cache._lock = threading.Lock()  # pylint: disable=protected-access
+
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child=_reset_locks_after_fork)
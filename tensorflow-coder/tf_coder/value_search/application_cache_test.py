@@ -0,0 +1,170 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for application_cache.py."""
+
+import gc
+import weakref
+
+from absl.testing import absltest
+import tensorflow as tf
+from tf_coder.value_search import all_operations
+from tf_coder.value_search import application_cache
+from tf_coder.value_search import value
+from tf_coder.value_search import value_search_settings as settings_module
+
+
+class ApplicationCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super(ApplicationCacheTest, self).setUp()
+    self.settings = settings_module.default_settings()
+    self.operation = all_operations.find_operation_with_name('tf.add(x, y)')
+    self.arg_values = [value.InputValue([1, 2], 'in1'),
+                       value.ConstantValue(10)]
+
+  def test_lookup_missing(self):
+    cache = application_cache.ApplicationCache()
+    self.assertEqual(cache.lookup(self.operation, self.arg_values),
+                     (False, None))
+    self.assertEqual(cache.misses, 1)
+
+  def test_store_and_lookup(self):
+    cache = application_cache.ApplicationCache()
+    result = self.operation.apply(self.arg_values, self.settings)
+    cache.store(self.operation, self.arg_values, result)
+    self.assertLen(cache, 1)
+
+    # Equal arguments from a different search share the cached result.
+    other_arg_values = [value.InputValue([1, 2], 'in1'),
+                        value.ConstantValue(10)]
+    found, cached_result = cache.lookup(self.operation, other_arg_values)
+    self.assertTrue(found)
+    self.assertEqual(cached_result, result)
+    self.assertIsNot(cached_result, result)
+    self.assertEqual(cached_result.reconstruct_expression(),
+                     'tf.add(in1, 10)')
+    self.assertIs(cached_result.operation_applications[0].arg_values,
+                  other_arg_values)
+    self.assertEqual(cache.hits, 1)
+
+  def test_store_failure(self):
+    cache = application_cache.ApplicationCache()
+    arg_values = [value.InputValue([1, 2], 'in1'),
+                  value.InputValue(tf.constant([1.0, 2.0]), 'in2')]
+    self.assertIsNone(self.operation.apply(arg_values, self.settings))
+    cache.store(self.operation, arg_values, None)
+    self.assertEqual(cache.lookup(self.operation, arg_values), (True, None))
+
+  def test_max_size_evicts_least_recently_used(self):
+    cache = application_cache.ApplicationCache(max_size=2)
+    first_arg_values = [value.ConstantValue(10), value.ConstantValue(20)]
+    second_arg_values = [value.ConstantValue(30), value.ConstantValue(40)]
+    cache.store(self.operation, self.arg_values, None)
+    cache.store(self.operation, first_arg_values, None)
+    # Using the first application makes the second one least recently used.
+    self.assertTrue(cache.lookup(self.operation, self.arg_values)[0])
+    cache.store(self.operation, second_arg_values, None)
+    self.assertLen(cache, 2)
+    self.assertEqual(cache.evictions, 1)
+    self.assertTrue(cache.lookup(self.operation, self.arg_values)[0])
+    self.assertFalse(cache.lookup(self.operation, first_arg_values)[0])
+    self.assertTrue(cache.lookup(self.operation, second_arg_values)[0])
+
+  def test_stats(self):
+    cache = application_cache.ApplicationCache(max_size=10)
+    cache.store(self.operation, self.arg_values, None)
+    cache.lookup(self.operation, self.arg_values)
+    cache.lookup(self.operation, self.arg_values)
+    cache.lookup(self.operation, [value.ConstantValue(1)] * 2)
+    self.assertEqual(cache.stats(), {'size': 1, 'max_size': 10, 'hits': 2,
+                                     'misses': 1, 'evictions': 0,
+                                     'hit_rate': 2 / 3})
+    cache.clear()
+    self.assertEmpty(cache)
+    self.assertEqual(cache.hit_rate, 0.0)
+
+  def test_shared_across_problems(self):
+    cache = application_cache.ApplicationCache()
+    result = self.operation.apply(self.arg_values, self.settings)
+    cache.store(self.operation, self.arg_values, result)
+
+    # A different problem with an equal input (under another name).
+    arg_values = [value.InputValue([1, 2], 'other_input'),
+                  value.ConstantValue(10)]
+    found, cached_result = cache.lookup(self.operation, arg_values)
+    self.assertTrue(found)
+    self.assertEqual(cached_result.reconstruct_expression(),
+                     'tf.add(other_input, 10)')
+
+  def _multi_example_arg_values(self):
+    in1 = value.InputValue([1, 2], 'in1')
+    in1.set_other_example_values([value.InputValue([3, 4], 'in1')])
+    constant = value.ConstantValue(10)
+    constant.set_other_example_values([value.ConstantValue(10)])
+    return [in1, constant]
+
+  def _store_multi_example_result(self, cache):
+    """Stores a multi-example result, returning weak references to its args."""
+    arg_values = self._multi_example_arg_values()
+    # The result is built example by example, bypassing the operation's
+    # filters, which are not what these tests are about.
+    results = [
+        self.operation.apply([arg_value.for_example(index)
+                              for arg_value in arg_values], self.settings)
+        for index in range(2)]
+    self.assertNotIn(None, results)
+    result = results[0]
+    result.set_other_example_values(results[1:])
+    self.assertEqual(result.num_examples, 2)
+    cache.store(self.operation, arg_values, result)
+    del result, results
+    return [weakref.ref(arg_value.for_example(index))
+            for arg_value in arg_values for index in range(2)]
+
+  def test_store_does_not_keep_arguments_alive(self):
+    cache = application_cache.ApplicationCache()
+    arg_refs = self._store_multi_example_result(cache)
+    gc.collect()
+    self.assertEqual([arg_ref() for arg_ref in arg_refs], [None] * 4)
+
+    # Cached results are applications to the new arguments on every example.
+    arg_values = self._multi_example_arg_values()
+    found, cached_result = cache.lookup(self.operation, arg_values)
+    self.assertTrue(found)
+    self.assertEqual(cached_result.num_examples, 2)
+    self.assertIs(
+        cached_result.for_example(1).operation_applications[0].arg_values[0],
+        arg_values[0].for_example(1))
+    self.assertEqual(cached_result.for_example(1).reconstruct_expression(),
+                     'tf.add(in1, 10)')
+
+  def test_global_cache(self):
+    self.assertIs(application_cache.global_cache(),
+                  application_cache.global_cache())
+    self.assertEqual(application_cache.global_cache().max_size,
+                     application_cache.GLOBAL_MAX_SIZE)
+
+  def test_global_cache_does_not_keep_searches_alive(self):
+    # The process-wide cache outlives searches, so it must not keep their
+    # values alive through the results of multi-example searches.
+    arg_refs = self._store_multi_example_result(
+        application_cache.global_cache())
+    gc.collect()
+    self.assertEqual([arg_ref() for arg_ref in arg_refs], [None] * 4)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -18,9 +18,13 @@
 from typing import Any, Dict, List, Optional, Text
 
 from tf_coder.benchmarks import all_benchmarks
+from tf_coder.benchmarks import benchmark as benchmark_module
+from tf_coder.dataflow import dataflow
 from tf_coder.models import tensor_features_model
 from tf_coder.natural_language import description_handler_factory
 from tf_coder.value_search import all_operations
+from tf_coder.value_search import application_cache as application_cache_module
+from tf_coder.value_search import solution_cache as solution_cache_module
 from tf_coder.value_search import value_search
 from tf_coder.value_search import value_search_settings as settings_module
 from tf_coder import asyn_utils
@@ -82,13 +86,37 @@ def warm_up():
     TENSOR_CONFIG = None
 
 
+def _rebuild_solutions(
+    cached_solutions: List[solution_cache_module.CachedSolution],
+    inputs: Any) -> List[value_search.Solution]:
+  """Recreates Solutions (with Values for dataflow graphs) from the cache."""
+  solutions = []
+  for cached_solution in cached_solutions:
+    try:
+      solution_value = dataflow.value_from_text(cached_solution.expression,
+                                                inputs)
+    except Exception:  # pylint: disable=broad-except
+      solution_value = None
+    if solution_value is None:
+      continue
+    solutions.append(value_search.Solution(
+        value=solution_value,
+        expression=cached_solution.expression,
+        weight=cached_solution.weight,
+        time=0.0))
+  return solutions
+
+
 def run_value_search_from_colab(
     inputs_list: List[Dict[Text, Any]],
     output_list: List[Any],
     constants: Optional[List[Any]] = None,
     description: Optional[Text] = None,
     settings: Optional[settings_module.Settings] = None,
-    asyn: asyn_utils.Asyn = None
+    asyn: asyn_utils.Asyn = None,
+    application_cache: Optional[
+        application_cache_module.ApplicationCache] = None,
+    solution_cache: Optional[solution_cache_module.SolutionCache] = None
 ) -> value_search.ValueSearchResults:
   """Value search endpoint for the Colab interface.
 
@@ -98,24 +126,67 @@ def run_value_search_from_colab(
     constants: An optional list of scalar constants.
     description: An optional natural language description of the task.
     settings: A Settings object containing settings for the search.
+    asyn: An optional Asyn object used to abort the search.
+    application_cache: An optional ApplicationCache shared with previous
+      searches.
+    solution_cache: An optional SolutionCache. Cached solutions for the same
+      problem are reported immediately (through `asyn` if provided), up to
+      `settings.max_solutions` of them, and the search only runs if more
+      solutions are requested.
 
   Returns:
     A ValueSearchResults namedtuple.
   """
   if not WARMED_UP:
     warm_up()
-
-  return value_search.run_value_search_from_example(
-      inputs_list=inputs_list,
-      output_list=output_list,
-      settings=settings if settings is not None else DEFAULT_SETTINGS,
-      constants=constants,
-      description=description,
-      source='From TF-Coder Colab',
+  if settings is None:
+    settings = DEFAULT_SETTINGS
+
+  benchmark = benchmark_module.Benchmark(
+      examples=[benchmark_module.Example(inputs, output)
+                for inputs, output in zip(inputs_list, output_list)],
+      constants=constants,  # Will turn into empty list if constants=None.
+      description=description,  # Will turn into '' if description=None.
+      source='From TF-Coder Colab')
+
+  problem_key = None
+  if solution_cache is not None:
+    problem_key = solution_cache_module.problem_key(benchmark, settings)
+    cached_solutions = solution_cache.get(problem_key)
+    if cached_solutions:
+      if asyn is None:
+        asyn = asyn_utils.Asyn()
+      # The cache may hold more solutions than requested.
+      solutions = _rebuild_solutions(cached_solutions, inputs_list[0])
+      for solution in solutions[:settings.max_solutions - len(asyn.solutions)]:
+        print('Found cached solution: {}'.format(solution.expression))
+        asyn.solutions.append(solution)
+      if len(asyn.solutions) >= settings.max_solutions:
+        return value_search.ValueSearchResults(
+            solutions=asyn.solutions,
+            total_time=0.0,
+            value_set=set(),
+            values_by_weight=[],
+            benchmark=benchmark,
+            settings=settings,
+            statistics=None,
+            search_state=None)
+
+  results = value_search.run_value_search(
+      benchmark=benchmark,
+      settings=settings,
       description_handler=DESCRIPTION_HANDLER,
       tensor_model=TENSOR_MODEL,
       tensor_config=TENSOR_CONFIG,
-      asyn=asyn)
+      asyn=asyn,
+      application_cache=application_cache)
+
+  if solution_cache is not None and results.solutions:
+    solution_cache.put(problem_key, [
+        solution_cache_module.CachedSolution(solution.expression,
+                                             solution.weight)
+        for solution in results.solutions])
+  return results
 
 
 def print_supported_operations():
@@ -15,10 +15,13 @@
 # Lint as: python3
 """Defines the Operation objects for functions."""
 
+import collections
 import re
 
 import funcsigs
+import numpy as np
 import tensorflow as tf
+from tf_coder import numpy_functions
 from tf_coder import tensor_limits as limits
 from tf_coder import tf_coder_utils
 from tf_coder import tf_functions
@@ -75,10 +78,13 @@ class FunctionOperation(operation_base.Operation):
     self.constant_kwargs = constant_kwargs
 
     self._has_default = {}
+    self._is_elementwise = (
+        function_info.name in tf_functions.ELEMENTWISE_FUNCTIONS)
+    self._numpy_function = numpy_functions.NUMPY_FUNCTIONS.get(
+        function_info.name)
 
     parameters = funcsigs.signature(self._function_obj).parameters
     for arg_name in arg_names:
-      print(parameters)
       param = parameters[arg_name]
       has_default = param.default is not param.empty
       self._has_default[arg_name] = has_default
@@ -115,8 +121,51 @@ class FunctionOperation(operation_base.Operation):
         print('  argument {} has reconstruction: {}'.format(
             i, arg_value.reconstruct_expression()))
 
+  def _make_value(self, result_value, arg_values, settings):
+    """Wraps the result of the function in an OperationValue, if valid."""
+    try:
+      return value.OperationValue(result_value, self, arg_values)
+    except ValueError:
+      if settings.printing.tensor_size_warnings:
+        self._print_warnings(arg_values, result_value)
+      return None
+
+  def _apply_numpy(self, arg_values):
+    """Applies the NumPy equivalent of the function.
+
+    Args:
+      arg_values: A list of Value objects representing the arguments.
+
+    Returns:
+      The result as a NumPy array, or None if the NumPy function raised an
+      exception or returned strings, in which case TensorFlow should be used
+      instead. The array is wrapped as is, and only converted to a tf.Tensor if
+      something needs the tensor.
+    """
+    numpy_args = []
+    for arg_value in arg_values:
+      if arg_value.is_tensor:
+        numpy_args.append(arg_value.numpy_value())
+      elif arg_value.elem_type_is_tensor:
+        numpy_args.append([elem.numpy() for elem in arg_value.value])
+      else:
+        numpy_args.append(arg_value.value)
+    try:
+      result = np.asarray(self._numpy_function(*numpy_args))  # pylint: disable=not-callable
+    except Exception:  # pylint: disable=broad-except
+      return None
+    if result.dtype.kind in 'OSU':
+      return None
+    return result
+
   def apply(self, arg_values, settings):
     """See base class."""
+    if (self._numpy_function is not None and
+        settings.operations.use_numpy_backend):
+      result_value = self._apply_numpy(arg_values)
+      if result_value is not None:
+        return self._make_value(result_value, arg_values, settings)
+
     value_objects = [arg_value.value for arg_value in arg_values]
     arg_dict = dict(zip(self.arg_names, value_objects))
     arg_dict.update(self.constant_kwargs)
@@ -124,12 +173,81 @@ class FunctionOperation(operation_base.Operation):
       result_value = self._function_obj(**arg_dict)
     except Exception:  # pylint: disable=broad-except
       return None
+    return self._make_value(result_value, arg_values, settings)
+
+  def _apply_batch(self, arg_values_batch):
+    """Applies an elementwise function to a batch of compatible arguments.
+
+    All lists of arguments in the batch must contain tensors with the same
+    shapes and dtypes. Each argument is stacked along a new leading axis, with
+    extra dimensions of size 1 after it so that broadcasting among arguments of
+    different ranks is unaffected by the batch axis.
+
+    Args:
+      arg_values_batch: A list of lists of argument Values.
+
+    Returns:
+      A list of result tensors, one per list of arguments, or None if the
+      function raised an exception.
+    """
+    batch_size = len(arg_values_batch)
+    shapes = [arg_value.shape for arg_value in arg_values_batch[0]]
+    rank = max(len(shape) for shape in shapes)
+    stacked_args = []
+    for arg_index, shape in enumerate(shapes):
+      stacked = tf.stack([arg_values[arg_index].value
+                          for arg_values in arg_values_batch])
+      stacked_args.append(
+          tf.reshape(stacked, [batch_size] + [1] * (rank - len(shape)) + shape))
+    arg_dict = dict(zip(self.arg_names, stacked_args))
+    arg_dict.update(self.constant_kwargs)
     try:
-      return value.OperationValue(result_value, self, arg_values)
-    except ValueError:
-      if settings.printing.tensor_size_warnings:
-        self._print_warnings(arg_values, result_value)
+      batched_result = self._function_obj(**arg_dict)
+      results = tf.unstack(batched_result)
+    except Exception:  # pylint: disable=broad-except
       return None
+    if len(results) != batch_size:
+      return None
+    return results
+
+  def apply_many(self, arg_values_list, settings):
+    """See base class.
+
+    Elementwise functions are applied once for each group of tensor arguments
+    sharing the same shapes and dtypes. If that fails, e.g., because one of the
+    applications would raise an exception, the group falls back to apply().
+    """
+    if (not self._is_elementwise or
+        not settings.operations.batch_elementwise_operations or
+        (self._numpy_function is not None and
+         settings.operations.use_numpy_backend) or
+        len(arg_values_list) < 2):
+      return super(FunctionOperation, self).apply_many(arg_values_list,
+                                                       settings)
+
+    results = [None] * len(arg_values_list)
+    groups = collections.defaultdict(list)
+    for i, arg_values in enumerate(arg_values_list):
+      if all(arg_value.is_tensor for arg_value in arg_values):
+        key = tuple((tuple(arg_value.shape), arg_value.dtype)
+                    for arg_value in arg_values)
+        groups[key].append(i)
+      else:
+        results[i] = self.apply(arg_values, settings)
+
+    for indices in groups.values():
+      batch_results = None
+      if len(indices) > 1:
+        batch_results = self._apply_batch(
+            [arg_values_list[i] for i in indices])
+      if batch_results is None:
+        for i in indices:
+          results[i] = self.apply(arg_values_list[i], settings)
+      else:
+        for i, result_value in zip(indices, batch_results):
+          results[i] = self._make_value(result_value, arg_values_list[i],
+                                        settings)
+    return results
 
   def reconstruct_expression_from_strings(self, arg_strings):
     """See base class."""
@@ -78,6 +78,38 @@ class FunctionOperationTest(absltest.TestCase):
     depth = value.ConstantValue(limits.MAX_TENSOR_ELEMENTS)
     self.assertIsNone(operation.apply([indices, depth], self.settings))
 
+  def test_apply_many_batches_elementwise_operation(self):
+    operation = function_operation.FunctionOperation(
+        tf_functions.FunctionInfo(
+            name='tf.add(x, y)',
+            filter_group=filter_group.FilterGroup.NONE,
+            weight=1))
+    vector = value.ConstantValue(tf.constant([1, 2, 3]))
+    matrix = value.ConstantValue(tf.constant([[10, 20, 30], [40, 50, 60]]))
+    scalar = value.ConstantValue(tf.constant(100))
+    arg_values_list = [
+        [vector, matrix],
+        [vector, vector],
+        [matrix, vector],
+        [vector, scalar],
+        [scalar, scalar],
+        [vector, value.ConstantValue(5)],  # Not batched.
+        [vector, value.ConstantValue(tf.constant([1, 2]))],  # Fails.
+    ]
+    expected = [operation.apply(arg_values, self.settings)
+                for arg_values in arg_values_list]
+    self.assertIsNone(expected[-1])
+    for batch_elementwise_operations in [True, False]:
+      self.settings.operations.batch_elementwise_operations = (
+          batch_elementwise_operations)
+      actual = operation.apply_many(arg_values_list + arg_values_list,
+                                    self.settings)
+      self.assertEqual(actual, expected + expected)
+      for result_value, arg_values in zip(actual, arg_values_list):
+        if result_value is not None:
+          self.assertEqual(
+              result_value.operation_applications[0].arg_values, arg_values)
+
   def test_reconstruct_expression(self):
     operation = function_operation.FunctionOperation(
         tf_functions.FunctionInfo(name='tf.reduce_sum(input_tensor, axis)',
@@ -16,19 +16,23 @@
 """Defines the base Operation class for value search."""
 
 import abc
+import copy
 import itertools
 import sys
 import timeit
 import typing
-from typing import Callable, Dict, List, Optional, Sequence, Set, Text, Tuple, Union
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Text, Tuple, Union
 
 import six
 from tf_coder import tf_coder_utils
 from tf_coder import tf_functions
+from tf_coder.value_search import application_cache as application_cache_module
 from tf_coder.value_search import filtered_values_cache
 from tf_coder.value_search import operation_statistics
+from tf_coder.value_search import shape_inference
 from tf_coder.value_search import value
 from tf_coder.value_search import value_search_settings as settings_module
+from tf_coder.value_search import vectorized_filtering
 
 ################################################################################
 # Type aliases.
@@ -58,6 +62,10 @@ ApplyFilterType = Optional[Callable[[ArgValuesType], bool]]
 
 ################################################################################
 
+# The number of argument combinations considered between timeout checks. These
+# are also given to Operation.apply_many() together.
+APPLY_BATCH_SIZE = 1000
+
 
 OperationMetadata = typing.NamedTuple(
     'OperationMetadata', [('docstring', Text)])
@@ -122,6 +130,20 @@ class Operation(object):
     """Computes a name for this operation."""
     return self.__class__.__name__
 
+  def with_weight(self, weight: int) -> 'Operation':
+    """Returns a copy of this Operation with a different weight.
+
+    The copy shares everything else (including filters) with this Operation, so
+    it is cheap to create. Operations shared between searches are never
+    modified; each search uses copies with its own weights instead.
+
+    Args:
+      weight: The weight of the copy.
+    """
+    operation = copy.copy(self)
+    operation.weight = weight
+    return operation
+
   def add_value_filters(self, value_filters: List[ValueFilterType]) -> None:
     """Adds the given value filters to the value_filters_list attribute.
 
@@ -158,15 +180,143 @@ class Operation(object):
       operation raises an exception.
     """
 
+  def apply_many(
+      self,
+      arg_values_list: Sequence[ArgValuesType],
+      settings: settings_module.Settings) -> List[Optional[value.Value]]:
+    """Applies this Operation to each of several lists of arguments.
+
+    Subclasses may override this to share work among the applications.
+
+    Args:
+      arg_values_list: A list of argument lists, each as passed to apply().
+      settings: A Settings object storing settings for this search.
+
+    Returns:
+      A list containing the result of apply() for each list of arguments, in the
+      same order.
+    """
+    return [self.apply(arg_values, settings) for arg_values in arg_values_list]
+
+  def _passes_filters(self,
+                      arg_values: ArgValuesType,
+                      settings: settings_module.Settings) -> bool:
+    """Returns whether the arguments pass this Operation's filters."""
+    # Skipping filtering is only used for experiments in the PLDI paper.
+    if (settings.paper_experiments.skip_filtering and
+        self.name not in tf_functions.REQUIRES_FILTERING):
+      return True
+    if self._value_filters_list is not None and not any(
+        all(value_filter is None or value_filter(arg_value)
+            for value_filter, arg_value in zip(value_filters, arg_values))
+        for value_filters in self._value_filters_list):
+      return False
+    # _apply_filter is either None or callable.
+    return (self._apply_filter is None or
+            self._apply_filter(arg_values))  # pylint: disable=not-callable
+
+  def apply_to_other_examples(
+      self,
+      result: value.Value,
+      arg_values: ArgValuesType,
+      settings: settings_module.Settings) -> Optional[value.Value]:
+    """Computes the counterparts of `result` on examples other than the first.
+
+    This is used for multi-example search, where `result` is the outcome of
+    applying this Operation to `arg_values` on the first example. The Operation
+    is applied again to the arguments' counterparts on every other example, and
+    the results are stored in `result`.
+
+    Args:
+      result: The Value obtained by applying this Operation to `arg_values`.
+      arg_values: A list of Value objects representing the arguments.
+      settings: A Settings object storing settings for this search.
+
+    Returns:
+      `result` with its counterparts set, or None if the Operation cannot be
+      applied on some example.
+    """
+    num_examples = max(arg_value.num_examples for arg_value in arg_values)
+    if num_examples == 1:
+      return result
+    other_example_values = []
+    for index in range(1, num_examples):
+      example_arg_values = [arg_value.for_example(index)
+                            for arg_value in arg_values]
+      if not self._passes_filters(example_arg_values, settings):
+        return None
+      example_result = self.apply(example_arg_values, settings)
+      if example_result is None:
+        return None
+      other_example_values.append(example_result)
+    result.set_other_example_values(other_example_values)
+    return result
+
+  def _apply_many_to_all_examples(
+      self,
+      arg_values_list: List[ArgValuesType],
+      settings: settings_module.Settings,
+      application_cache: Optional[application_cache_module.ApplicationCache]
+  ) -> Tuple[List[Optional[value.Value]], int]:
+    """Applies this Operation to many argument lists, on every example.
+
+    Args:
+      arg_values_list: A list of argument lists for this Operation.
+      settings: A Settings object storing settings for this search.
+      application_cache: An optional ApplicationCache. Results found in the
+        cache are reused, and new results are added to it.
+
+    Returns:
+      A pair (results, num_avoided). `results` contains the result for each
+      argument list, or None where the Operation cannot be applied (on some
+      example, for multi-example search). `num_avoided` is the number of
+      applications skipped because shape inference predicted their failure.
+    """
+    results = [None] * len(arg_values_list)  # type: List[Optional[value.Value]]
+    uncached_indices = []
+    num_avoided = 0
+    use_shape_inference = settings.operations.use_shape_inference
+    for index, arg_values in enumerate(arg_values_list):
+      if application_cache is not None:
+        found, cached_value = application_cache.lookup(self, arg_values)
+        if found:
+          results[index] = cached_value
+          continue
+      if use_shape_inference and shape_inference.is_doomed(self.name,
+                                                           arg_values):
+        num_avoided += 1
+        continue
+      uncached_indices.append(index)
+
+    uncached_arg_values_list = [arg_values_list[index]
+                                for index in uncached_indices]
+    for index, arg_values, maybe_value in zip(
+        uncached_indices, uncached_arg_values_list,
+        self.apply_many(uncached_arg_values_list, settings)):
+      if maybe_value is not None and settings.multi_example_search:
+        maybe_value = self.apply_to_other_examples(maybe_value, arg_values,
+                                                   settings)
+      if application_cache is not None:
+        application_cache.store(self, arg_values, maybe_value)
+      results[index] = maybe_value
+    return results, num_avoided
+
   def _enumerate_values(
       self,
       arg_options: ArgOptionsType,
       end_time: float,
       settings: settings_module.Settings,
       statistics: Optional[operation_statistics.OperationStatistics] = None,
-  ) -> List[value.Value]:
+      application_cache: Optional[
+          application_cache_module.ApplicationCache] = None,
+  ) -> Iterator[value.Value]:
     """Enumerates values that are created from multiple choices of arguments.
 
+    Values are generated lazily, so the caller can process each value (and stop
+    early) before the remaining applications are performed. Statistics are
+    recorded when the generator is exhausted or closed, and only include time
+    spent in this generator.
+
     Args:
       arg_options: A list of lists of Value objects, where the i-th list
         contains the possible Value objects for the i-th argument.
@@ -174,72 +324,98 @@ class Operation(object):
       settings: A Settings object storing settings for this search.
       statistics: An optional OperationStatistics object to track statistics
         during this function's execution.
+      application_cache: An optional ApplicationCache storing results of
+        applications from previous searches.
 
-    Returns:
-      A list of Value objects, one for every successful application of the
-      operation.
+    Yields:
+      Value objects, one for every successful application of the operation.
     """
-    results = []  # type: List[value.Value]
     apply_count = 0
     apply_successes = 0
-    start_time = timeit.default_timer()
-
-    for i, arg_values in enumerate(itertools.product(*arg_options)):
-      # Check for timeout periodically.
-      if i % 1000 == 0 and timeit.default_timer() > end_time:
-        break
+    apply_avoided = 0
+    elapsed_time = 0.0
 
+    try:
       # Skipping filtering is only used for experiments in the PLDI paper.
-      if not (settings.paper_experiments.skip_filtering and
-              self.name not in tf_functions.REQUIRES_FILTERING):
-        # _apply_filter is either None or callable.
-        if (self._apply_filter is not None and
-            not self._apply_filter(arg_values)):  # pylint: disable=not-callable
-          continue
-
-      if settings.printing.all_apply:
-        print('Applying {} on arguments: {}'.format(
-            self.name,
-            [arg_value.reconstruct_expression() for arg_value in arg_values]))
-        # Print the output immediately so it isn't swallowed by a stacktrace.
-        sys.stdout.flush()
-      maybe_value = self.apply(arg_values, settings)
-      apply_count += 1
-      if maybe_value is not None:
-        yes_value = maybe_value  # type: value.Value
-        apply_successes += 1
-        results.append(yes_value)
-
-    elapsed_time = timeit.default_timer() - start_time
-    if statistics:
-      statistics.update(operation_name=self.name,
-                        count=apply_count,
-                        successes=apply_successes,
-                        time=elapsed_time)
-    return results
-
-  def enumerate_values_with_weight(
+      skip_filtering = (settings.paper_experiments.skip_filtering and
+                        self.name not in tf_functions.REQUIRES_FILTERING)
+      # Common apply filters are evaluated for all argument tuples at once.
+      arg_values_iterator = None
+      if self._apply_filter is not None and not skip_filtering:
+        arg_values_iterator = vectorized_filtering.filtered_product(
+            self._apply_filter, arg_options)
+      apply_filter_done = arg_values_iterator is not None
+      if arg_values_iterator is None:
+        arg_values_iterator = itertools.product(*arg_options)
+      exhausted = False
+      while not exhausted:
+        batch_start_time = timeit.default_timer()
+        # Check for timeout periodically.
+        if batch_start_time > end_time:
+          break
+
+        arg_values_batch = []
+        num_considered = 0
+        for arg_values in itertools.islice(arg_values_iterator,
+                                           APPLY_BATCH_SIZE):
+          num_considered += 1
+          if not skip_filtering and not apply_filter_done:
+            # _apply_filter is either None or callable.
+            if (self._apply_filter is not None and
+                not self._apply_filter(arg_values)):  # pylint: disable=not-callable
+              continue
+
+          if settings.printing.all_apply:
+            print('Applying {} on arguments: {}'.format(
+                self.name,
+                [arg_value.reconstruct_expression()
+                 for arg_value in arg_values]))
+            # Print the output immediately so it isn't swallowed by a
+            # stacktrace.
+            sys.stdout.flush()
+          arg_values_batch.append(arg_values)
+        exhausted = num_considered < APPLY_BATCH_SIZE
+
+        batch_results = []  # type: List[value.Value]
+        maybe_values, num_avoided = self._apply_many_to_all_examples(
+            arg_values_batch, settings, application_cache)
+        apply_count += len(maybe_values) - num_avoided
+        apply_avoided += num_avoided
+        for maybe_value in maybe_values:
+          if maybe_value is not None:
+            yes_value = maybe_value  # type: value.Value
+            apply_successes += 1
+            batch_results.append(yes_value)
+        elapsed_time += timeit.default_timer() - batch_start_time
+
+        for yes_value in batch_results:
+          yield yes_value
+    finally:
+      if statistics:
+        statistics.update(operation_name=self.name,
+                          count=apply_count,
+                          successes=apply_successes,
+                          time=elapsed_time,
+                          avoided=apply_avoided)
+
+  def get_arg_options_list(
       self,
       target_weight: int,
       values_by_weight: ValuesByWeightDict,
       filter_cache: filtered_values_cache.FilteredValuesCache,
-      end_time: float,
-      settings: settings_module.Settings,
-      statistics: Optional[operation_statistics.OperationStatistics] = None
-  ) -> List[value.Value]:
-    """Enumerates values with a given target weight.
+      settings: settings_module.Settings) -> List[ArgOptionsType]:
+    """Returns the choices of arguments that produce values of a given weight.
 
     Args:
       target_weight: The desired weight of resulting values.
       values_by_weight: A collection of Values organized by their weight.
       filter_cache: The FilteredValuesCache object used during this search.
-      end_time: A timeit.default_timer() cutoff where this should timeout.
       settings: A Settings object storing settings for this search.
-      statistics: An optional OperationStatistics object to track statistics
-        during this function's execution.
 
     Returns:
-      A list of Value objects of the specified weight.
+      A list of ArgOptionsType, one for each combination of value filters and
+      partition of the weight among the arguments, in the order they should be
+      enumerated.
     """
     num_args = self.num_args
     if num_args == 0:
@@ -247,8 +423,7 @@ class Operation(object):
     if target_weight - self.weight - num_args < 0:
       return []  # Too many arguments for this weight.
 
-    results = []  # type: List[value.Value]
-
+    arg_options_list = []  # type: List[ArgOptionsType]
     for value_filters in self._value_filters_list:
       assert len(value_filters) == num_args
 
@@ -256,7 +431,6 @@ class Operation(object):
       # (num_args) positive pieces.
       # Equivalently, partition (target_weight - self.weight - num_args) into
       # (num_args) nonnegative pieces.
-      arg_options_list = []  # type: List[ArgOptionsType]
       for partition in tf_coder_utils.generate_partitions(
           target_weight - self.weight - num_args,
           num_args):  # type: Tuple[int, ...]  # pytype: disable=annotation-type-mismatch
@@ -274,11 +448,41 @@ class Operation(object):
               for arg, weight_minus_1 in enumerate(partition)
           ]  # type: ArgOptionsType
         arg_options_list.append(arg_options)
+    return arg_options_list
 
-      for arg_options in arg_options_list:
-        results.extend(self._enumerate_values(arg_options, end_time, settings,
-                                              statistics))
-    return results
+  def enumerate_values_with_weight(
+      self,
+      target_weight: int,
+      values_by_weight: ValuesByWeightDict,
+      filter_cache: filtered_values_cache.FilteredValuesCache,
+      end_time: float,
+      settings: settings_module.Settings,
+      statistics: Optional[operation_statistics.OperationStatistics] = None,
+      application_cache: Optional[
+          application_cache_module.ApplicationCache] = None
+  ) -> Iterator[value.Value]:
+    """Enumerates values with a given target weight.
+
+    Args:
+      target_weight: The desired weight of resulting values.
+      values_by_weight: A collection of Values organized by their weight.
+      filter_cache: The FilteredValuesCache object used during this search.
+      end_time: A timeit.default_timer() cutoff where this should timeout.
+      settings: A Settings object storing settings for this search.
+      statistics: An optional OperationStatistics object to track statistics
+        during this function's execution.
+      application_cache: An optional ApplicationCache storing results of
+        applications from previous searches.
+
+    Yields:
+      Value objects of the specified weight, lazily.
+    """
+    for arg_options in self.get_arg_options_list(
+        target_weight, values_by_weight, filter_cache, settings):
+      for result_value in self._enumerate_values(arg_options, end_time,
+                                                 settings, statistics,
+                                                 application_cache):
+        yield result_value
 
   def reconstruct_expression(self, arg_values: ArgValuesType,
                              use_cache=True) -> Text:
@@ -77,6 +77,14 @@ class OperationBaseTest(absltest.TestCase):
   def test_metadata(self):
     self.assertEqual(self.operation.metadata.docstring, 'test docstring')
 
+  def test_with_weight(self):
+    reweighted = self.operation.with_weight(12)
+    self.assertEqual(reweighted.weight, 12)
+    self.assertEqual(self.operation.weight, 5)
+    self.assertEqual(reweighted.name, 'strange_addition')
+    self.assertEqual(
+        reweighted.apply([_value(2), _value(9)], self.settings).value, 11)
+
   def test_add_value_filters_raises_for_wrong_number_of_filters(self):
     with self.assertRaises(ValueError):
       self.operation.add_value_filters([lambda _: True])
@@ -85,6 +93,27 @@ class OperationBaseTest(absltest.TestCase):
     result_value = self.operation.apply([_value(2), _value(9)], self.settings)
     self.assertEqual(result_value.value, 11)
 
+  def test_apply_to_other_examples(self):
+    arg_1 = _value(2)
+    arg_1.set_other_example_values([_value(4)])
+    arg_2 = _value(3)
+    arg_2.set_other_example_values([_value(5)])
+    arg_values = [arg_1, arg_2]
+    result_value = self.operation.apply_to_other_examples(
+        self.operation.apply(arg_values, self.settings), arg_values,
+        self.settings)
+    self.assertEqual(result_value.value, 5)
+    self.assertEqual(result_value.num_examples, 2)
+    self.assertEqual(result_value.for_example(1).value, 9)
+
+  def test_apply_to_other_examples_fails_filters(self):
+    arg_1 = _value(2)
+    arg_1.set_other_example_values([_value(6)])  # Not smaller than 3.
+    arg_values = [arg_1, _value(3)]
+    self.assertIsNone(self.operation.apply_to_other_examples(
+        self.operation.apply(arg_values, self.settings), arg_values,
+        self.settings))
+
   def test_enumerate_values_with_weight(self):
     values_by_weight = [
         [],  # Weight 0.
@@ -140,6 +169,24 @@ class OperationBaseTest(absltest.TestCase):
     self.assertEqual(statistics.operation_apply_successes,
                      {'strange_addition': 10})
 
+  def test_enumerate_values_with_weight_is_lazy(self):
+    values_by_weight = [
+        [],  # Weight 0.
+        [_value(1), _value(4), _value(9), _value(15)],  # Weight 1.
+        [_value(2), _value(6), _value(20), _value(60)],  # Weight 2.
+        [_value(10), _value(12)],  # Weight 3.
+    ]
+    statistics = operation_statistics.OperationStatistics()
+    filter_cache = filtered_values_cache.FilteredValuesCache()
+    results_iterator = self.operation.enumerate_values_with_weight(
+        9, values_by_weight, filter_cache,
+        end_time=float('inf'), settings=self.settings, statistics=statistics)
+    self.assertEqual(next(results_iterator), _value(16))
+    # Statistics are recorded when the generator is closed early.
+    self.assertEqual(statistics.total_apply_count, 0)
+    results_iterator.close()
+    self.assertEqual(statistics.total_apply_count, 1)
+
   def test_enumerate_values_with_weight_with_immediate_timeout(self):
     values_by_weight = [
         [],  # Weight 0.
@@ -152,7 +199,7 @@ class OperationBaseTest(absltest.TestCase):
     actual_results = self.operation.enumerate_values_with_weight(
         9, values_by_weight, filter_cache,
         end_time=timeit.default_timer() - 0.1, settings=self.settings)
-    self.assertEmpty(actual_results)
+    self.assertEmpty(list(actual_results))
 
   def test_reconstruct_expression(self):
     left_term = self.operation.apply([_value(12), _value(34)], self.settings)
@@ -16,7 +16,8 @@
 """Defines the OperationStatistics class.
 
 An OperationStatistics instance tracks how often operations are applied, how
-many of those applications are successful, and how long they take.
+many of those applications are successful, how many were avoided, and how long
+they take.
 """
 
 import collections
@@ -43,12 +44,16 @@ class OperationStatistics(object):
     total_apply_count: The total number of Operation applications.
     total_apply_successes: The total number of successful Operation
       applications.
+    total_apply_avoided: The total number of Operation applications that were
+      skipped because they were predicted to fail.
     operation_apply_time: A dict mapping Operation names to the total time spent
       applying that Operation.
     operation_apply_count: A dict mapping Operation names to the number of
       applications of that Operation.
     operation_apply_successes: A dict mapping Operation names to the number of
       successful applications of that Operation.
+    operation_apply_avoided: A dict mapping Operation names to the number of
+      avoided applications of that Operation.
     all_operation_names: A set of recorded Operation names.
   """
 
@@ -56,20 +61,33 @@ class OperationStatistics(object):
     """Initializes the attributes."""
     self.total_apply_count = 0
     self.total_apply_successes = 0
+    self.total_apply_avoided = 0
     self.operation_apply_time = collections.defaultdict(float)
     self.operation_apply_count = collections.Counter()
     self.operation_apply_successes = collections.Counter()
+    self.operation_apply_avoided = collections.Counter()
     self.all_operation_names = set()
 
-  def update(self, operation_name, count, successes, time):
+  def update(self, operation_name, count, successes, time, avoided=0):
     """Updates the statistics with the given statistics for one operation."""
     self.total_apply_count += count
     self.total_apply_successes += successes
+    self.total_apply_avoided += avoided
+    self.operation_apply_avoided[operation_name] += avoided
     self.operation_apply_time[operation_name] += time
     self.operation_apply_count[operation_name] += count
     self.operation_apply_successes[operation_name] += successes
     self.all_operation_names.add(operation_name)
 
+  def merge(self, other):
+    """Adds the statistics recorded by another OperationStatistics object."""
+    for operation_name in other.all_operation_names:
+      self.update(operation_name=operation_name,
+                  count=other.operation_apply_count[operation_name],
+                  successes=other.operation_apply_successes[operation_name],
+                  time=other.operation_apply_time[operation_name],
+                  avoided=other.operation_apply_avoided[operation_name])
+
   def get_total_time(self):
     """Returns the total time spent applying operations."""
     return sum(self.operation_apply_time.values())
@@ -123,9 +141,11 @@ class OperationStatistics(object):
 
     string_parts.append('\nNumber of evaluations: {}\n'
                         'Number of successful evaluations: {}\n'
+                        'Number of avoided evaluations: {}\n'
                         'Total time applying operations: {:.2f} sec\n'.format(
                             self.total_apply_count,
                             self.total_apply_successes,
+                            self.total_apply_avoided,
                             self.get_total_time()))
     if num_unique_values is not None:
       string_parts.append('Number of unique values: {}'.format(
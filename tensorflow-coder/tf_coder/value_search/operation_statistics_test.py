@@ -37,6 +37,33 @@ class OperationStatisticsTest(absltest.TestCase):
                      {'a': 11, 'b': 60, 'c': 0})
     self.assertEqual(statistics.all_operation_names, {'a', 'b', 'c'})
 
+  def test_merge(self):
+    statistics = operation_statistics.OperationStatistics()
+    statistics.update('a', count=10, successes=1, time=1.5)
+    other = operation_statistics.OperationStatistics()
+    other.update('a', count=100, successes=10, time=8.5)
+    other.update('b', count=80, successes=60, time=40.0)
+    statistics.merge(other)
+    self.assertEqual(statistics.total_apply_count, 190)
+    self.assertEqual(statistics.total_apply_successes, 71)
+    self.assertEqual(statistics.operation_apply_time, {'a': 10.0, 'b': 40.0})
+    self.assertEqual(statistics.operation_apply_count, {'a': 110, 'b': 80})
+    self.assertEqual(statistics.all_operation_names, {'a', 'b'})
+
+  def test_avoided(self):
+    statistics = operation_statistics.OperationStatistics()
+    statistics.update('a', count=10, successes=1, time=1.5, avoided=5)
+    other = operation_statistics.OperationStatistics()
+    other.update('a', count=100, successes=10, time=8.5, avoided=20)
+    other.update('b', count=80, successes=60, time=40.0)
+    statistics.merge(other)
+    self.assertEqual(statistics.total_apply_avoided, 25)
+    self.assertEqual(statistics.operation_apply_avoided, {'a': 25, 'b': 0})
+    self.assertIn('Number of avoided evaluations: 25',
+                  statistics.statistics_as_string(operation_names=['a', 'b'],
+                                                  num_unique_values=10,
+                                                  elapsed_time=50.0))
+
   def test_get_total_time(self):
     statistics = operation_statistics.OperationStatistics()
     statistics.update('a', count=10, successes=1, time=1.5)
@@ -0,0 +1,538 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Enumerates the values of one weight level using multiple processes.
+
+The work for one weight level is split into work units, one for each operation
+and choice of argument options (a combination of value filters and a partition
+of the weight among the arguments).
+
+Work units run on a pool of worker processes that is started once per process
+and reused by every level and every search. Workers are spawned rather than
+forked, so they never inherit the TensorFlow runtime of the main process, which
+is not safe to fork once initialized. Call start_workers() early to start them
+while the main process warms up.
+
+Each worker keeps a replica of the Values of lower weights of the current
+search. Before a level, the main process sends the workers the Values they do
+not have yet, usually only those of the previous weight, and work units then
+refer to arguments by their position in `values_by_weight`.
+
+Work units are sent to the workers a few at a time, and the result of each unit
+is sent back as soon as it is done, in a compact encoding where arguments are
+also referenced by position. The main process rebuilds the Values in work unit
+order, which is the same order as the serial enumeration, so the search finds
+the same values and solutions as the serial search. When the search stops in
+the middle of a level, e.g., because it found enough solutions, the remaining
+work units are cancelled.
+"""
+
+import collections
+import itertools
+import multiprocessing
+import queue
+import timeit
+import traceback
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import tensorflow as tf
+from tf_coder.value_search import all_operations
+from tf_coder.value_search import application_cache as application_cache_module
+from tf_coder.value_search import filtered_values_cache
+from tf_coder.value_search import operation_base
+from tf_coder.value_search import operation_statistics
+from tf_coder.value_search import value as value_module
+from tf_coder.value_search import value_search_settings as settings_module
+
+
+# The start method of the worker processes.
+START_METHOD = 'spawn'
+
+# The number of work units sent to a worker before it returns results.
+MAX_UNITS_PER_WORKER = 2
+
+# Seconds between checks that the workers are alive, while waiting for results.
+LIVENESS_INTERVAL = 5.0
+
+# Kinds of encoded objects.
+_TENSOR = 'tensor'
+_SPARSE_TENSOR = 'sparse_tensor'
+_DTYPE = 'dtype'
+_PRIMITIVE = 'primitive'
+_SEQUENCE = 'sequence'
+
+# Kinds of tasks sent to the workers.
+_SEARCH = 'search'
+_VALUES = 'values'
+_UNIT = 'unit'
+
+# A Value sent between processes. For Values produced by a worker, `arg_refs`
+# contains (weight, index) pairs locating the arguments in `values_by_weight`.
+# For Values sent to the workers, it is None.
+EncodedValue = NamedTuple('EncodedValue', [
+    ('obj', Any),
+    ('arg_refs', Optional[List[Tuple[int, int]]]),
+    ('other_example_objs', Optional[List[Any]]),
+    ('fingerprint', bytes),
+])
+
+_search_ids = itertools.count()
+_worker_pool = None  # type: Optional[WorkerPool]
+
+
+def next_search_id() -> int:
+  """Returns a new id for a search, identifying its Values in the workers."""
+  return next(_search_ids)
+
+
+def _encode_object(obj):
+  """Encodes an object so it can be sent between processes."""
+  if isinstance(obj, tf.Tensor):
+    return (_TENSOR, obj.numpy())
+  if isinstance(obj, tf.SparseTensor):
+    return (_SPARSE_TENSOR, obj.indices.numpy(), obj.values.numpy(),
+            obj.dense_shape.numpy())
+  if isinstance(obj, tf.DType):
+    return (_DTYPE, obj.as_datatype_enum)
+  if isinstance(obj, (list, tuple)):
+    return (_SEQUENCE, type(obj), [_encode_object(elem) for elem in obj])
+  return (_PRIMITIVE, obj)
+
+
+def _decode_object(encoded):
+  """Decodes an object encoded by _encode_object()."""
+  kind = encoded[0]
+  if kind == _TENSOR:
+    return tf.constant(encoded[1])
+  if kind == _SPARSE_TENSOR:
+    return tf.SparseTensor(indices=encoded[1], values=encoded[2],
+                           dense_shape=encoded[3])
+  if kind == _DTYPE:
+    return tf.as_dtype(encoded[1])
+  if kind == _SEQUENCE:
+    sequence_type, elems = encoded[1], [_decode_object(elem)
+                                        for elem in encoded[2]]
+    if hasattr(sequence_type, '_fields'):  # A namedtuple.
+      return sequence_type(*elems)
+    return sequence_type(elems)
+  return encoded[1]
+
+
+def _encode_value_object(arg_value: value_module.Value):
+  """Encodes the object of a Value, without creating its tensor."""
+  if arg_value.is_tensor:
+    return (_TENSOR, arg_value.numpy_value())
+  return _encode_object(arg_value.value)
+
+
+def _decode_value_object(encoded):
+  """Decodes the object of a Value, keeping numeric tensors as NumPy arrays.
+
+  Values create the tensors of NumPy arrays when they are needed.
+  """
+  if encoded[0] == _TENSOR and encoded[1].dtype.kind != 'O':
+    return encoded[1]
+  return _decode_object(encoded)
+
+
+def _encode_value(
+    arg_value: value_module.Value,
+    arg_refs: Optional[Dict[int, Tuple[int, int]]] = None) -> EncodedValue:
+  """Encodes a Value, with the positions of its arguments if `arg_refs`."""
+  other_example_objs = None
+  if arg_value.other_example_values is not None:
+    other_example_objs = [_encode_value_object(other)
+                          for other in arg_value.other_example_values]
+  encoded_arg_refs = None
+  if arg_refs is not None:
+    application = arg_value.operation_applications[0]
+    encoded_arg_refs = [arg_refs[id(application_arg_value)]
+                        for application_arg_value in application.arg_values]
+  return EncodedValue(
+      obj=_encode_value_object(arg_value),
+      arg_refs=encoded_arg_refs,
+      other_example_objs=other_example_objs,
+      fingerprint=arg_value.fingerprint())
+
+
+def _decode_value(encoded: EncodedValue,
+                  operation: operation_base.Operation,
+                  weight_lists: List[List[value_module.Value]]
+                 ) -> value_module.OperationValue:
+  """Rebuilds a Value produced by a worker in the main process."""
+  arg_values = [weight_lists[weight][index]
+                for weight, index in encoded.arg_refs]
+  result_value = value_module.OperationValue(
+      _decode_value_object(encoded.obj), operation, arg_values)
+  if encoded.other_example_objs is not None:
+    result_value.set_other_example_values([
+        value_module.OperationValue(
+            _decode_value_object(obj), operation,
+            [arg_value.for_example(i + 1) for arg_value in arg_values])
+        for i, obj in enumerate(encoded.other_example_objs)])
+  # The worker already computed the fingerprint.
+  result_value._fingerprint_cache = encoded.fingerprint  # pylint: disable=protected-access
+  return result_value
+
+
+def _decode_argument(encoded: EncodedValue) -> value_module.Value:
+  """Rebuilds a Value of a lower weight in a worker.
+
+  Workers only apply operations to these Values, so they don't need to know
+  how the Values were created.
+  """
+  arg_value = value_module.ConstantValue(_decode_value_object(encoded.obj))
+  if encoded.other_example_objs is not None:
+    arg_value.set_other_example_values([
+        value_module.ConstantValue(_decode_value_object(obj))
+        for obj in encoded.other_example_objs])
+  arg_value._fingerprint_cache = encoded.fingerprint  # pylint: disable=protected-access
+  return arg_value
+
+
+class _WorkerSearch(object):
+  """The replica of the Values of one search kept by a worker."""
+
+  def __init__(self, settings: settings_module.Settings) -> None:
+    self.settings = settings
+    self.weight_lists = []  # type: List[List[value_module.Value]]
+    # Maps ids of the Values to their (weight, index) positions.
+    self.arg_refs = {}  # type: Dict[int, Tuple[int, int]]
+    self.fingerprints = set()
+    self.application_cache = (
+        application_cache_module.global_cache()
+        if settings.operations.use_global_application_cache else None)
+
+  def add_values(self, weight: int, encoded_values: List[EncodedValue]) -> None:
+    while len(self.weight_lists) <= weight:
+      self.weight_lists.append([])
+    weight_list = self.weight_lists[weight]
+    for encoded in encoded_values:
+      arg_value = _decode_argument(encoded)
+      self.arg_refs[id(arg_value)] = (weight, len(weight_list))
+      weight_list.append(arg_value)
+      self.fingerprints.add(encoded.fingerprint)
+
+  def run_work_unit(self, level_id, current_level, operation,
+                    arg_options_refs, time_left, skip_seen_values,
+                    collect_statistics):
+    """Runs one work unit, stopping early if its level is cancelled.
+
+    Returns:
+      A pair (encoded_values, statistics), where statistics is None if
+      statistics are not being collected.
+    """
+    arg_options = [[self.weight_lists[weight][index] for weight, index in refs]
+                   for refs in arg_options_refs]
+    statistics = (operation_statistics.OperationStatistics()
+                  if collect_statistics else None)
+    encoded_values = []
+    for result_value in operation._enumerate_values(  # pylint: disable=protected-access
+        arg_options, timeit.default_timer() + time_left, self.settings,
+        statistics, self.application_cache):
+      if current_level.value != level_id:
+        break
+      # The main process would discard values seen at lower weights, so don't
+      # bother sending them.
+      if skip_seen_values and result_value.fingerprint() in self.fingerprints:
+        continue
+      encoded_values.append(_encode_value(result_value, self.arg_refs))
+    return encoded_values, statistics
+
+
+def _worker_main(index, tasks, results, current_level):
+  """Runs tasks in a worker process until it receives None."""
+  from tf_coder.value_search import value_search  # pylint: disable=g-import-not-at-top
+  value_search._suppress_warnings()  # pylint: disable=protected-access
+
+  search = None
+  while True:
+    task = tasks.get()
+    if task is None:
+      return
+    kind = task[0]
+    if kind == _SEARCH:
+      search = _WorkerSearch(settings=task[1])
+    elif kind == _VALUES:
+      search.add_values(weight=task[1], encoded_values=task[2])
+    else:
+      (_, level_id, unit_index, operation_name, arg_options_refs, time_left,
+       skip_seen_values, collect_statistics) = task
+      try:
+        result = search.run_work_unit(
+            level_id, current_level,
+            all_operations.find_operation_with_name(operation_name),
+            arg_options_refs, time_left, skip_seen_values, collect_statistics)
+      except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        result = None
+      results.put((index, level_id, unit_index, result))
+
+
+class _Worker(object):
+  """The main process's handle of a worker process."""
+
+  def __init__(self, context, index, results, current_level):
+    self.tasks = context.Queue()
+    self.process = context.Process(
+        target=_worker_main,
+        args=(index, self.tasks, results, current_level),
+        daemon=True)
+    self.process.start()
+    # The number of work units sent and not returned yet.
+    self.num_units = 0
+
+
+class LevelEnumeration(object):
+  """The values of one weight level, computed by the workers.
+
+  Values are produced per operation, in the order of the serial enumeration.
+  Work units run ahead of the consumption of their values, and close() cancels
+  the work units whose values are no longer needed.
+  """
+
+  def __init__(self,
+               pool: 'WorkerPool',
+               level_id: int,
+               operations: List[operation_base.Operation],
+               units_by_operation: List[List[int]],
+               statistics: Optional[operation_statistics.OperationStatistics]
+              ) -> None:
+    self._pool = pool
+    self._level_id = level_id
+    self._operations = operations
+    self._units_by_operation = units_by_operation
+    self._statistics = statistics
+
+  def operation_values(self, operation_index: int
+                      ) -> Iterator[value_module.OperationValue]:
+    """Yields the values of the operation with the given index, lazily."""
+    operation = self._operations[operation_index]
+    for unit_index in self._units_by_operation[operation_index]:
+      encoded_values, unit_statistics = self._pool.wait_for_unit(
+          self._level_id, unit_index)
+      if self._statistics is not None and unit_statistics is not None:
+        self._statistics.merge(unit_statistics)
+      for encoded in encoded_values:
+        yield _decode_value(encoded, operation, self._pool.weight_lists)
+
+  def close(self) -> None:
+    """Cancels the work units that are not done yet."""
+    self._pool.cancel_level(self._level_id)
+
+
+class WorkerPool(object):
+  """A pool of worker processes enumerating the values of weight levels.
+
+  The pool is used by one search at a time, from one thread.
+  """
+
+  def __init__(self, num_workers: int,
+               start_method: str = START_METHOD) -> None:
+    context = multiprocessing.get_context(start_method)
+    # The id of the level whose work units the workers should run. Workers stop
+    # work units of other levels early.
+    self._current_level = context.RawValue('q', 0)
+    self._results = context.Queue()
+    self._workers = [
+        _Worker(context, index, self._results, self._current_level)
+        for index in range(num_workers)]
+    self._level_id = 0
+    # Work units of the current level not sent yet, as (unit index, task).
+    self._pending = collections.deque()
+    # Results of the current level, by unit index, until they are consumed.
+    self._done = {}
+    # The search whose Values were sent to the workers, and those Values.
+    self._search_id = None  # type: Optional[int]
+    self.weight_lists = []  # type: List[List[value_module.Value]]
+    self._arg_refs = {}  # type: Dict[int, Tuple[int, int]]
+
+  @property
+  def num_workers(self) -> int:
+    return len(self._workers)
+
+  def _send_to_all(self, task) -> None:
+    for worker in self._workers:
+      worker.tasks.put(task)
+
+  def _sync_values(self, search_id: int,
+                   values_by_weight: operation_base.ValuesByWeightDict,
+                   target_weight: int,
+                   settings: settings_module.Settings) -> None:
+    """Sends the workers the Values of lower weights they don't have yet."""
+    if search_id != self._search_id:
+      self._search_id = search_id
+      self.weight_lists = []
+      self._arg_refs = {}
+      self._send_to_all((_SEARCH, settings))
+    for weight in range(target_weight):
+      if weight == len(self.weight_lists):
+        self.weight_lists.append([])
+      weight_list = self.weight_lists[weight]
+      # Values of lower weights are only ever added, never removed.
+      new_values = list(itertools.islice(values_by_weight[weight],
+                                         len(weight_list), None))
+      if not new_values:
+        continue
+      for arg_value in new_values:
+        self._arg_refs[id(arg_value)] = (weight, len(weight_list))
+        weight_list.append(arg_value)
+      encoded_values = [_encode_value(arg_value) for arg_value in new_values]
+      self._send_to_all((_VALUES, weight, encoded_values))
+
+  def start_level(
+      self,
+      search_id: int,
+      operations: List[operation_base.Operation],
+      target_weight: int,
+      values_by_weight: operation_base.ValuesByWeightDict,
+      end_time: float,
+      settings: settings_module.Settings,
+      only_minimal_solutions: bool,
+      statistics: Optional[operation_statistics.OperationStatistics] = None
+  ) -> LevelEnumeration:
+    """Starts enumerating the values of a weight level.
+
+    See enumerate_values_with_weight() for the arguments.
+    """
+    self.cancel_level(self._level_id)
+    self._level_id += 1
+    self._current_level.value = self._level_id
+    self._sync_values(search_id, values_by_weight, target_weight, settings)
+
+    # Compute argument options in the main process, so the filtering is done
+    # once and shared with all workers.
+    filter_cache = filtered_values_cache.FilteredValuesCache()
+    units_by_operation = []
+    unit_index = 0
+    for operation in operations:
+      unit_indices = []
+      for arg_options in operation.get_arg_options_list(
+          target_weight, values_by_weight, filter_cache, settings):
+        arg_options_refs = [[self._arg_refs[id(arg_value)]
+                             for arg_value in options]
+                            for options in arg_options]
+        self._pending.append((unit_index, (
+            _UNIT, self._level_id, unit_index, operation.name,
+            arg_options_refs, end_time, only_minimal_solutions,
+            statistics is not None)))
+        unit_indices.append(unit_index)
+        unit_index += 1
+      units_by_operation.append(unit_indices)
+    self._dispatch()
+    return LevelEnumeration(self, self._level_id, operations,
+                            units_by_operation, statistics)
+
+  def _dispatch(self) -> None:
+    """Sends pending work units to the workers with few units."""
+    for worker in self._workers:
+      while self._pending and worker.num_units < MAX_UNITS_PER_WORKER:
+        _, task = self._pending.popleft()
+        # Workers measure the time limit with their own clock.
+        end_time = task[5]
+        task = task[:5] + (end_time - timeit.default_timer(),) + task[6:]
+        worker.tasks.put(task)
+        worker.num_units += 1
+
+  def wait_for_unit(self, level_id: int, unit_index: int):
+    """Returns the (encoded_values, statistics) of a work unit.
+
+    Raises:
+      RuntimeError: If the level was cancelled, or a worker failed.
+    """
+    while unit_index not in self._done:
+      if level_id != self._level_id:
+        raise RuntimeError('The level was cancelled.')
+      try:
+        index, result_level_id, result_unit_index, result = (
+            self._results.get(timeout=LIVENESS_INTERVAL))
+      except queue.Empty:
+        if not all(worker.process.is_alive() for worker in self._workers):
+          raise RuntimeError('A parallel search worker died.')
+        continue
+      self._workers[index].num_units -= 1
+      if result_level_id == self._level_id:
+        if result is None:
+          raise RuntimeError('A parallel search work unit failed.')
+        self._done[result_unit_index] = result
+      self._dispatch()
+    return self._done.pop(unit_index)
+
+  def cancel_level(self, level_id: int) -> None:
+    """Stops the work units of a level. Their results are then discarded."""
+    if level_id != self._level_id:
+      return
+    self._pending.clear()
+    self._done.clear()
+    self._level_id += 1
+    self._current_level.value = self._level_id
+
+  def close(self) -> None:
+    """Stops the workers."""
+    self.cancel_level(self._level_id)
+    self._send_to_all(None)
+
+
+def start_workers(num_workers: int) -> WorkerPool:
+  """Returns the process-wide WorkerPool, starting it if needed.
+
+  A pool with a different number of workers replaces the current one.
+  """
+  global _worker_pool
+  if _worker_pool is None or _worker_pool.num_workers != num_workers:
+    if _worker_pool is not None:
+      _worker_pool.close()
+    _worker_pool = WorkerPool(num_workers)
+  return _worker_pool
+
+
+def enumerate_values_with_weight(
+    search_id: int,
+    operations: List[operation_base.Operation],
+    target_weight: int,
+    values_by_weight: operation_base.ValuesByWeightDict,
+    end_time: float,
+    settings: settings_module.Settings,
+    only_minimal_solutions: bool,
+    statistics: Optional[operation_statistics.OperationStatistics] = None
+) -> LevelEnumeration:
+  """Starts enumerating values of the target weight for every operation.
+
+  Args:
+    search_id: The id of the search from next_search_id(). The workers keep
+      the Values of one search, so they only receive new Values while the same
+      search continues.
+    operations: The operations to apply.
+    target_weight: The desired weight of resulting values.
+    values_by_weight: A collection of Values organized by their weight.
+    end_time: A timeit.default_timer() cutoff where this should timeout.
+    settings: A Settings object storing settings for this search, where
+      `settings.num_workers` is the number of worker processes.
+    only_minimal_solutions: Whether the search only keeps values of minimal
+      weight, in which case workers omit values seen at lower weights.
+    statistics: An optional OperationStatistics object to track statistics. The
+      statistics of a work unit are added when its values are consumed.
+
+  Returns:
+    A LevelEnumeration producing, for each operation, the Values it produced, in
+    the same order as Operation.enumerate_values_with_weight() would produce
+    them (except for omitted values). It must be closed when the search stops
+    consuming it. Workers apply operations with their own process-wide
+    ApplicationCache, if `settings.operations.use_global_application_cache`.
+  """
+  pool = start_workers(settings.num_workers)
+  return pool.start_level(search_id, operations, target_weight,
+                          values_by_weight, end_time, settings,
+                          only_minimal_solutions, statistics)
@@ -0,0 +1,133 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for parallel_search.py."""
+
+import collections
+
+from absl import logging
+from absl.testing import absltest
+from absl.testing import parameterized
+import tensorflow as tf
+from tf_coder.benchmarks import benchmark as benchmark_module
+from tf_coder.value_search import parallel_search
+from tf_coder.value_search import value
+from tf_coder.value_search import value_search
+from tf_coder.value_search import value_search_settings as settings_module
+
+Named = collections.namedtuple('Named', ['a', 'b'])
+
+
+class ParallelSearchTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('tensor', tf.constant([[1.5, 2.0]])),
+      ('string_tensor', tf.constant([b'abc', b'de'])),
+      ('sparse_tensor', tf.SparseTensor(indices=[[0, 1]], values=[3],
+                                        dense_shape=[2, 2])),
+      ('dtype', tf.int64),
+      ('primitive', 12),
+      ('tuple', (1, tf.constant([2]))),
+      ('namedtuple', Named(a=tf.constant(1), b=[True, False])))
+  def test_encode_decode_object(self, obj):
+    encoded = parallel_search._encode_object(obj)
+    decoded = parallel_search._decode_object(encoded)
+    self.assertEqual(type(decoded), type(obj))
+    self.assertEqual(value.ConstantValue(decoded), value.ConstantValue(obj))
+
+  @parameterized.named_parameters(
+      ('single_example', False, False),
+      ('single_example_only_minimal', False, True),
+      ('multi_example', True, False))
+  def test_parallel_search_matches_serial_search(self, multi_example_search,
+                                                 only_minimal_solutions):
+    benchmark = benchmark_module.Benchmark(
+        examples=[
+            benchmark_module.Example(inputs=[[1, 4], [2, 7]], output=[3, 11]),
+            benchmark_module.Example(inputs=[[5, 0], [1, 2]], output=[6, 2]),
+        ])
+    results = []
+    for num_workers in [1, 3]:
+      settings = settings_module.from_dict({
+          'timeout': 60,
+          'max_solutions': 4,
+          'only_minimal_solutions': only_minimal_solutions,
+          'max_extra_solutions_time': 60,
+          'multi_example_search': multi_example_search,
+          'num_workers': num_workers,
+          'printing.statistics': True})
+      results.append(value_search.run_value_search(benchmark, settings))
+    serial, parallel = results
+    self.assertEqual([solution.expression for solution in parallel.solutions],
+                     [solution.expression for solution in serial.solutions])
+    self.assertEqual([list(values) for values in parallel.values_by_weight],
+                     [list(values) for values in serial.values_by_weight])
+    self.assertEqual(parallel.statistics.total_apply_count,
+                     serial.statistics.total_apply_count)
+
+  def test_workers_are_reused_across_searches(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[
+            benchmark_module.Example(inputs=[[1, 4], [2, 7]], output=[3, 11]),
+        ])
+    settings = settings_module.from_dict({'timeout': 60, 'num_workers': 2})
+    pool = parallel_search.start_workers(2)
+    pids = [worker.process.pid for worker in pool._workers]
+    for _ in range(2):
+      result = value_search.run_value_search(benchmark, settings)
+      self.assertNotEmpty(result.solutions)
+    self.assertIs(parallel_search.start_workers(2), pool)
+    self.assertEqual([worker.process.pid for worker in pool._workers], pids)
+
+  def test_closed_level_is_cancelled(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[
+            benchmark_module.Example(inputs=[[1, 4], [2, 7]], output=[3, 11]),
+        ])
+    settings = settings_module.from_dict({'timeout': 60, 'num_workers': 2})
+    state = value_search.SearchState(
+        benchmark, value_search.get_reweighted_operations(benchmark, settings),
+        settings, solutions=[])
+    level = parallel_search.enumerate_values_with_weight(
+        search_id=state.search_id,
+        operations=state.operations,
+        target_weight=3,
+        values_by_weight=state.values_by_weight,
+        end_time=float('inf'),
+        settings=settings,
+        only_minimal_solutions=False)
+    operation_index = next(
+        index for index in range(len(state.operations))
+        if list(level.operation_values(index)))
+    level.close()
+    with self.assertRaises(RuntimeError):
+      list(level.operation_values(operation_index))
+    # The workers are still usable for the next level.
+    level = parallel_search.enumerate_values_with_weight(
+        search_id=state.search_id,
+        operations=state.operations,
+        target_weight=3,
+        values_by_weight=state.values_by_weight,
+        end_time=float('inf'),
+        settings=settings,
+        only_minimal_solutions=False)
+    self.assertNotEmpty(list(level.operation_values(operation_index)))
+    level.close()
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.ERROR)
+
+  absltest.main()
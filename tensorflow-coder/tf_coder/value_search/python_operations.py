@@ -17,6 +17,7 @@
 
 import abc
 
+import numpy as np
 import six
 from tf_coder import tensor_limits as limits
 from tf_coder import tf_coder_utils
@@ -80,6 +81,23 @@ Selects a {slice_kind} of indices along axis {axis} of the tensor.
 """
 
 
+def _indexable(arg_value, settings):
+  """Returns the object to index into, as a NumPy array if requested."""
+  if settings.operations.use_numpy_backend and arg_value.is_tensor:
+    return arg_value.numpy_value()
+  return arg_value.value
+
+
+def _maybe_to_array(result):
+  """Keeps results of indexing into NumPy arrays as arrays, not scalars.
+
+  The Value wrapping the array only creates the tensor when it is needed.
+  """
+  if isinstance(result, np.generic):
+    return np.asarray(result)
+  return result
+
+
 class IndexingOperation(operation_base.Operation):
   """An indexing operation of the form "arg0[arg1]"."""
 
@@ -106,8 +124,10 @@ class IndexingOperation(operation_base.Operation):
   def apply(self, arg_values, settings):
     """See base class."""
     try:
-      return value.OperationValue(arg_values[0].value[int(arg_values[1].value)],
-                                  self, arg_values)
+      indexable = _indexable(arg_values[0], settings)
+      return value.OperationValue(
+          _maybe_to_array(indexable[int(arg_values[1].value)]),
+          self, arg_values)
     except Exception:  # pylint: disable=broad-except
       return None
 
@@ -137,8 +157,10 @@ class IndexingAxis1Operation(operation_base.Operation):
   def apply(self, arg_values, settings):
     """See base class."""
     try:
+      indexable = _indexable(arg_values[0], settings)
       return value.OperationValue(
-          arg_values[0].value[:, int(arg_values[1].value)], self, arg_values)
+          _maybe_to_array(indexable[:, int(arg_values[1].value)]),
+          self, arg_values)
     except Exception:  # pylint: disable=broad-except
       return None
 
@@ -345,9 +367,9 @@ class SlicingBaseOperation(operation_base.Operation):
     """See base class."""
     try:
       result = self._evaluate_slice(
-          [arg_values[0].value] +
+          [_indexable(arg_values[0], settings)] +
           [int(arg_value.value) for arg_value in arg_values[1:]])
-      return value.OperationValue(result, self, arg_values)
+      return value.OperationValue(_maybe_to_array(result), self, arg_values)
     except Exception:  # pylint: disable=broad-except
       return None
 
@@ -0,0 +1,550 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Static shape and dtype inference for operation applications.
+
+Many applications fail inside TensorFlow because of incompatible shapes or
+out-of-range axes. Raising and catching those errors is expensive, so the rules
+here predict the outcome from argument shapes, dtypes, and small int values,
+without running the operation. A rule only predicts failure when TensorFlow
+certainly raises an error. Predicted output shapes are also used to skip
+results that would exceed the tensor limits, since those are discarded anyway.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Text, Tuple
+
+import numpy as np
+import tensorflow as tf
+from tf_coder import tensor_limits as limits
+from tf_coder.value_search import value as value_module
+
+# The predicted outcome of an application. If `fails` is False, `shape` and
+# `dtype` describe the resulting tensor (either can be None if unknown).
+Prediction = NamedTuple('Prediction', [
+    ('fails', bool),
+    ('shape', Optional[List[int]]),
+    ('dtype', Optional[tf.DType]),
+])
+
+FAILS = Prediction(fails=True, shape=None, dtype=None)
+
+ArgValues = Sequence[value_module.Value]
+RuleType = Callable[[ArgValues], Prediction]
+
+
+class _Unknown(Exception):
+  """Raised by rules when the outcome can't be predicted."""
+
+
+def _succeeds(shape: Optional[List[int]],
+              dtype: Optional[tf.DType] = None) -> Prediction:
+  return Prediction(fails=False, shape=shape, dtype=dtype)
+
+
+def _tensor_shape(arg_value: value_module.Value) -> List[int]:
+  """Returns the shape of a tensor argument."""
+  if not arg_value.is_tensor:
+    raise _Unknown()
+  return arg_value.shape
+
+
+def _operand_shape(arg_value: value_module.Value) -> List[int]:
+  """Returns the shape of a tensor or primitive operand."""
+  if arg_value.is_tensor:
+    return arg_value.shape
+  if arg_value.type in (int, float, bool):
+    return []
+  raise _Unknown()
+
+
+def _int(arg_value: value_module.Value) -> int:
+  """Returns the value of a Python int argument."""
+  if arg_value.type is not int:
+    raise _Unknown()
+  return arg_value.value
+
+
+def _int_list(arg_value: value_module.Value) -> List[int]:
+  """Returns the ints in a sequence of ints or a 1D int tensor."""
+  if arg_value.is_sequence and arg_value.elem_type is int:
+    return list(arg_value.value)
+  if (arg_value.is_tensor and len(arg_value.shape) == 1 and
+      arg_value.dtype.is_integer):
+    return arg_value.numpy_value().tolist()
+  raise _Unknown()
+
+
+def _tensor_list_shapes_and_dtypes(
+    arg_value: value_module.Value) -> Tuple[List[List[int]], Set[tf.DType]]:
+  """Returns the shapes and the set of dtypes in a sequence of tensors."""
+  if not arg_value.elem_type_is_tensor:
+    raise _Unknown()
+  return ([tensor.shape.as_list() for tensor in arg_value.value],
+          set(tensor.dtype for tensor in arg_value.value))
+
+
+def _normalize_axis(axis: int, rank: int) -> Optional[int]:
+  """Returns the nonnegative axis, or None if it's out of range."""
+  if -rank <= axis < rank:
+    return axis % rank
+  return None
+
+
+def _broadcast_shape(shapes: List[List[int]]) -> Optional[List[int]]:
+  """Returns the broadcasted shape, or None if the shapes are incompatible."""
+  rank = max(len(shape) for shape in shapes)
+  result = []
+  for i in range(-rank, 0):
+    dims = set(shape[i] for shape in shapes if len(shape) >= -i)
+    dims.discard(1)
+    if len(dims) > 1:
+      return None
+    result.append(dims.pop() if dims else 1)
+  return result
+
+
+def _same_dtypes(arg_values: ArgValues) -> bool:
+  """Returns False if two tensor arguments have different dtypes."""
+  dtypes = set(arg_value.dtype for arg_value in arg_values
+               if arg_value.is_tensor)
+  return len(dtypes) <= 1
+
+
+################################################################################
+# Rules for TensorFlow functions.
+
+
+def _elementwise_unary(arg_values: ArgValues) -> Prediction:
+  x = arg_values[0]
+  return _succeeds(_tensor_shape(x), x.dtype)
+
+
+def _make_elementwise_binary(result_dtype: Optional[tf.DType] = None,
+                             same_dtype_result: bool = True) -> RuleType:
+  """Creates a rule for a broadcasting binary function."""
+  def _rule(arg_values: ArgValues) -> Prediction:
+    x, y = arg_values
+    shape = _broadcast_shape([_operand_shape(x), _operand_shape(y)])
+    if shape is None or not _same_dtypes(arg_values):
+      return FAILS
+    if result_dtype is not None:
+      dtype = result_dtype
+    elif same_dtype_result:
+      dtype = x.dtype if x.is_tensor else y.dtype
+    else:
+      dtype = None
+    return _succeeds(shape, dtype)
+  return _rule
+
+
+def _make_reduce_all(result_dtype: Optional[tf.DType] = None) -> RuleType:
+  """Creates a rule for a reduction over all axes."""
+  def _rule(arg_values: ArgValues) -> Prediction:
+    tensor = arg_values[0]
+    _tensor_shape(tensor)
+    return _succeeds([], result_dtype or tensor.dtype)
+  return _rule
+
+
+def _make_reduce_axis(result_dtype: Optional[tf.DType] = None) -> RuleType:
+  """Creates a rule for a reduction (or arg-reduction) along an axis."""
+  def _rule(arg_values: ArgValues) -> Prediction:
+    tensor, axis = arg_values[:2]
+    shape = _tensor_shape(tensor)
+    axis = _normalize_axis(_int(axis), len(shape))
+    if axis is None:
+      return FAILS
+    return _succeeds(shape[:axis] + shape[axis + 1:],
+                     result_dtype or tensor.dtype)
+  return _rule
+
+
+def _make_along_axis(result_dtype: Optional[tf.DType] = None) -> RuleType:
+  """Creates a rule for a function along an axis that keeps the shape."""
+  def _rule(arg_values: ArgValues) -> Prediction:
+    tensor, axis = arg_values[:2]
+    shape = _tensor_shape(tensor)
+    if _normalize_axis(_int(axis), len(shape)) is None:
+      return FAILS
+    return _succeeds(shape, result_dtype or tensor.dtype)
+  return _rule
+
+
+def _add_n(arg_values: ArgValues) -> Prediction:
+  shapes, dtypes = _tensor_list_shapes_and_dtypes(arg_values[0])
+  if any(shape != shapes[0] for shape in shapes) or len(dtypes) > 1:
+    return FAILS
+  return _succeeds(shapes[0], dtypes.pop())
+
+
+def _boolean_mask(arg_values: ArgValues) -> Prediction:
+  tensor, mask = arg_values
+  shape, mask_shape = _tensor_shape(tensor), _tensor_shape(mask)
+  if not mask_shape or shape[:len(mask_shape)] != mask_shape:
+    return FAILS
+  # The size of the first dimension depends on the mask's values.
+  return _succeeds(None, tensor.dtype)
+
+
+def _broadcast_to(arg_values: ArgValues) -> Prediction:
+  tensor, target = arg_values
+  shape, target_shape = _tensor_shape(tensor), _int_list(target)
+  if len(shape) > len(target_shape) or any(dim < 0 for dim in target_shape):
+    return FAILS
+  for dim, target_dim in zip(shape[::-1], target_shape[::-1]):
+    if dim not in (1, target_dim):
+      return FAILS
+  return _succeeds(target_shape, tensor.dtype)
+
+
+def _concat(arg_values: ArgValues) -> Prediction:
+  shapes, dtypes = _tensor_list_shapes_and_dtypes(arg_values[0])
+  rank = len(shapes[0])
+  if any(len(shape) != rank for shape in shapes) or len(dtypes) > 1:
+    return FAILS
+  axis = _normalize_axis(_int(arg_values[1]), rank)
+  if axis is None:
+    return FAILS
+  result_shape = list(shapes[0])
+  for shape in shapes[1:]:
+    if (shape[:axis] != result_shape[:axis] or
+        shape[axis + 1:] != result_shape[axis + 1:]):
+      return FAILS
+    result_shape[axis] += shape[axis]
+  return _succeeds(result_shape, dtypes.pop())
+
+
+def _expand_dims(arg_values: ArgValues) -> Prediction:
+  tensor, axis = arg_values
+  shape = _tensor_shape(tensor)
+  axis = _normalize_axis(_int(axis), len(shape) + 1)
+  if axis is None:
+    return FAILS
+  return _succeeds(shape[:axis] + [1] + shape[axis:], tensor.dtype)
+
+
+def _make_fill(dtype: Optional[tf.DType] = None) -> RuleType:
+  """Creates a rule for tf.fill, tf.ones, and tf.zeros."""
+  def _rule(arg_values: ArgValues) -> Prediction:
+    dims = _int_list(arg_values[0])
+    if any(dim < 0 for dim in dims):
+      return FAILS
+    return _succeeds(dims, dtype)
+  return _rule
+
+
+def _gather(arg_values: ArgValues) -> Prediction:
+  params, indices = arg_values
+  shape = _tensor_shape(params)
+  if not shape:
+    return FAILS
+  if indices.is_tensor and indices.dtype.is_integer:
+    indices_shape = indices.shape
+    indices_array = indices.numpy_value()
+  elif indices.is_sequence and indices.elem_type is int:
+    indices_shape = [len(indices.value)]
+    indices_array = np.array(indices.value)
+  else:
+    raise _Unknown()
+  # Out-of-range indices raise an error on CPU.
+  if indices_array.min() < 0 or indices_array.max() >= shape[0]:
+    return FAILS
+  return _succeeds(list(indices_shape) + shape[1:], params.dtype)
+
+
+def _matmul(arg_values: ArgValues) -> Prediction:
+  a, b = arg_values
+  a_shape, b_shape = _tensor_shape(a), _tensor_shape(b)
+  if (len(a_shape) < 2 or len(b_shape) < 2 or a_shape[-1] != b_shape[-2] or
+      not _same_dtypes(arg_values)):
+    return FAILS
+  batch_shape = _broadcast_shape([a_shape[:-2], b_shape[:-2]])
+  if batch_shape is None:
+    return FAILS
+  return _succeeds(batch_shape + [a_shape[-2], b_shape[-1]], a.dtype)
+
+
+def _one_hot(arg_values: ArgValues) -> Prediction:
+  indices, depth = arg_values
+  shape, depth = _tensor_shape(indices), _int(depth)
+  if depth < 0:
+    return FAILS
+  return _succeeds(shape + [depth], tf.float32)
+
+
+def _reshape(arg_values: ArgValues) -> Prediction:
+  tensor, new_shape = arg_values
+  _tensor_shape(tensor)
+  new_shape = _int_list(new_shape)
+  num_elements = tensor.num_elements()
+  if new_shape.count(-1) > 1 or any(dim < -1 for dim in new_shape):
+    return FAILS
+  known_size = int(np.prod([dim for dim in new_shape if dim != -1]))
+  if -1 in new_shape:
+    if known_size == 0 or num_elements % known_size:
+      return FAILS
+    new_shape[new_shape.index(-1)] = num_elements // known_size
+  elif known_size != num_elements:
+    return FAILS
+  return _succeeds(new_shape, tensor.dtype)
+
+
+def _reverse(arg_values: ArgValues) -> Prediction:
+  tensor, axes = arg_values
+  shape = _tensor_shape(tensor)
+  axes = [_normalize_axis(axis, len(shape)) for axis in _int_list(axes)]
+  if None in axes or len(set(axes)) != len(axes):
+    return FAILS
+  return _succeeds(shape, tensor.dtype)
+
+
+def _shape(arg_values: ArgValues) -> Prediction:
+  return _succeeds([len(_tensor_shape(arg_values[0]))], tf.int32)
+
+
+def _squeeze(arg_values: ArgValues) -> Prediction:
+  tensor = arg_values[0]
+  return _succeeds([dim for dim in _tensor_shape(tensor) if dim != 1],
+                   tensor.dtype)
+
+
+def _squeeze_axis(arg_values: ArgValues) -> Prediction:
+  tensor, axis = arg_values
+  shape = _tensor_shape(tensor)
+  axis = _normalize_axis(_int(axis), len(shape))
+  if axis is None or shape[axis] != 1:
+    return FAILS
+  return _succeeds(shape[:axis] + shape[axis + 1:], tensor.dtype)
+
+
+def _stack(arg_values: ArgValues) -> Prediction:
+  shapes, dtypes = _tensor_list_shapes_and_dtypes(arg_values[0])
+  shape = shapes[0]
+  if any(other != shape for other in shapes) or len(dtypes) > 1:
+    return FAILS
+  axis = _normalize_axis(_int(arg_values[1]), len(shape) + 1)
+  if axis is None:
+    return FAILS
+  return _succeeds(shape[:axis] + [len(shapes)] + shape[axis:], dtypes.pop())
+
+
+def _tensordot(arg_values: ArgValues) -> Prediction:
+  a, b, axes = arg_values
+  a_shape, b_shape = _tensor_shape(a), _tensor_shape(b)
+  num_axes = _int(axes)
+  if (num_axes < 0 or num_axes > len(a_shape) or num_axes > len(b_shape) or
+      a_shape[len(a_shape) - num_axes:] != b_shape[:num_axes] or
+      not _same_dtypes([a, b])):
+    return FAILS
+  return _succeeds(a_shape[:len(a_shape) - num_axes] + b_shape[num_axes:],
+                   a.dtype)
+
+
+def _tile(arg_values: ArgValues) -> Prediction:
+  tensor, multiples = arg_values
+  shape, multiples = _tensor_shape(tensor), _int_list(multiples)
+  if len(multiples) != len(shape) or any(m < 0 for m in multiples):
+    return FAILS
+  return _succeeds([dim * m for dim, m in zip(shape, multiples)],
+                   tensor.dtype)
+
+
+def _top_k(arg_values: ArgValues) -> Prediction:
+  tensor, k = arg_values
+  shape, k = _tensor_shape(tensor), _int(k)
+  if not shape or k < 0 or k > shape[-1]:
+    return FAILS
+  # The result is a namedtuple of two tensors.
+  return _succeeds(None)
+
+
+def _transpose(arg_values: ArgValues) -> Prediction:
+  tensor = arg_values[0]
+  return _succeeds(_tensor_shape(tensor)[::-1], tensor.dtype)
+
+
+def _transpose_perm(arg_values: ArgValues) -> Prediction:
+  tensor, perm = arg_values
+  shape, perm = _tensor_shape(tensor), _int_list(perm)
+  if sorted(perm) != list(range(len(shape))):
+    return FAILS
+  return _succeeds([shape[axis] for axis in perm], tensor.dtype)
+
+
+def _unstack(arg_values: ArgValues) -> Prediction:
+  tensor, axis = arg_values
+  shape = _tensor_shape(tensor)
+  if _normalize_axis(_int(axis), len(shape)) is None:
+    return FAILS
+  # The result is a list of tensors.
+  return _succeeds(None)
+
+
+def _where_3(arg_values: ArgValues) -> Prediction:
+  condition, x, y = arg_values
+  shape = _broadcast_shape([_tensor_shape(condition), _operand_shape(x),
+                            _operand_shape(y)])
+  if shape is None or not _same_dtypes([x, y]):
+    return FAILS
+  return _succeeds(shape, x.dtype if x.is_tensor else y.dtype)
+
+
+def _like(arg_values: ArgValues) -> Prediction:
+  tensor = arg_values[0]
+  return _succeeds(_tensor_shape(tensor), tensor.dtype)
+
+
+################################################################################
+# Rules for Python operations.
+
+
+def _indexing(arg_values: ArgValues) -> Prediction:
+  tensor, index = arg_values
+  shape, index = _tensor_shape(tensor), _int(index)
+  if not shape or not -shape[0] <= index < shape[0]:
+    return FAILS
+  return _succeeds(shape[1:], tensor.dtype)
+
+
+def _indexing_axis_1(arg_values: ArgValues) -> Prediction:
+  tensor, index = arg_values
+  shape, index = _tensor_shape(tensor), _int(index)
+  if len(shape) < 2 or not -shape[1] <= index < shape[1]:
+    return FAILS
+  return _succeeds(shape[:1] + shape[2:], tensor.dtype)
+
+
+_ELEMENTWISE_UNARY_NAMES = [
+    'tf.abs(x)', 'tf.exp(x)', 'tf.math.ceil(x)', 'tf.math.floor(x)',
+    'tf.math.log(x)', 'tf.math.negative(x)', 'tf.math.reciprocal(x)',
+    'tf.math.reciprocal_no_nan(x)', 'tf.round(x)', 'tf.sign(x)', 'tf.sqrt(x)',
+    'tf.square(x)',
+]
+
+_ARITHMETIC_BINARY_NAMES = [
+    'tf.add(x, y)', 'tf.math.squared_difference(x, y)', 'tf.maximum(x, y)',
+    'tf.minimum(x, y)', 'tf.multiply(x, y)', 'tf.subtract(x, y)',
+]
+
+_COMPARISON_NAMES = [
+    'tf.equal(x, y)', 'tf.greater(x, y)', 'tf.greater_equal(x, y)',
+    'tf.not_equal(x, y)',
+]
+
+# A map from operation names to rules. Operations without a rule are always
+# applied.
+RULES = {
+    'tf.add_n(inputs)': _add_n,
+    'tf.argmax(input, axis)': _make_reduce_axis(tf.int64),
+    'tf.argmin(input, axis)': _make_reduce_axis(tf.int64),
+    'tf.argsort(values, axis, stable=True)': _make_along_axis(tf.int32),
+    'tf.boolean_mask(tensor, mask)': _boolean_mask,
+    'tf.broadcast_to(input, shape)': _broadcast_to,
+    'tf.concat(values, axis)': _concat,
+    'tf.divide(x, y)': _make_elementwise_binary(same_dtype_result=False),
+    'tf.expand_dims(input, axis)': _expand_dims,
+    'tf.fill(dims, value)': _make_fill(),
+    'tf.gather(params, indices)': _gather,
+    'tf.math.count_nonzero(input)': _make_reduce_all(tf.int64),
+    'tf.math.count_nonzero(input, axis)': _make_reduce_axis(tf.int64),
+    'tf.math.cumsum(x, axis)': _make_along_axis(),
+    'tf.math.cumsum(x, axis, exclusive=True)': _make_along_axis(),
+    # Like tf.divide, int tensors are divided in floating point.
+    'tf.math.divide_no_nan(x, y)': _make_elementwise_binary(
+        same_dtype_result=False),
+    'tf.math.top_k(input, k)': _top_k,
+    'tf.matmul(a, b)': _matmul,
+    'tf.one_hot(indices, depth)': _one_hot,
+    'tf.ones(shape)': _make_fill(tf.float32),
+    'tf.ones_like(input)': _like,
+    'tf.reduce_any(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reduce_max(input_tensor)': _make_reduce_all(),
+    'tf.reduce_max(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reduce_mean(input_tensor)': _make_reduce_all(),
+    'tf.reduce_mean(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reduce_min(input_tensor)': _make_reduce_all(),
+    'tf.reduce_min(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reduce_prod(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reduce_sum(input_tensor)': _make_reduce_all(),
+    'tf.reduce_sum(input_tensor, axis)': _make_reduce_axis(),
+    'tf.reshape(tensor, shape)': _reshape,
+    'tf.reverse(tensor, axis)': _reverse,
+    'tf.shape(input)': _shape,
+    'tf.sort(values, axis)': _make_along_axis(),
+    'tf.squeeze(input)': _squeeze,
+    'tf.squeeze(input, axis)': _squeeze_axis,
+    'tf.stack(values, axis)': _stack,
+    'tf.tensordot(a, b, axes)': _tensordot,
+    'tf.tile(input, multiples)': _tile,
+    'tf.transpose(a)': _transpose,
+    'tf.transpose(a, perm)': _transpose_perm,
+    'tf.unstack(value, axis)': _unstack,
+    'tf.where(condition, x, y)': _where_3,
+    'tf.zeros(shape)': _make_fill(tf.float32),
+    'tf.zeros_like(input)': _like,
+    'IndexingOperation': _indexing,
+    'IndexingAxis1Operation': _indexing_axis_1,
+}  # type: Dict[Text, RuleType]
+RULES.update((name, _elementwise_unary) for name in _ELEMENTWISE_UNARY_NAMES)
+RULES.update((name, _make_elementwise_binary())
+             for name in _ARITHMETIC_BINARY_NAMES)
+RULES.update((name, _make_elementwise_binary(tf.bool))
+             for name in _COMPARISON_NAMES)
+
+
+def predict(operation_name: Text,
+            arg_values: ArgValues) -> Optional[Prediction]:
+  """Predicts the outcome of applying an operation, without running it.
+
+  Args:
+    operation_name: The name of the operation.
+    arg_values: The argument Values.
+
+  Returns:
+    A Prediction, or None if the outcome can't be predicted.
+  """
+  rule = RULES.get(operation_name)
+  if rule is None:
+    return None
+  try:
+    return rule(arg_values)
+  except Exception:  # pylint: disable=broad-except
+    # Includes _Unknown, and unexpected argument kinds.
+    return None
+
+
+def _within_limits(shape: List[int]) -> bool:
+  """Returns whether a tensor of this shape may be stored in a Value."""
+  return (len(shape) <= limits.MAX_NUM_DIMENSIONS and
+          all(dim <= limits.MAX_DIMENSION_LENGTH for dim in shape) and
+          0 < int(np.prod(shape)) <= limits.MAX_TENSOR_ELEMENTS)
+
+
+def is_doomed(operation_name: Text, arg_values: ArgValues) -> bool:
+  """Returns whether applying the operation certainly yields no Value.
+
+  This happens if the operation raises an error, or if the result is a tensor
+  that is empty or exceeds the tensor limits.
+
+  Args:
+    operation_name: The name of the operation.
+    arg_values: The argument Values.
+  """
+  prediction = predict(operation_name, arg_values)
+  if prediction is None:
+    return False
+  if prediction.fails:
+    return True
+  return prediction.shape is not None and not _within_limits(prediction.shape)
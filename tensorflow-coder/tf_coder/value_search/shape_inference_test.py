@@ -0,0 +1,104 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Lint as: python3
+"""Tests for shape_inference.py."""
+
+import itertools
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import tensorflow as tf
+from tf_coder.value_search import all_operations
+from tf_coder.value_search import shape_inference
+from tf_coder.value_search import value
+from tf_coder.value_search import value_search_settings as settings_module
+
+
+def _pool():
+  """Returns a small pool of argument values of various kinds."""
+  return [
+      value.ConstantValue(tf.constant([[1, 2, 3], [4, 5, 6]])),
+      value.ConstantValue(tf.constant([[1.5, 2.5], [3.5, 4.5], [5.5, 6.5]])),
+      value.ConstantValue(tf.constant([0, 2, 1])),
+      value.ConstantValue(tf.constant([True, False, True])),
+      value.ConstantValue(tf.constant([7.0])),
+      value.ConstantValue(tf.constant(3)),
+      value.ConstantValue(-1),
+      value.ConstantValue(0),
+      value.ConstantValue(1),
+      value.ConstantValue(2),
+      value.ConstantValue(5),
+      value.ConstantValue([2, 3]),
+      value.ConstantValue([3, 2]),
+      value.ConstantValue([1, 0]),
+      value.ConstantValue([tf.constant([1, 2]), tf.constant([3, 4])]),
+      value.ConstantValue([tf.constant([1, 2]), tf.constant([3, 4, 5])]),
+  ]
+
+
+class ShapeInferenceTest(parameterized.TestCase):
+
+  def test_predictions_agree_with_operations(self):
+    settings = settings_module.default_settings()
+    pool = _pool()
+    operations = [operation
+                  for operation in all_operations.get_operations()
+                  if operation.name in shape_inference.RULES]
+    self.assertNotEmpty(operations)
+    for operation in operations:
+      for arg_values in itertools.product(pool, repeat=operation.num_args):
+        prediction = shape_inference.predict(operation.name, arg_values)
+        if prediction is None:
+          continue
+        result = operation.apply(arg_values, settings)
+        message = '{} on {}'.format(operation.name, arg_values)
+        if prediction.fails:
+          self.assertIsNone(result, message)
+          continue
+        if result is None or not result.is_tensor:
+          continue
+        if prediction.shape is not None:
+          self.assertEqual(result.shape, prediction.shape, message)
+        if prediction.dtype is not None:
+          self.assertEqual(result.dtype, prediction.dtype, message)
+
+  @parameterized.named_parameters(
+      ('matmul_mismatch', 'tf.matmul(a, b)',
+       [tf.ones([2, 3]), tf.ones([2, 3])], True),
+      ('matmul_ok', 'tf.matmul(a, b)',
+       [tf.ones([2, 3]), tf.ones([3, 2])], False),
+      ('axis_out_of_range', 'tf.reduce_sum(input_tensor, axis)',
+       [tf.ones([2, 3]), 2], True),
+      ('broadcast_mismatch', 'tf.add(x, y)',
+       [tf.ones([2, 3]), tf.ones([2])], True),
+      ('too_large', 'tf.tile(input, multiples)',
+       [tf.ones([10, 10]), [20, 20]], True),
+      ('unknown_operation', 'NoSuchOperation', [tf.ones([2])], False))
+  def test_is_doomed(self, operation_name, args, expected):
+    arg_values = [value.ConstantValue(arg) for arg in args]
+    self.assertEqual(shape_inference.is_doomed(operation_name, arg_values),
+                     expected)
+
+  def test_predict_matmul_shape(self):
+    arg_values = [value.ConstantValue(tf.ones([2, 3])),
+                  value.ConstantValue(tf.ones([3, 4]))]
+    prediction = shape_inference.predict('tf.matmul(a, b)', arg_values)
+    self.assertFalse(prediction.fails)
+    self.assertEqual(prediction.shape, [2, 4])
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,199 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""A persistent cache of solutions, keyed by a normalized problem specification.
+
+Many users submit the same problems. The cache maps a digest of the examples,
+constants, description, result-relevant settings, and the operation set to the
+solutions found for that problem. Recently used entries are kept in memory, and
+all entries are optionally stored on disk in a SQLite database, so they survive
+restarts. Both levels are size-bounded with least-recently-used eviction.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional, Text
+
+import tensorflow as tf
+from tf_coder.benchmarks import benchmark as benchmark_module
+from tf_coder.value_search import all_operations
+from tf_coder.value_search import value as value_module
+from tf_coder.value_search import value_search
+from tf_coder.value_search import value_search_settings as settings_module
+
+
+# Default maximum numbers of cached problems.
+DEFAULT_MAX_MEMORY_ENTRIES = 256
+DEFAULT_MAX_DISK_ENTRIES = 100000
+
+# Settings that affect how long or how fast the search runs, or what it prints,
+# but not which solutions are correct.
+_IRRELEVANT_SETTINGS = frozenset([
+    'timeout',
+    'max_solutions',
+    'max_extra_solutions_time',
+    'num_workers',
+    'operations.batch_elementwise_operations',
+    'operations.use_numpy_backend',
+])
+
+CachedSolution = NamedTuple('CachedSolution', [
+    ('expression', Text),
+    ('weight', int),
+])
+
+
+@functools.lru_cache(maxsize=None)
+def operations_version() -> Text:
+  """Returns a digest of the available operations and their default weights."""
+  hasher = hashlib.blake2b(digest_size=16)
+  hasher.update(tf.__version__.encode('utf-8'))
+  for operation in all_operations.get_operations(
+      include_sparse_operations=True):
+    hasher.update('\n{}:{}'.format(operation.name,
+                                   operation.weight).encode('utf-8'))
+  return hasher.hexdigest()
+
+
+def _relevant_settings(settings: settings_module.Settings) -> Text:
+  """Returns a canonical string of the settings that affect solutions."""
+  relevant = {}
+  for name, setting in settings.as_dict().items():
+    if name in _IRRELEVANT_SETTINGS or name.startswith('printing.'):
+      continue
+    if isinstance(setting, (list, tuple, set)):
+      # Lists of operation names are unordered.
+      setting = sorted(str(elem) for elem in setting)
+    relevant[name] = setting
+  return json.dumps(relevant, sort_keys=True, default=repr)
+
+
+def problem_key(benchmark: benchmark_module.Benchmark,
+                settings: settings_module.Settings) -> Text:
+  """Returns a digest identifying the problem and search settings.
+
+  Inputs and outputs are normalized by converting them to tensors as the search
+  does, so e.g. a Python list and an equal tensor lead to the same key.
+
+  Args:
+    benchmark: The Benchmark to solve.
+    settings: The Settings for the search.
+
+  Returns:
+    A hex string.
+  """
+  hasher = hashlib.blake2b(digest_size=16)
+  hasher.update(operations_version().encode('utf-8'))
+  hasher.update(_relevant_settings(settings).encode('utf-8'))
+  for example in benchmark.examples:
+    hasher.update(b'E')
+    input_names_to_objects = value_search._input_names_to_objects(  # pylint: disable=protected-access
+        example.inputs)
+    for name, input_object in input_names_to_objects.items():
+      hasher.update('I{}:'.format(name).encode('utf-8'))
+      hasher.update(value_module.InputValue(input_object, name).fingerprint())
+    hasher.update(b'O')
+    hasher.update(value_module.OutputValue(example.output).fingerprint())
+  hasher.update('C{!r}'.format(list(benchmark.constants)).encode('utf-8'))
+  hasher.update('D{}'.format(benchmark.description.strip()).encode('utf-8'))
+  return hasher.hexdigest()
+
+
+class SolutionCache(object):
+  """An LRU cache of solutions, optionally backed by a SQLite database.
+
+  The cache is thread-safe.
+  """
+
+  def __init__(self,
+               path: Optional[Text] = None,
+               max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+               max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES) -> None:
+    """Initializes the cache.
+
+    Args:
+      path: The path of the SQLite database, or None to only cache in memory.
+      max_memory_entries: The maximum number of problems cached in memory.
+      max_disk_entries: The maximum number of problems stored on disk.
+    """
+    self.max_memory_entries = max_memory_entries
+    self.max_disk_entries = max_disk_entries
+    self._memory = collections.OrderedDict()  # Most recently used last.
+    self._lock = threading.Lock()
+    self._connection = None
+    if path is not None:
+      self._connection = sqlite3.connect(path, check_same_thread=False)
+      with self._connection:
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS solutions ('
+            'key TEXT PRIMARY KEY, solutions TEXT NOT NULL, '
+            'last_used REAL NOT NULL)')
+
+  def close(self) -> None:
+    """Closes the database, if any."""
+    with self._lock:
+      if self._connection is not None:
+        self._connection.close()
+        self._connection = None
+
+  def _remember(self, key: Text, solutions: List[CachedSolution]) -> None:
+    """Stores an entry in memory. The lock must be held."""
+    self._memory[key] = solutions
+    self._memory.move_to_end(key)
+    while len(self._memory) > self.max_memory_entries:
+      self._memory.popitem(last=False)
+
+  def get(self, key: Text) -> Optional[List[CachedSolution]]:
+    """Returns the cached solutions for a problem key, or None if missing."""
+    with self._lock:
+      if key in self._memory:
+        self._memory.move_to_end(key)
+        return list(self._memory[key])
+      if self._connection is None:
+        return None
+      row = self._connection.execute(
+          'SELECT solutions FROM solutions WHERE key = ?', (key,)).fetchone()
+      if row is None:
+        return None
+      with self._connection:
+        self._connection.execute(
+            'UPDATE solutions SET last_used = ? WHERE key = ?',
+            (time.time(), key))
+      solutions = [CachedSolution(expression, weight)
+                   for expression, weight in json.loads(row[0])]
+      self._remember(key, solutions)
+      return list(solutions)
+
+  def put(self, key: Text, solutions: List[CachedSolution]) -> None:
+    """Stores the solutions for a problem key, replacing previous ones."""
+    solutions = [CachedSolution(expression, weight)
+                 for expression, weight in solutions]
+    with self._lock:
+      self._remember(key, solutions)
+      if self._connection is None:
+        return
+      with self._connection:
+        self._connection.execute(
+            'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)',
+            (key, json.dumps(solutions), time.time()))
+        self._connection.execute(
+            'DELETE FROM solutions WHERE key IN ('
+            'SELECT key FROM solutions ORDER BY last_used DESC '
+            'LIMIT -1 OFFSET ?)', (self.max_disk_entries,))
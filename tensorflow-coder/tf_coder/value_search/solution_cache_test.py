@@ -0,0 +1,117 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for solution_cache.py."""
+
+import os
+
+from absl.testing import absltest
+import tensorflow as tf
+from tf_coder.benchmarks import benchmark as benchmark_module
+from tf_coder.value_search import solution_cache
+from tf_coder.value_search import value_search_settings as settings_module
+
+
+def _benchmark(inputs, output, constants=None, description=None):
+  return benchmark_module.Benchmark(
+      examples=[benchmark_module.Example(inputs, output)],
+      constants=constants,
+      description=description)
+
+
+class ProblemKeyTest(absltest.TestCase):
+
+  def setUp(self):
+    super(ProblemKeyTest, self).setUp()
+    self.settings = settings_module.default_settings()
+    self.key = solution_cache.problem_key(
+        _benchmark([[1, 2], [3, 4]], [4, 6]), self.settings)
+
+  def test_normalizes_inputs(self):
+    benchmark = _benchmark([tf.constant([1, 2]), [3, 4]], tf.constant([4, 6]))
+    self.assertEqual(solution_cache.problem_key(benchmark, self.settings),
+                     self.key)
+
+  def test_ignores_irrelevant_settings(self):
+    settings = settings_module.from_dict({
+        'timeout': 5,
+        'max_solutions': 3,
+        'printing.verbose': True})
+    self.assertEqual(
+        solution_cache.problem_key(_benchmark([[1, 2], [3, 4]], [4, 6]),
+                                   settings),
+        self.key)
+
+  def test_ignores_order_of_desired_operations(self):
+    first = settings_module.from_dict(
+        {'operations.desired_operations': ['tf.add(x, y)', 'tf.add_n(inputs)']})
+    second = settings_module.from_dict(
+        {'operations.desired_operations': ['tf.add_n(inputs)', 'tf.add(x, y)']})
+    benchmark = _benchmark([[1, 2], [3, 4]], [4, 6])
+    self.assertEqual(solution_cache.problem_key(benchmark, first),
+                     solution_cache.problem_key(benchmark, second))
+
+  def test_distinguishes_problems(self):
+    different_benchmarks = [
+        _benchmark([[1, 2], [3, 5]], [4, 6]),
+        _benchmark([[1, 2], [3, 4]], [4, 7]),
+        _benchmark({'a': [1, 2], 'b': [3, 4]}, [4, 6]),
+        _benchmark([[1, 2], [3, 4]], [4, 6], constants=[7]),
+        _benchmark([[1, 2], [3, 4]], [4, 6], description='add'),
+    ]
+    keys = [solution_cache.problem_key(benchmark, self.settings)
+            for benchmark in different_benchmarks]
+    self.assertLen(set(keys + [self.key]), len(keys) + 1)
+    self.assertNotEqual(
+        solution_cache.problem_key(
+            _benchmark([[1, 2], [3, 4]], [4, 6]),
+            settings_module.from_dict({'require_all_inputs_used': False})),
+        self.key)
+
+
+class SolutionCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super(SolutionCacheTest, self).setUp()
+    self.solutions = [solution_cache.CachedSolution('tf.add(in1, in2)', 3),
+                      solution_cache.CachedSolution('tf.add(in2, in1)', 3)]
+
+  def test_memory_eviction(self):
+    cache = solution_cache.SolutionCache(max_memory_entries=2)
+    self.assertIsNone(cache.get('a'))
+    cache.put('a', self.solutions)
+    cache.put('b', [])
+    self.assertEqual(cache.get('a'), self.solutions)  # 'a' is most recent.
+    cache.put('c', [])
+    self.assertEqual(cache.get('a'), self.solutions)
+    self.assertIsNone(cache.get('b'))
+
+  def test_persists_to_disk(self):
+    path = os.path.join(self.create_tempdir().full_path, 'cache.sqlite')
+    cache = solution_cache.SolutionCache(path, max_disk_entries=2)
+    cache.put('a', self.solutions)
+    cache.put('b', self.solutions[:1])
+    cache.put('c', self.solutions[1:])
+    cache.close()
+
+    reopened = solution_cache.SolutionCache(path)
+    self.assertIsNone(reopened.get('a'))
+    self.assertEqual(reopened.get('b'), self.solutions[:1])
+    self.assertEqual(reopened.get('c'), self.solutions[1:])
+    reopened.close()
+
+
+if __name__ == '__main__':
+  absltest.main()
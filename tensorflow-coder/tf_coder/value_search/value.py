@@ -17,15 +17,18 @@
 
 import abc
 import collections
+import copy
 import functools
 import itertools
 import operator
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Text, Tuple
+
+import numpy as np
 import six
 
 import tensorflow as tf
 from tf_coder import tf_coder_utils
 from tf_coder.value_search import value_search_utils
-from tf_coder.value_search import value_search_settings as settings_module
 
 
 def cache(fn):
@@ -39,6 +42,63 @@ def cache(fn):
   return new_fn
 
 
+# A reconstruction while enumerating: the expression, a bitset of the used
+# inputs, and a Value whose first reconstruction is the expression.
+_ReconstructionType = Tuple[Text, int, 'Value']
+
+
+def _input_mask(input_names: Iterable[Text], input_bits: Dict[Text, int]) -> int:
+  """Returns the bitset of the input names, assigning bits to new names."""
+  mask = 0
+  for name in input_names:
+    if name not in input_bits:
+      input_bits[name] = 1 << len(input_bits)
+    mask |= input_bits[name]
+  return mask
+
+
+class _LazySequence(object):
+  """Caches the items of an iterator, so that they can be iterated many times.
+
+  Items are only taken from the iterator when an iteration first reaches them.
+  """
+
+  def __init__(self, iterator: Iterator) -> None:
+    self._iterator = iterator
+    self._items = []  # type: List
+    self._exhausted = False
+
+  def __iter__(self) -> Iterator:
+    index = 0
+    while True:
+      if index == len(self._items):
+        if self._exhausted:
+          return
+        try:
+          self._items.append(next(self._iterator))
+        except StopIteration:
+          self._exhausted = True
+          return
+      yield self._items[index]
+      index += 1
+
+  def is_empty(self) -> bool:
+    return next(iter(self), None) is None
+
+
+def _lazy_product(sequences: Sequence[_LazySequence]) -> Iterator[Tuple]:
+  """Like itertools.product(), but only consumes the sequences as needed."""
+  if any(sequence.is_empty() for sequence in sequences):
+    return
+  if not sequences:
+    yield ()
+    return
+  first, rest = sequences[0], sequences[1:]
+  for item in first:
+    for items in _lazy_product(rest):
+      yield (item,) + items
+
+
 @six.add_metaclass(abc.ABCMeta)
 class Value(object):
   """The Value class wraps a value (a Python object) used in value search.
@@ -58,9 +118,15 @@ class Value(object):
   sequences. In the nested sequence case, we also require that it is tensor-like
   (i.e., calling tf.constant() succeeds without error).
 
+  A Value may also be created from a NumPy array, as computed by the NumPy
+  backend. It then behaves like a Value wrapping the equivalent tf.Tensor, but
+  the tensor is only created when `value` is first accessed, so chains of NumPy
+  applications never pay for conversions to TensorFlow.
+
   Attributes:
     value: The value (any eligible Python object) wrapped inside this Value.
-    type: Exactly `type(value)`, as an attribute for convenience.
+    type: Exactly `type(value)`, as an attribute for convenience, or np.ndarray
+      if the Value was created from a NumPy array.
 
     is_primitive: True iff `type` is one of int, list, bool, or string.
     is_dtype: True iff `value` is an instance of tf.DType.
@@ -101,13 +167,19 @@ class Value(object):
       ValueError: If `value` is an empty sequence, or a sequence of different
         types of elements, or anything that is too large.
     """
-    self.value = value
+    # The NumPy array of a tensor created from one, until `value` is needed.
+    self._numpy_array = None
+    if isinstance(value, np.ndarray):
+      self._numpy_array = value
+    else:
+      self.value = value
     self.type = type(value)
 
     self.is_primitive = self.type in tf_coder_utils.PRIMITIVE_TYPES
-    self.is_dtype = isinstance(self.value, tf.DType)
-    self.is_sequence = isinstance(self.value, (list, tuple))
-    self.is_tensor = isinstance(value, tf.Tensor)
+    self.is_dtype = isinstance(value, tf.DType)
+    self.is_sequence = isinstance(value, (list, tuple))
+    self.is_tensor = (isinstance(value, tf.Tensor) or
+                      self._numpy_array is not None)
     self.is_sparse_tensor = isinstance(value, tf.SparseTensor)
 
     self.cached_info = {}
@@ -163,9 +235,13 @@ class Value(object):
     # Tensor-related attributes and checks.
     self.dtype = None
     self.shape = None
-    if self.is_tensor:
+    if self._numpy_array is not None:
+      self.dtype = tf.as_dtype(value.dtype)
+      self.shape = list(value.shape)
+    elif self.is_tensor:
       self.dtype = value.dtype
       self.shape = value.shape.as_list()
+    if self.is_tensor:
       if self.num_elements() == 0:
         raise ValueError('Tensor is empty.')
       if not value_search_utils.check_tensor_size(self):
@@ -197,20 +273,82 @@ class Value(object):
                 self.is_tensor, self.is_sparse_tensor)) <= 1
 
     self._repr_cache = None
+    self._fingerprint_cache = None
+
+    # Counterparts of this Value on examples other than the first, used during
+    # multi-example search. None means the Value is the same on every example.
+    self.other_example_values = None  # type: Optional[List[Value]]
+
+  def __getattr__(self, name):
+    """Creates the tensor of a Value created from a NumPy array when needed.
+
+    This is only called for attributes that are not set, so accessing `value`
+    costs nothing once the tensor exists.
+    """
+    numpy_array = self.__dict__.get('_numpy_array')
+    if name != 'value' or numpy_array is None:
+      raise AttributeError(name)
+    self.value = tf.convert_to_tensor(numpy_array)
+    return self.value
 
   def __repr__(self):
-    """Returns a string representation of the value.
+    """Returns a human-readable string representation of the value.
 
-    Values are considered equal if and only if their string representations (as
-    computed by this function) are equal.
+    The string is computed lazily and is not used for hashing or equality,
+    which rely on fingerprint() instead.
     """
     if self._repr_cache is None:
       self._repr_cache = tf_coder_utils.object_to_string(self.value)
     return self._repr_cache
 
+  @property
+  def num_examples(self):
+    """The number of examples this Value has results for."""
+    if self.other_example_values is None:
+      return 1
+    return 1 + len(self.other_example_values)
+
+  def for_example(self, index):
+    """Returns the counterpart of this Value on the example with given index."""
+    if index == 0 or self.other_example_values is None:
+      return self
+    return self.other_example_values[index - 1]
+
+  def set_other_example_values(self, other_example_values):
+    """Sets the counterparts of this Value on examples other than the first.
+
+    Args:
+      other_example_values: A list of Value objects, where the i-th element is
+        this Value's counterpart on example i + 1.
+    """
+    self.other_example_values = list(other_example_values)
+    self._fingerprint_cache = None
+
+  def fingerprint(self):
+    """Returns a compact digest of the value, computed once and cached.
+
+    Values are considered equal if and only if their fingerprints are equal.
+    The fingerprint respects the same floating-point rounding as
+    tf_coder_utils.object_to_string(), and is stable across processes.
+
+    If the Value has counterparts on other examples, the fingerprint reflects
+    its behavior on all examples. A Value that behaves the same on every example
+    has the same fingerprint as a Value for a single example.
+    """
+    if self._fingerprint_cache is None:
+      fingerprint = tf_coder_utils.object_to_fingerprint(
+          self._numpy_array if self._numpy_array is not None else self.value)
+      if self.other_example_values is not None:
+        fingerprints = [fingerprint] + [other.fingerprint()
+                                        for other in self.other_example_values]
+        if any(other != fingerprint for other in fingerprints):
+          fingerprint = tf_coder_utils.combine_fingerprints(fingerprints)
+      self._fingerprint_cache = fingerprint
+    return self._fingerprint_cache
+
   def __hash__(self):
     """Implements hash so that Value objects can be used as dict keys."""
-    return hash(repr(self))
+    return hash(self.fingerprint())
 
   def __eq__(self, other):
     """Returns whether this Value object is equal to `other`.
@@ -218,12 +356,16 @@ class Value(object):
     Args:
       other: The other object to compare to.
 
-    Values are considered equal if and only if their string representations (as
-    computed by __repr__) are equal.
+    Values are considered equal if and only if their fingerprints (as
+    computed by fingerprint()) are equal. Collisions of hash(), which
+    truncates the fingerprint, are resolved by the complete 128-bit digest,
+    but the wrapped objects themselves are never compared: this runs for
+    every duplicate value the search finds, and two different values with
+    the same BLAKE2b digest are not expected in practice.
     """
     if not isinstance(other, Value):
       return NotImplemented
-    return repr(self) == repr(other)
+    return self.fingerprint() == other.fingerprint()
 
   def __ne__(self, other):
     """Returns whether this Value object is not equal to `other`."""
@@ -256,25 +398,84 @@ class Value(object):
     """
     return self.reconstruct_expression(), set(), self
 
-  def reconstruct_all_expressions_with_input_names(self, seen_values=None):
+  def reconstruct_all_expressions_with_input_names(self, seen_values=None,
+                                                   limit=None):
     """Returns a list of code expressions and input names that were used.
 
-    By default this simply calls reconstruct_expression_with_input_names().
+    Each element is a tuple (expression, used input names, value), where the
+    value's first reconstruction is the expression. The list contains distinct
+    expressions, in the same order as iter_all_expressions_with_input_names().
+
+    Args:
+      seen_values: A set of Value objects that should not be used as
+        descendants because they already appeared as an ancestor.
+      limit: The maximum number of expressions to return, or None for no limit.
+    """
+    return list(self.iter_all_expressions_with_input_names(seen_values, limit))
+
+  def iter_all_expressions_with_input_names(
+      self,
+      seen_values: Optional[Set['Value']] = None,
+      limit: Optional[int] = None
+  ) -> Iterator[Tuple[Text, Set[Text], 'Value']]:
+    """Lazily yields the distinct code expressions that create this value.
+
+    Alternative reconstructions (from merged operation applications) are only
+    built as they are reached, and operations are not applied again, so taking
+    the first few expressions is cheap however many alternatives exist.
+
+    Expressions come in the order of the merged applications, and for each
+    one in the order of its arguments' alternatives; the first expression is
+    that of reconstruct_expression_with_input_names(). They are not sorted
+    by weight: the value search only merges applications found at the same
+    weight, so every reconstruction of a value it found has the same weight.
+
+    Args:
+      seen_values: A set of Value objects that should not be used as
+        descendants because they already appeared as an ancestor.
+      limit: The maximum number of expressions to yield, or None for no limit.
+
+    Yields:
+      Tuples (expression, used input names, value), as described in
+      reconstruct_all_expressions_with_input_names().
+    """
+    input_bits = {}  # type: Dict[Text, int]
+    reconstructions = self._iter_reconstructions(
+        frozenset(seen_values or ()), input_bits)
+    for expression, input_mask, reconstructed_value in itertools.islice(
+        reconstructions, limit):
+      yield (expression,
+             {name for name, bit in input_bits.items() if input_mask & bit},
+             reconstructed_value)
+
+  def _iter_reconstructions(
+      self,
+      seen_values: frozenset,
+      input_bits: Dict[Text, int]) -> Iterator[_ReconstructionType]:
+    """Yields the distinct reconstructions of this value.
+
+    By default this simply uses reconstruct_expression_with_input_names().
     Subclasses should override this method if there are multiple possible
     reconstructions of the value.
 
     Args:
-      seen_values: A set of Value objects that should not be used as
+      seen_values: A frozenset of Value objects that should not be used as
         descendants because they already appeared as an ancestor.
+      input_bits: A dict mapping input names to their bit in the bitsets of
+        used inputs. New input names are added as they are found.
     """
     del seen_values  # Unused here, but used by OperationValue's implementation.
-    return [self.reconstruct_expression_with_input_names()]
+    expression, input_names, reconstructed_value = (
+        self.reconstruct_expression_with_input_names())
+    yield expression, _input_mask(input_names, input_bits), reconstructed_value
 
   @cache
   def num_elements(self):
     """Returns the number of elements in the wrapped value."""
     if self.is_sparse_tensor:
       return tf_coder_utils.num_tensor_elements(self.value.values)
+    elif self._numpy_array is not None:
+      return int(self._numpy_array.size)
     else:
       return tf_coder_utils.num_tensor_elements(self.value)
 
@@ -306,10 +507,17 @@ class Value(object):
     else:
       return float(tf.reduce_prod(tf.cast(self.value, tf.float32)))
 
+  @cache
+  def numpy_value(self):
+    """Returns the wrapped tensor as a NumPy array."""
+    if self._numpy_array is not None:
+      return self._numpy_array
+    return self.value.numpy()
+
   @cache
   def numpy_tolist(self):
     """Returns the wrapped value's elements as a list."""
-    return self.value.numpy().tolist()
+    return self.numpy_value().tolist()
 
   @cache
   def has_int_dtype(self):
@@ -375,6 +583,9 @@ class OperationValue(Value):
   def merge_reconstructions(self, other_operation_value):
     """Adds another way of constructing this same value.
 
+    The value search only merges values found at the same weight, so all
+    reconstructions of a value have the same weight.
+
     Args:
       other_operation_value: An OperationValue that is equal to this object, but
         with a different reconstruction.
@@ -382,36 +593,49 @@ class OperationValue(Value):
     self.operation_applications.extend(
         other_operation_value.operation_applications)
 
-  def reconstruct_all_expressions_with_input_names(self, seen_values=None):
-    """See base class."""
-    if seen_values is None:
-      seen_values = set()
+  def with_application(self, operation, arg_values):
+    """Returns a new OperationValue wrapping the same object as this one.
 
-    seen_values.add(self)
+    Unlike merge_reconstructions(), this does not modify this object. This is
+    used to reuse the result of a previous application of `operation` to
+    arguments equal to `arg_values`.
 
-    results = []
-    for operation_application in self.operation_applications:
-      operation = operation_application.operation
-      arg_values = operation_application.arg_values
+    Args:
+      operation: The Operation that creates the new OperationValue.
+      arg_values: The arguments of the Operation.
+    """
+    # A shallow copy skips the checks in __init__ and keeps cached information
+    # about the wrapped object.
+    result = copy.copy(self)
+    result.operation_applications = [OperationApplication(
+        operation=operation, arg_values=arg_values)]
+    result._expression_cache = None  # pylint: disable=protected-access
+    return result
+
+  def _iter_reconstructions(self, seen_values, input_bits):
+    """See base class."""
+    seen_values = seen_values | {self}
+    seen_expressions = set()
+    for operation, arg_values in self.operation_applications:
       if any(arg_value in seen_values for arg_value in arg_values):
         continue
-
-      # A list containing a List[Tuple[reconstruction, used input names, value]] for
-      # each argument.
       all_arg_reconstructions = [
-          arg_value.reconstruct_all_expressions_with_input_names(
-              seen_values=seen_values.copy())
-          for arg_value in arg_values
-      ]
-      
-      for product in itertools.product(*all_arg_reconstructions):
-        expressions_list, input_names_list, values_list = zip(*product)
-        results.append(
-            (operation.reconstruct_expression_from_strings(expressions_list),
-            set.union(*input_names_list),
-            operation.apply(values_list, settings_module.default_settings)))
-
-    return results
+          _LazySequence(arg_value._iter_reconstructions(  # pylint: disable=protected-access
+              seen_values, input_bits))
+          for arg_value in arg_values]
+      for product in _lazy_product(all_arg_reconstructions):
+        expression = operation.reconstruct_expression_from_strings(
+            [arg_expression for arg_expression, _, _ in product])
+        if expression in seen_expressions:
+          continue
+        seen_expressions.add(expression)
+        input_mask = functools.reduce(
+            operator.or_, (arg_mask for _, arg_mask, _ in product), 0)
+        # The same object, created from the reconstructed arguments.
+        reconstructed_value = self.with_application(
+            operation, [arg_value for _, _, arg_value in product])
+        yield expression, input_mask, reconstructed_value
+
 
 class ConstantValue(Value):
   """A constant value that is not created by any operation."""
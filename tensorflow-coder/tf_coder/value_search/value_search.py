@@ -16,6 +16,7 @@
 """Exhaustive value search (enumerating by weight of expression)."""
 
 import collections
+import itertools
 import keyword
 import operator
 import re
@@ -35,10 +36,12 @@ from tf_coder.datasets import collect_tensor_data
 from tf_coder.models import tensor_features_model
 from tf_coder.natural_language import description_handler as description_handler_module
 from tf_coder.value_search import all_operations
+from tf_coder.value_search import application_cache as application_cache_module
 from tf_coder.value_search import filtered_values_cache
 from tf_coder.value_search import operation_base
 from tf_coder.value_search import operation_filtering
 from tf_coder.value_search import operation_statistics
+from tf_coder.value_search import parallel_search
 from tf_coder.value_search import value as value_module
 from tf_coder.value_search import value_search_settings as settings_module
 from tf_coder import asyn_utils
@@ -62,6 +65,7 @@ ValueSearchResults = NamedTuple('ValueSearchResults', [
     ('benchmark', benchmark_module.Benchmark),
     ('settings', settings_module.Settings),
     ('statistics', Optional[operation_statistics.OperationStatistics]),
+    ('search_state', 'SearchState'),
 ])
 
 
@@ -153,6 +157,21 @@ def _input_names_to_objects(
   return input_names_to_objects
 
 
+def _other_example_input_values(
+    name: Text,
+    benchmark: benchmark_module.Benchmark) -> List[value_module.InputValue]:
+  """Returns the InputValues named `name` for all examples except the first."""
+  input_values = []
+  for example in benchmark.examples[1:]:
+    input_names_to_objects = _input_names_to_objects(example.inputs)
+    if name not in input_names_to_objects:
+      raise ValueError('All examples must have the same inputs, but input {!r} '
+                       'is missing from an example.'.format(name))
+    input_values.append(
+        value_module.InputValue(input_names_to_objects[name], name))
+  return input_values
+
+
 def _add_constants_and_inputs_and_print(
     values_by_weight: ValuesByWeight,
     benchmark: benchmark_module.Benchmark,
@@ -183,13 +202,20 @@ def _add_constants_and_inputs_and_print(
   input_names_to_objects = _input_names_to_objects(benchmark.examples[0].inputs)
   for name, input_object in input_names_to_objects.items():
     input_value = value_module.InputValue(input_object, name)
+    if settings.multi_example_search:
+      input_value.set_other_example_values(
+          _other_example_input_values(name, benchmark))
     if input_value.is_tensor:
       max_input_tensor_rank = max(max_input_tensor_rank, len(input_value.shape))
       dimension_lengths.update(input_value.shape)
     if input_value.is_primitive and constant_operation is not None:
       scalar_tensor_value = constant_operation.apply([input_value], settings)
-      _add_value_by_weight(values_by_weight, scalar_tensor_value,
-                           tf_functions.PRIMITIVE_INPUT_AS_TENSOR_WEIGHT)
+      if scalar_tensor_value is not None and settings.multi_example_search:
+        scalar_tensor_value = constant_operation.apply_to_other_examples(
+            scalar_tensor_value, [input_value], settings)
+      if scalar_tensor_value is not None:
+        _add_value_by_weight(values_by_weight, scalar_tensor_value,
+                             tf_functions.PRIMITIVE_INPUT_AS_TENSOR_WEIGHT)
 
     _add_value_by_weight(values_by_weight, input_value,
                          tf_functions.INPUT_VARIABLE_WEIGHT)
@@ -297,8 +323,8 @@ def _check_application(expression: Text,
   try:
     new_output = eval(expression, namespace)
     new_output_value = value_module.OperationValue(new_output)
-    # test object_to_string can be called with new_output_value
-    repr(new_output_value)
+    # test the fingerprint can be computed for new_output_value
+    new_output_value.fingerprint()
   except Exception as e:
     return False, True, str(e)
 
@@ -315,9 +341,12 @@ def _record_solutions(value: value_module.Value,
                       solutions: List[Solution],
                       solution_expression_set: Set[Text],
                       benchmark: benchmark_module.Benchmark,
-                      settings: settings_module.Settings) -> None:
+                      settings: settings_module.Settings,
+                      max_solutions: int) -> None:
   """Records new solutions in the `solutions` list."""
-  reconstructions = value.reconstruct_all_expressions_with_input_names()
+  # Alternative expressions are only built until enough solutions are found.
+  reconstructions = value.iter_all_expressions_with_input_names(
+      limit=settings.max_reconstructions_per_solution)
   this_solution_time = timeit.default_timer() - start_time
   for expression, used_input_names, reconstructed_value in reconstructions:
     if expression in solution_expression_set:
@@ -327,9 +356,13 @@ def _record_solutions(value: value_module.Value,
         print('Bad solution: {}'.format(expression))
       continue
 
-    if not all(_check_application(expression, example)[0] 
-        for example in benchmark.examples):
-      continue 
+    # In multi-example search, the value already matches on every example,
+    # unless it was computed with NumPy instead of TensorFlow.
+    if ((not settings.multi_example_search or
+         settings.operations.use_numpy_backend) and not all(
+        _check_application(expression, example)[0]
+        for example in benchmark.examples)):
+      continue
 
     solution_expression_set.add(expression)
     solutions.append(Solution(value=reconstructed_value, expression=expression,
@@ -337,161 +370,337 @@ def _record_solutions(value: value_module.Value,
     print('Found solution: {}'.format(expression))
     # Flush so the solutions appear in Colab immediately.
     sys.stdout.flush()
-    if len(solutions) >= settings.max_solutions:
+    if len(solutions) >= max_solutions:
       break
 
 
-def _find_solutions(
-    benchmark: benchmark_module.Benchmark,
-    operations: List[operation_base.Operation],
-    start_time: float,
-    settings: settings_module.Settings,
-    asyn: asyn_utils.Asyn
-) -> Tuple[List[Solution], Set[value_module.Value], ValuesByWeight,
-           Optional[operation_statistics.OperationStatistics]]:
-  """Helper, returning (solutions, value_set, values_by_weight, statistics)."""
-  timeout_reached = False
-  end_time = start_time + settings.timeout
-
-  only_minimal_solutions = settings.only_minimal_solutions
-  if settings.max_solutions == 1:
-    # If we only want one solution, it will be minimal.
-    only_minimal_solutions = True
-
-  # An object to track statistics, if requested.
-  statistics = (operation_statistics.OperationStatistics()
-                if settings.printing.statistics
-                else None)
-
-  # A list of Solution namedtuples.
-  solutions = asyn.solutions if asyn else []
-
-  # A set of string solution expressions (don't return duplicate solutions).
-  solution_expression_set = set()
-
-  # The output value to search for.
-  output_value = value_module.OutputValue(benchmark.examples[0].output)
-
-  # A list of OrderedDicts mapping Value objects to themselves. The i-th
-  # OrderedDict contains all Value objects of weight i.
-  values_by_weight = [collections.OrderedDict()
-                      for _ in range(settings.max_weight + 1)]
-
-  # Find and cache the cast and constant operations for use later.
-  cast_operation = None
-  constant_operation = None
-  for operation in operations:
-    if operation.name == tf_functions.CAST_OPERATION_NAME:
-      cast_operation = operation
-    elif operation.name == tf_functions.CONSTANT_OPERATION_NAME:
-      constant_operation = operation
-  # Create the output dtype value for use later.
-  dtype_value = value_module.ConstantValue(output_value.dtype)
-
-  # Populate values_by_weight with inputs and constants. This also prints
-  # inputs/output/constants to stdout.
-  _add_constants_and_inputs_and_print(
-      values_by_weight, benchmark, output_value, constant_operation, settings)
+class SearchState(object):
+  """The state of a value search, which can be resumed to search further.
+
+  The search enumerates values weight by weight, and within one weight,
+  operation by operation. Besides the values found so far, the state records the
+  frontier of the search: the current weight, the index of the current operation,
+  and how many of that operation's values were already processed. A resumed
+  search continues from the frontier instead of starting over.
+
+  Attributes:
+    benchmark: The Benchmark being solved.
+    operations: The list of operations used in the search.
+    settings: The Settings object for the search.
+    only_minimal_solutions: Whether the search stops after the first weight
+      where solutions are found.
+    statistics: An optional OperationStatistics object.
+    solutions: A list of Solution namedtuples found so far.
+    solution_expression_set: A set of the solution expressions found so far.
+    output_value: The OutputValue to search for.
+    values_by_weight: A list of OrderedDicts mapping Value objects to
+      themselves. The i-th OrderedDict contains all Value objects of weight i.
+    value_set: A set storing all values found so far.
+    filter_cache: The FilteredValuesCache used for argument filtering.
+    application_cache: An optional ApplicationCache shared with other searches.
+    cast_operation: The cast operation, or None if it is not used.
+    dtype_value: A ConstantValue of the output dtype, used for casting.
+    weight: The weight currently being searched.
+    operation_index: The index of the current operation in `operations`, or
+      len(operations) if only casting remains for the current weight.
+    num_values_processed: The number of values of the current operation (or
+      casted values, if only casting remains) that were already processed.
+    max_solutions: The number of solutions after which the search stops.
+    elapsed_time: The total time spent searching so far, in seconds.
+    search_id: The id of the search in parallel_search, whose workers keep the
+      values of lower weights while the same search continues.
+  """
 
-  # A set storing all values found so far.
-  value_set = set().union(*values_by_weight)
+  def __init__(self,
+               benchmark: benchmark_module.Benchmark,
+               operations: List[operation_base.Operation],
+               settings: settings_module.Settings,
+               solutions: List[Solution],
+               application_cache: Optional[
+                   application_cache_module.ApplicationCache] = None) -> None:
+    """Initializes the state with the inputs and constants of the benchmark.
+
+    Args:
+      benchmark: The Benchmark being solved.
+      operations: The list of operations used in the search.
+      settings: The Settings object for the search.
+      solutions: The list where solutions will be added. Solutions already in
+        the list are not found again, and count towards the maximum number of
+        solutions.
+      application_cache: An optional ApplicationCache shared with other
+        searches. If None, the process-wide cache is used if enabled by
+        `settings.operations.use_global_application_cache`.
+    """
+    self.benchmark = benchmark
+    self.operations = operations
+    self.settings = settings
+
+    self.only_minimal_solutions = settings.only_minimal_solutions
+    if settings.max_solutions == 1:
+      # If we only want one solution, it will be minimal.
+      self.only_minimal_solutions = True
+
+    # An object to track statistics, if requested.
+    self.statistics = (operation_statistics.OperationStatistics()
+                       if settings.printing.statistics
+                       else None)
+
+    self.solutions = solutions
+    # Don't return duplicate solutions. `solutions` may already contain some,
+    # e.g., from a cache.
+    self.solution_expression_set = set(
+        solution.expression for solution in solutions)  # type: Set[Text]
+
+    self.output_value = value_module.OutputValue(benchmark.examples[0].output)
+    if settings.multi_example_search:
+      self.output_value.set_other_example_values(
+          [value_module.OutputValue(example.output)
+           for example in benchmark.examples[1:]])
+
+    self.values_by_weight = [collections.OrderedDict()
+                             for _ in range(settings.max_weight + 1)]
+
+    # Find and cache the cast and constant operations for use later.
+    self.cast_operation = None
+    constant_operation = None
+    for operation in operations:
+      if operation.name == tf_functions.CAST_OPERATION_NAME:
+        self.cast_operation = operation
+      elif operation.name == tf_functions.CONSTANT_OPERATION_NAME:
+        constant_operation = operation
+    # Create the output dtype value for use later.
+    self.dtype_value = value_module.ConstantValue(self.output_value.dtype)
+
+    # Populate values_by_weight with inputs and constants. This also prints
+    # inputs/output/constants to stdout.
+    _add_constants_and_inputs_and_print(
+        self.values_by_weight, benchmark, self.output_value, constant_operation,
+        settings)
+
+    self.value_set = set().union(*self.values_by_weight)
+    self.filter_cache = filtered_values_cache.FilteredValuesCache()
+    if (application_cache is None and
+        settings.operations.use_global_application_cache):
+      application_cache = application_cache_module.global_cache()
+    self.application_cache = application_cache
+
+    self.weight = 1
+    self.operation_index = 0
+    self.num_values_processed = 0
+    self.max_solutions = settings.max_solutions
+    self.elapsed_time = 0.0
+    self.search_id = parallel_search.next_search_id()
+
+  @property
+  def finished(self) -> bool:
+    """Whether every weight up to the maximum weight was searched."""
+    return self.weight > self.settings.max_weight
+
+  def advance_to_next_weight(self) -> None:
+    """Moves the frontier to the start of the next weight."""
+    self.weight += 1
+    self.operation_index = 0
+    self.num_values_processed = 0
+
+
+def _search_from_frontier(state: SearchState,
+                          start_time: float,
+                          end_time: float,
+                          asyn: Optional[asyn_utils.Asyn]) -> None:
+  """Continues the search from the frontier of `state`, updating it in place.
+
+  The search stops when it finishes the maximum weight, times out, is aborted,
+  or finds `state.max_solutions` solutions.
 
-  filter_cache = filtered_values_cache.FilteredValuesCache()
+  Args:
+    state: The SearchState to continue.
+    start_time: The time that solution times are measured from.
+    end_time: A timeit.default_timer() cutoff where the search should timeout.
+    asyn: An optional Asyn object used to abort the search. It is notified
+      when solutions are found.
+  """
+  settings = state.settings
+  operations = state.operations
+  output_value = state.output_value
+  values_by_weight = state.values_by_weight
+  value_set = state.value_set
+  solutions = state.solutions
+  num_previous_solutions = len(solutions)
 
   # Value search by weight.
-  for weight in range(1, settings.max_weight + 1):
+  while not state.finished:
+    weight = state.weight
     if settings.printing.progress:
       print('Searching weight {}...'.format(weight))
-      
+
     if asyn and asyn.aborted:
       break
 
     # Values with the current weight. This might already include leaf values.
     new_values = values_by_weight[weight]
 
-    for operation in operations:
-      for value in operation.enumerate_values_with_weight(
+    # In parallel mode, workers enumerate the remaining values of this weight
+    # ahead of the loop below, and are stopped when the loop stops.
+    first_operation_index = state.operation_index
+    level = None
+    if settings.num_workers > 1 and first_operation_index < len(operations):
+      level = parallel_search.enumerate_values_with_weight(
+          search_id=state.search_id,
+          operations=operations[first_operation_index:],
           target_weight=weight,
           values_by_weight=values_by_weight,
-          filter_cache=filter_cache,
           end_time=end_time,
           settings=settings,
-          statistics=statistics):
-
-        if value not in value_set:
-          # This value has never been seen before, or it's the desired output.
-          if settings.printing.verbose:
-            expression = value.reconstruct_expression()
-            print('{} produces:\n{}'.format(expression, value))
-
-          if value == output_value:
-
-            possible_first_solution = not solutions
-            # Found solution(s), but some may be bad.
-            _record_solutions(value, weight, start_time, solutions,
-                              solution_expression_set, benchmark, settings)
-            if possible_first_solution and solutions:
-              end_time = min(
-                  end_time,
-                  timeit.default_timer() + settings.max_extra_solutions_time)
-            if len(solutions) >= settings.max_solutions:
-              return solutions, value_set, values_by_weight, statistics
-          else:
-            # Only store the value if it isn't a solution. Otherwise, we'll get
-            # lots of "almost duplicate" solutions, e.g., by adding 0.
-            new_values[value] = value
-            # We should never add output_value (or anything equal) to value_set
-            # so that we can continue finding other solutions.
-            value_set.add(value)
-        else:  # This value has been seen before.
-          if value in new_values:
-            # The value was already computed differently with this weight.
-            original_value = new_values[value]
-            if isinstance(original_value, value_module.OperationValue):
-              # Only merge reconstructions if this was originally an
-              # OperationValue. (It could be a ConstantValue instead.)
-              operation_value = original_value   # type: value_module.OperationValue
-              operation_value.merge_reconstructions(value)
-          elif not only_minimal_solutions:
-            # If we want non-minimal solutions, we need to store the value even
-            # if we have already seen that value with a smaller weight.
-            new_values[value] = value
-
-      if timeit.default_timer() > end_time:
-        timeout_reached = True
-        # Don't return immediately; still try to cast new values because this is
-        # relatively quick.
-        break
+          only_minimal_solutions=state.only_minimal_solutions,
+          statistics=state.statistics)
+
+    timeout_reached = False
+    aborted = False
+    try:
+      while state.operation_index < len(operations):
+        operation = operations[state.operation_index]
+        if level is not None:
+          operation_values = level.operation_values(
+              state.operation_index - first_operation_index)
+        else:
+          operation_values = operation.enumerate_values_with_weight(
+              target_weight=weight,
+              values_by_weight=values_by_weight,
+              filter_cache=state.filter_cache,
+              end_time=end_time,
+              settings=settings,
+              statistics=state.statistics,
+              application_cache=state.application_cache)
+        # Enumeration is deterministic, so skip the values that were processed
+        # before the search was last interrupted.
+        operation_values = itertools.islice(
+            operation_values, state.num_values_processed, None)
+        for value in operation_values:
+          # Values are generated lazily, so check for timeout or abort often to
+          # stop in the middle of a large enumeration.
+          if timeit.default_timer() > end_time or (asyn and asyn.aborted):
+            break
+          state.num_values_processed += 1
+
+          if value not in value_set:
+            # This value has never been seen before, or it's the desired output.
+            if settings.printing.verbose:
+              expression = value.reconstruct_expression()
+              print('{} produces:\n{}'.format(expression, value))
+
+            if value == output_value:
+              possible_first_solution = len(solutions) == num_previous_solutions
+              # Found solution(s), but some may be bad.
+              _record_solutions(value, weight, start_time, solutions,
+                                state.solution_expression_set, state.benchmark,
+                                settings, state.max_solutions)
+              if asyn:
+                asyn.notify()
+              if (possible_first_solution and
+                  len(solutions) > num_previous_solutions):
+                end_time = min(
+                    end_time,
+                    timeit.default_timer() + settings.max_extra_solutions_time)
+              if len(solutions) >= state.max_solutions:
+                return
+            else:
+              # Only store the value if it isn't a solution. Otherwise, we'll
+              # get lots of "almost duplicate" solutions, e.g., by adding 0.
+              new_values[value] = value
+              # We should never add output_value (or anything equal) to
+              # value_set so that we can continue finding other solutions.
+              value_set.add(value)
+          else:  # This value has been seen before.
+            if value in new_values:
+              # The value was already computed differently with this weight.
+              original_value = new_values[value]
+              if isinstance(original_value, value_module.OperationValue):
+                # Only merge reconstructions if this was originally an
+                # OperationValue. (It could be a ConstantValue instead.)
+                operation_value = original_value   # type: value_module.OperationValue
+                operation_value.merge_reconstructions(value)
+            elif not state.only_minimal_solutions:
+              # If we want non-minimal solutions, we need to store the value
+              # even if we have already seen that value with a smaller weight.
+              new_values[value] = value
+
+        if asyn and asyn.aborted:
+          aborted = True
+          break
+        if timeit.default_timer() > end_time:
+          # The operation may not be finished, so the frontier stays here.
+          timeout_reached = True
+          # Don't return immediately; still try to cast new values because this
+          # is relatively quick.
+          break
+        state.operation_index += 1
+        state.num_values_processed = 0
+    finally:
+      if level is not None:
+        level.close()
 
     # Try casting new values to the output dtype if this has a chance of being
-    # a correct solution.
-    for new_value in new_values:
-      if (cast_operation is not None and
+    # a correct solution. Progress is only tracked once all operations are done;
+    # casting after a timeout is repeated when the search is resumed.
+    casting_remains = state.operation_index == len(operations)
+    first_cast_index = state.num_values_processed if casting_remains else 0
+    for new_value in itertools.islice(new_values, first_cast_index, None):
+      if casting_remains:
+        state.num_values_processed += 1
+      if (state.cast_operation is not None and
           new_value.shape == output_value.shape and
           new_value.dtype != output_value.dtype and
-          operation_filtering.is_castable(new_value, dtype_value)):
-        casted_value = cast_operation.apply([new_value, dtype_value], settings)
-        if casted_value == output_value:
-          possible_first_solution = not solutions
+          operation_filtering.is_castable(new_value, state.dtype_value)):
+        casted_value = state.cast_operation.apply(
+            [new_value, state.dtype_value], settings)
+        if casted_value is not None and settings.multi_example_search:
+          casted_value = state.cast_operation.apply_to_other_examples(
+              casted_value, [new_value, state.dtype_value], settings)
+        if casted_value is not None and casted_value == output_value:
+          possible_first_solution = len(solutions) == num_previous_solutions
           # Found solution(s), but some may be bad.
           _record_solutions(casted_value, weight, start_time, solutions,
-                            solution_expression_set, benchmark, settings)
-          if possible_first_solution and solutions:
+                            state.solution_expression_set, state.benchmark,
+                            settings, state.max_solutions)
+          if asyn:
+            asyn.notify()
+          if (possible_first_solution and
+              len(solutions) > num_previous_solutions):
             end_time = min(
                 end_time,
                 timeit.default_timer() + settings.max_extra_solutions_time)
-          if len(solutions) >= settings.max_solutions:
-            return solutions, value_set, values_by_weight, statistics
+          if len(solutions) >= state.max_solutions:
+            return
 
     if settings.printing.progress:
       print('Found {} distinct values of weight {}, or {} total.'.format(
           len(new_values), weight, len(value_set)))
-    if only_minimal_solutions and solutions:
-      return solutions, value_set, values_by_weight, statistics
-    if timeout_reached:
+    if timeout_reached or aborted:
+      break
+    state.advance_to_next_weight()
+    if (state.only_minimal_solutions and
+        len(solutions) > num_previous_solutions):
       break
 
-  return solutions, value_set, values_by_weight, statistics
+
+def _find_solutions(
+    benchmark: benchmark_module.Benchmark,
+    operations: List[operation_base.Operation],
+    start_time: float,
+    settings: settings_module.Settings,
+    asyn: asyn_utils.Asyn,
+    application_cache: Optional[application_cache_module.ApplicationCache]
+) -> SearchState:
+  """Helper, returning the SearchState after searching."""
+  # A list of Solution namedtuples.
+  solutions = asyn.solutions if asyn else []
+  state = SearchState(benchmark, operations, settings, solutions,
+                      application_cache)
+  _search_from_frontier(state, start_time, start_time + settings.timeout, asyn)
+  if asyn:
+    asyn.finish()
+  state.elapsed_time = timeit.default_timer() - start_time
+  return state
 
 
 def operation_multipliers_from_tensor_model(
@@ -576,7 +785,11 @@ def get_reweighted_operations(
     tensor_model: Optional[tensor_features_model.Model] = None,
     tensor_config: Optional[Dict[Text, Any]] = None,
 ) -> List[operation_base.Operation]:
-  """Returns a list of operations with correct weights for the problem."""
+  """Returns a list of operations with correct weights for the problem.
+
+  The operations are copies of the shared operations, so searches with
+  different weights can run concurrently.
+  """
   include_sparse_operations = (
       not settings.operations.limit_sparse_operations or
       _contains_sparse(benchmark))
@@ -589,9 +802,7 @@ def get_reweighted_operations(
 
   if settings.paper_experiments.uniform_weights:
     # Only for experiments in the PLDI paper.
-    for operation in operations:
-      operation.weight = 1
-    return operations
+    return [operation.with_weight(1) for operation in operations]
 
   multipliers = {}
   if description_handler and benchmark.description:
@@ -608,11 +819,9 @@ def get_reweighted_operations(
         multipliers, 
         operation_multipliers_from_settings(settings))
 
-  for operation in operations:
-    operation.weight = max(
-        1, int(round(operation.weight * multipliers.get(operation.name, 1))))
-
-  return operations
+  return [operation.with_weight(max(
+      1, int(round(operation.weight * multipliers.get(operation.name, 1)))))
+          for operation in operations]
 
 
 def run_value_search(
@@ -621,7 +830,9 @@ def run_value_search(
     description_handler: Optional[DescriptionHandler] = None,
     tensor_model: Optional[tensor_features_model.Model] = None,
     tensor_config: Optional[Dict[Text, Any]] = None,
-    asyn: asyn_utils.Asyn = None) -> ValueSearchResults:
+    asyn: asyn_utils.Asyn = None,
+    application_cache: Optional[application_cache_module.ApplicationCache] = None
+) -> ValueSearchResults:
   """Performs value search, iterating by the expression weight.
 
   Starts with the constants and user-provided inputs, and applies the given
@@ -636,6 +847,12 @@ def run_value_search(
     tensor_model: The tensor features model to use, already restored from a
       checkpoint. If None, do not run the model.
     tensor_config: The config to use with the tensor features model.
+    asyn: An optional Asyn object used to abort the search. It is notified
+      when solutions are found and when the search completes.
+    application_cache: An optional ApplicationCache from previous searches,
+      possibly for other problems or with different operation weights.
+      Operation applications stored there are not recomputed, and new
+      applications are added to it.
 
   Returns:
     A ValueSearchResults namedtuple.
@@ -656,36 +873,89 @@ def run_value_search(
       tensor_model=tensor_model,
       tensor_config=tensor_config)
 
-  solutions, value_set, values_by_weight, statistics = _find_solutions(
+  state = _find_solutions(
       benchmark=benchmark,
       operations=operations,
       start_time=start_time,
       settings=settings,
-      asyn=asyn)
+      asyn=asyn,
+      application_cache=application_cache)
 
   total_time = timeit.default_timer() - start_time
+  return _summarize_results(state, total_time,
+                            min(settings.timeout, total_time))
+
+
+def resume_value_search(
+    state: SearchState,
+    extra_time: float,
+    extra_solutions: int = 0,
+    asyn: Optional[asyn_utils.Asyn] = None) -> ValueSearchResults:
+  """Continues a previous value search from where it stopped.
+
+  Values, filtering caches, and solutions of the previous search are reused, so
+  the resumed search only does new work. Solution times and the total time
+  count the time spent in all runs of the search.
+
+  Args:
+    state: The SearchState of a previous search, from the ValueSearchResults
+      returned by run_value_search() or resume_value_search(). It is updated in
+      place.
+    extra_time: The number of seconds to continue searching for.
+    extra_solutions: The number of solutions to find beyond the previous target
+      number of solutions.
+    asyn: An optional Asyn object used to abort the search. Its solutions list
+      is replaced by the list of all solutions of the search, and it is
+      notified when solutions are found and when the search completes.
 
+  Returns:
+    A ValueSearchResults namedtuple containing old and new solutions.
+  """
+  _suppress_warnings()
+  run_start_time = timeit.default_timer()
+  # Measure solution times as if the search was never interrupted.
+  start_time = run_start_time - state.elapsed_time
+  state.max_solutions = (max(state.max_solutions, len(state.solutions)) +
+                         extra_solutions)
+  if asyn is not None:
+    asyn.solutions = state.solutions
+    asyn.completed = False
+
+  _search_from_frontier(state, start_time, run_start_time + extra_time, asyn)
+  if asyn is not None:
+    asyn.finish()
+
+  state.elapsed_time = timeit.default_timer() - start_time
+  return _summarize_results(state, state.elapsed_time,
+                            state.elapsed_time)
+
+
+def _summarize_results(state: SearchState,
+                       total_time: float,
+                       search_time: float) -> ValueSearchResults:
+  """Prints a summary of the search and returns its ValueSearchResults."""
+  solutions = state.solutions
   if solutions:
     print()
     print('Solution was found in {:.1f} seconds:\n{}'.format(
         solutions[0].time, solutions[0].expression))
-    if settings.max_solutions != 1:
+    if state.max_solutions != 1:
       for i in range(1, len(solutions)): print(solutions[i].expression)
       print('Found {} solution(s) in {:.1f} seconds total.'.format(
           len(solutions), total_time))
   else:
-    print('Could not find solution within {} seconds.'.format(
-        min(settings.timeout, total_time)))
+    print('Could not find solution within {} seconds.'.format(search_time))
   sys.stdout.flush()
 
   return ValueSearchResults(
       solutions=solutions,
       total_time=total_time,
-      value_set=value_set,
-      values_by_weight=values_by_weight,
-      benchmark=benchmark,
-      settings=settings,
-      statistics=statistics)
+      value_set=state.value_set,
+      values_by_weight=state.values_by_weight,
+      benchmark=state.benchmark,
+      settings=state.settings,
+      statistics=state.statistics,
+      search_state=state)
 
 
 def run_value_search_from_example(
@@ -40,6 +40,10 @@ class Settings(object):
     # Whether to only search for solutions with minimal weight.
     self.only_minimal_solutions = True
 
+    # Maximum number of alternative expressions to consider for each value that
+    # matches the output, when it can be created in many ways.
+    self.max_reconstructions_per_solution = 1000
+
     # Maximum number of seconds to spend searching for solutions after the
     # first.
     self.max_extra_solutions_time = 10
@@ -52,6 +56,15 @@ class Settings(object):
     self.require_all_inputs_used = True
     self.require_one_input_used = True
 
+    # Whether to search over all examples at once, so that values are
+    # distinguished by their results on every example and solutions need not be
+    # re-checked on the other examples.
+    self.multi_example_search = False
+
+    # The number of processes used to enumerate values of each weight. If 1,
+    # the search runs in the current process only.
+    self.num_workers = 1
+
     # The description handler to use.
     self.description_handler_name = 'tfidf_5_0.15'
 
@@ -117,6 +130,23 @@ class OperationSettings(object):
     self.undesired_multiplier = 2.0
     self.desired_multiplier = 0.5
 
+    # Whether to apply elementwise operations to many arguments at once, by
+    # stacking compatible arguments along a leading batch axis.
+    self.batch_elementwise_operations = True
+
+    # Whether to apply operations with NumPy instead of TensorFlow during
+    # search, for operations that have an exact NumPy equivalent. Solutions are
+    # still checked with TensorFlow.
+    self.use_numpy_backend = False
+
+    # Whether to skip applications that shape and dtype inference predicts
+    # will fail or produce a tensor exceeding the tensor limits.
+    self.use_shape_inference = True
+
+    # Whether searches without their own ApplicationCache share the
+    # process-wide one, so applications are reused across searches.
+    self.use_global_application_cache = False
+
 
 class TensorModelSettings(object):
   """Settings for the tensor features model."""
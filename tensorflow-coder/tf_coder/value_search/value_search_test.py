@@ -24,6 +24,7 @@ import mock
 import numpy as np
 import six
 import tensorflow as tf
+from tf_coder import asyn_utils
 from tf_coder import tf_functions
 from tf_coder.benchmarks import all_benchmarks
 from tf_coder.benchmarks import benchmark as benchmark_module
@@ -32,6 +33,8 @@ from tf_coder.models import tensor_features_model
 from tf_coder.natural_language import bag_of_words_handlers
 from tf_coder.natural_language import description_handler_factory
 from tf_coder.value_search import all_operations
+from tf_coder.value_search import application_cache
+from tf_coder.value_search import operation_base
 from tf_coder.value_search import value as value_module
 from tf_coder.value_search import value_search
 from tf_coder.value_search import value_search_settings as settings_module
@@ -280,6 +283,121 @@ class ValueSearchTest(parameterized.TestCase):
     self.assertEqual([solution.expression for solution in results.solutions],
                      expected_solutions)
 
+  def test_run_value_search_reuses_application_cache(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[benchmark_module.Example(inputs=[[1, 4], [2, 7]],
+                                           output=[3, 11])])
+    settings = settings_module.from_dict({
+        'timeout': 20,
+        'max_solutions': 4,
+        'only_minimal_solutions': False,
+        'max_extra_solutions_time': 20})
+    reweighted_settings = settings_module.from_dict({
+        'timeout': 20,
+        'max_solutions': 4,
+        'only_minimal_solutions': False,
+        'max_extra_solutions_time': 20,
+        'operations.desired_operations': ['tf.add_n(inputs)']})
+    expected_solutions = value_search.run_value_search(
+        benchmark=benchmark, settings=reweighted_settings).solutions
+
+    cache = application_cache.ApplicationCache()
+    value_search.run_value_search(
+        benchmark=benchmark, settings=settings, application_cache=cache)
+    self.assertNotEmpty(cache)
+    results = value_search.run_value_search(
+        benchmark=benchmark, settings=reweighted_settings,
+        application_cache=cache)
+    self.assertGreater(cache.hits, 0)
+    self.assertEqual([solution.expression for solution in results.solutions],
+                     [solution.expression for solution in expected_solutions])
+
+  def test_run_value_search_uses_global_application_cache(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[benchmark_module.Example(inputs=[[1, 4], [2, 7]],
+                                           output=[3, 11])])
+    settings = settings_module.from_dict({
+        'timeout': 20,
+        'max_solutions': 1,
+        'operations.use_global_application_cache': True})
+    global_cache = application_cache.global_cache()
+    global_cache.clear()
+    results = value_search.run_value_search(benchmark=benchmark,
+                                            settings=settings)
+    self.assertNotEmpty(global_cache)
+    self.assertIs(results.search_state.application_cache, global_cache)
+
+    hits = global_cache.hits
+    value_search.run_value_search(benchmark=benchmark, settings=settings)
+    self.assertGreater(global_cache.hits, hits)
+
+  def test_resume_value_search_finds_more_solutions(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[benchmark_module.Example(inputs=[[1, 4], [2, 7]],
+                                           output=[3, 11])])
+    settings = settings_module.from_dict({
+        'timeout': 20,
+        'max_solutions': 4,
+        'only_minimal_solutions': False,
+        'max_extra_solutions_time': 20,
+        'printing.statistics': True})
+    expected_results = value_search.run_value_search(
+        benchmark=benchmark, settings=settings)
+
+    # With one solution, the search would only keep minimal solutions.
+    settings.max_solutions = 2
+    results = value_search.run_value_search(
+        benchmark=benchmark, settings=settings)
+    self.assertLen(results.solutions, 2)
+    state = results.search_state
+    self.assertFalse(state.only_minimal_solutions)
+    first_weight = state.weight
+    first_apply_count = state.statistics.total_apply_count
+
+    target_weights = []
+    get_arg_options_list = operation_base.Operation.get_arg_options_list
+    def record_target_weight(operation, target_weight, *args):
+      target_weights.append(target_weight)
+      return get_arg_options_list(operation, target_weight, *args)
+    with mock.patch.object(operation_base.Operation, 'get_arg_options_list',
+                           autospec=True, side_effect=record_target_weight):
+      results = value_search.resume_value_search(
+          state, extra_time=20, extra_solutions=2)
+    self.assertEqual(
+        [solution.expression for solution in results.solutions],
+        [solution.expression for solution in expected_results.solutions])
+    # The resumed search continues from the frontier instead of enumerating
+    # the earlier weights again.
+    self.assertNotEmpty(target_weights)
+    self.assertGreaterEqual(min(target_weights), first_weight)
+    self.assertLess(state.statistics.total_apply_count - first_apply_count,
+                    expected_results.statistics.total_apply_count)
+
+  def test_run_value_search_notifies_asyn(self):
+    benchmark = all_benchmarks.find_benchmark_with_name('simple_cast')
+    asyn = asyn_utils.Asyn()
+    results = value_search.run_value_search(
+        benchmark=benchmark,
+        settings=settings_module.from_dict({'timeout': 20}),
+        asyn=asyn)
+    self.assertTrue(asyn.completed)
+    self.assertIs(asyn.solutions, results.solutions)
+    self.assertTrue(asyn.wait_for_solutions(0, timeout=0))
+
+  def test_resume_value_search_after_timeout(self):
+    benchmark = all_benchmarks.find_benchmark_with_name('stackoverflow_22')
+    results = value_search.run_value_search(
+        benchmark=benchmark,
+        settings=settings_module.from_dict({'timeout': 0}))
+    self.assertEmpty(results.solutions)
+    state = results.search_state
+    self.assertEqual(state.weight, 1)
+    self.assertEqual(state.operation_index, 0)
+
+    results = value_search.resume_value_search(state, extra_time=20)
+    self.assertLen(results.solutions, 1)
+    self.assertGreater(state.weight, 1)
+
   @parameterized.named_parameters(
       ('stackoverflow_06', 'stackoverflow_06', 0),
       ('stackoverflow_22', 'stackoverflow_22', 1))
@@ -336,6 +454,17 @@ class ValueSearchTest(parameterized.TestCase):
     self.assertEqual(results.solutions[0].expression,
                      'tf.add(in1, tf.constant(44))')
 
+  def test_run_value_search_with_multi_example_search(self):
+    # tf.add(in1, in1) and tf.add(in1, in2) coincide on the first example only.
+    results = value_search.run_value_search_from_example(
+        inputs_list=[[[1, 2], [1, 2]], [[3, 4], [5, 6]]],
+        output_list=[[2, 4], [8, 10]],
+        settings=settings_module.from_dict({
+            'timeout': 10,
+            'multi_example_search': True}))
+    self.assertLen(results.solutions, 1)
+    self.assertEqual(results.solutions[0].expression, 'tf.add(in1, in2)')
+
   def test_value_search_checks_bad_solutions(self):
     inputs = {'tensor': [10, 20, 30],
               'index': -2}
@@ -362,6 +491,23 @@ class ValueSearchTest(parameterized.TestCase):
     self.assertLen(results.solutions, 1)
     self.assertEqual(results.solutions[0].expression, 'tf.constant(20)')
 
+  def test_get_reweighted_operations_does_not_modify_shared_operations(self):
+    benchmark = benchmark_module.Benchmark(
+        examples=[benchmark_module.Example(inputs=[[1, 4], [2, 7]],
+                                           output=[3, 11])])
+    settings = settings_module.from_dict({
+        'operations.desired_operations': ['tf.add(x, y)'],
+        'operations.desired_multiplier': 0.1})
+    shared_operation = all_operations.find_operation_with_name('tf.add(x, y)')
+    shared_weight = shared_operation.weight
+
+    operations = value_search.get_reweighted_operations(benchmark, settings)
+    reweighted_operation = all_operations.find_operation_with_name(
+        'tf.add(x, y)', operation_list=operations)
+    self.assertIsNot(reweighted_operation, shared_operation)
+    self.assertLess(reweighted_operation.weight, shared_weight)
+    self.assertEqual(shared_operation.weight, shared_weight)
+
   def test_value_search_prioritizes_operations(self):
     # Make sure prioritized ops get printed out.
     settings = settings_module.from_dict({
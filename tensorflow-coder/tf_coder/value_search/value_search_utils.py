@@ -20,22 +20,20 @@ from tf_coder import tensor_limits as limits
 
 def check_tensor_size(tensor_value):
   """Returns whether the tensor is an acceptable size for value search."""
-  tensor = tensor_value.value
+  shape = tensor_value.shape
   return (
       # Check the number of elements.
       tensor_value.num_elements() <= limits.MAX_TENSOR_ELEMENTS and
 
       # Check the maximum length of a dimension.
 
-      # Note that a TensorShape object for zero dimensions does NOT implicitly
-      # convert to False! We really want to check `len(tensor.shape) == 0`,
-      # which is NOT equivalent to `not tensor.shape` as suggested by the
-      # linter and style guide.
-      (not len(tensor.shape) or  # pylint: disable=g-explicit-length-test
-       max(tensor.shape) <= limits.MAX_DIMENSION_LENGTH) and
+      # The shape is a list of ints, so it is not read from the tensor, which
+      # may not exist yet for Values created from NumPy arrays.
+      (not len(shape) or  # pylint: disable=g-explicit-length-test
+       max(shape) <= limits.MAX_DIMENSION_LENGTH) and
 
       # Check the number of dimensions.
-      len(tensor.shape) <= limits.MAX_NUM_DIMENSIONS)
+      len(shape) <= limits.MAX_NUM_DIMENSIONS)
 
 
 def check_sparse_tensor_size(sparse_tensor_value):
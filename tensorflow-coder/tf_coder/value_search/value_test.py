@@ -21,8 +21,10 @@ import itertools
 from absl import logging
 from absl.testing import absltest
 from absl.testing import parameterized
+import mock
 import tensorflow as tf
 from tf_coder import filter_group
+from tf_coder import tf_coder_utils
 from tf_coder import tf_functions
 from tf_coder.value_search import function_operation
 from tf_coder.value_search import value
@@ -167,6 +169,34 @@ class ValueTest(parameterized.TestCase):
     self.assertTrue(value_1a == value_1b)  # pylint: disable=g-generic-assert
     self.assertFalse(value_1a == value_2)  # pylint: disable=g-generic-assert
 
+  def test_fingerprint_is_cached(self):
+    input_value = value.InputValue(tf.constant([1.5, 2.0]), 'a')
+    fingerprint = input_value.fingerprint()
+    self.assertIs(input_value.fingerprint(), fingerprint)
+    self.assertEqual(fingerprint,
+                     tf_coder_utils.object_to_fingerprint(input_value.value))
+
+  def test_eq_with_rounding(self):
+    value_1 = value.InputValue(tf.constant([1.0000001, 2.0]), 'a')
+    value_2 = value.OutputValue(tf.constant([1.0, 2.0]))
+    self.assertEqual(value_1, value_2)
+    self.assertEqual(hash(value_1), hash(value_2))
+    self.assertLen({value_1, value_2}, 1)
+
+  def test_fingerprint_with_other_examples(self):
+    same_everywhere = value.InputValue(tf.constant([1, 2]), 'a')
+    same_everywhere.set_other_example_values(
+        [value.InputValue(tf.constant([1, 2]), 'a')])
+    single_example = value.OutputValue(tf.constant([1, 2]))
+    differs = value.InputValue(tf.constant([1, 2]), 'a')
+    differs.set_other_example_values(
+        [value.InputValue(tf.constant([3, 4]), 'a')])
+    self.assertEqual(same_everywhere, single_example)
+    self.assertNotEqual(differs, single_example)
+    self.assertEqual(differs.num_examples, 2)
+    self.assertIs(differs.for_example(0), differs)
+    self.assertEqual(differs.for_example(1).value.numpy().tolist(), [3, 4])
+
   def test_eq_comparing_to_non_value(self):
     input_value = value.InputValue(tf.constant([1, 2]), 'a')
     not_comparable = [1, 2]
@@ -340,6 +370,55 @@ class OperationValueTest(absltest.TestCase):
     self.assertLen(values_by_weight[5][query]
                    .reconstruct_all_expressions_with_input_names(), 90)
 
+    # Only the requested number of expressions is built.
+    self.assertEqual(
+        values_by_weight[5][query]
+        .reconstruct_all_expressions_with_input_names(limit=7),
+        values_by_weight[5][query]
+        .reconstruct_all_expressions_with_input_names()[:7])
+
+  def test_reconstruct_all_expressions_with_input_names_is_lazy(self):
+    add_operation = function_operation.FunctionOperation(
+        tf_functions.FunctionInfo(name='tf.add(x, y)',
+                                  filter_group=filter_group.FilterGroup.NONE,
+                                  weight=1))
+    in1 = value.InputValue(1, 'in1')
+    # Build a chain where every link can be created in two ways, so the final
+    # value has 2**20 reconstructions.
+    current = value.ConstantValue(0)
+    for _ in range(20):
+      first_way = add_operation.apply([current, in1], self.settings)
+      second_way = add_operation.apply([in1, current], self.settings)
+      first_way.merge_reconstructions(second_way)
+      current = first_way
+
+    with mock.patch.object(add_operation, 'apply') as mock_apply:
+      reconstructions = current.reconstruct_all_expressions_with_input_names(
+          limit=3)
+      mock_apply.assert_not_called()
+    self.assertLen(reconstructions, 3)
+    for expression, used_names, reconstructed_value in reconstructions:
+      self.assertEqual(used_names, {'in1'})
+      self.assertEqual(reconstructed_value, current)
+      self.assertEqual(reconstructed_value.reconstruct_expression(), expression)
+    self.assertLen(set(expression for expression, _, _ in reconstructions), 3)
+
+  def test_reconstruct_all_expressions_with_input_names_deduplicates(self):
+    add_operation = function_operation.FunctionOperation(
+        tf_functions.FunctionInfo(name='tf.add(x, y)',
+                                  filter_group=filter_group.FilterGroup.NONE,
+                                  weight=1))
+    in1 = value.InputValue(1, 'in1')
+    in2 = value.InputValue(2, 'in2')
+    result = add_operation.apply([in1, in2], self.settings)
+    result.merge_reconstructions(add_operation.apply([in1, in2], self.settings))
+    result.merge_reconstructions(add_operation.apply([in2, in1], self.settings))
+    self.assertEqual(
+        [(expression, used_names) for expression, used_names, _ in
+         result.reconstruct_all_expressions_with_input_names()],
+        [('tf.add(in1, in2)', {'in1', 'in2'}),
+         ('tf.add(in2, in1)', {'in1', 'in2'})])
+
 
 class ConstantValueTest(absltest.TestCase):
 
@@ -0,0 +1,212 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Vectorized versions of common apply filters.
+
+Apply filters are called on every tuple in the Cartesian product of argument
+options, and for many binary operations most tuples are rejected. Instead, each
+list of argument options is summarized into NumPy arrays (dtype codes, ranks,
+shapes, and int values), and the common apply filters are evaluated for all
+pairs of the first two arguments at once. Only the surviving tuples are
+enumerated, in the same order as itertools.product().
+"""
+
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from tf_coder.value_search import operation_filtering
+from tf_coder.value_search import value as value_module
+
+
+# Products smaller than this are filtered in Python, which is faster for them.
+MIN_PRODUCT_SIZE = 64
+
+# The approximate number of array elements to compare at once, which bounds the
+# memory used for intermediate arrays.
+MAX_CHUNK_ELEMENTS = 1 << 20
+
+# Integer codes for dtypes. None (no dtype) has code -1.
+_DTYPE_CODES = {}  # type: Dict[object, int]
+
+
+def _dtype_code(dtype) -> int:
+  if dtype is None:
+    return -1
+  return _DTYPE_CODES.setdefault(dtype, len(_DTYPE_CODES))
+
+
+class ValuesSummary(object):
+  """NumPy arrays summarizing a list of Values, for vectorized filtering.
+
+  Attributes:
+    dtype_codes: An int array of dtype codes.
+    ranks: An int array of ranks, or -1 where a Value has no shape.
+    shapes: An int array of shape (num_values, max_rank). Shapes are aligned to
+      the right and padded with 1 on the left, as for broadcasting.
+    int_values: An int array of the wrapped values that are Python ints (0
+      elsewhere).
+    all_ints: Whether all wrapped values are Python ints.
+    all_shaped: Whether all Values have shapes.
+  """
+
+  def __init__(self, values: Sequence[value_module.Value]) -> None:
+    shapes = [arg_value.shape for arg_value in values]
+    self.dtype_codes = np.array(
+        [_dtype_code(arg_value.dtype) for arg_value in values], dtype=np.int64)
+    self.ranks = np.array([-1 if shape is None else len(shape)
+                           for shape in shapes], dtype=np.int64)
+    max_rank = max(0, int(self.ranks.max())) if len(values) else 0
+    self.shapes = np.ones((len(values), max_rank), dtype=np.int64)
+    for index, shape in enumerate(shapes):
+      if shape:
+        self.shapes[index, max_rank - len(shape):] = shape
+    self.all_ints = all(arg_value.type is int for arg_value in values)
+    self.int_values = np.array(
+        [arg_value.value if arg_value.type is int else 0
+         for arg_value in values], dtype=np.int64)
+    self.all_shaped = bool(np.all(self.ranks >= 0))
+
+  def slice(self, start: int, stop: int) -> 'ValuesSummary':
+    """Returns a summary of a sub-list, with the flags of the whole list."""
+    result = ValuesSummary.__new__(ValuesSummary)
+    result.dtype_codes = self.dtype_codes[start:stop]
+    result.ranks = self.ranks[start:stop]
+    result.shapes = self.shapes[start:stop]
+    result.int_values = self.int_values[start:stop]
+    result.all_ints = self.all_ints
+    result.all_shaped = self.all_shaped
+    return result
+
+
+def _pairwise_shapes(first: ValuesSummary,
+                     second: ValuesSummary) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns shape arrays of both summaries, padded to the same rank."""
+  width = max(first.shapes.shape[1], second.shapes.shape[1])
+  first_shapes = np.pad(first.shapes,
+                        ((0, 0), (width - first.shapes.shape[1], 0)),
+                        constant_values=1)
+  second_shapes = np.pad(second.shapes,
+                         ((0, 0), (width - second.shapes.shape[1], 0)),
+                         constant_values=1)
+  return first_shapes[:, None, :], second_shapes[None, :, :]
+
+
+def _same_dtypes(first: ValuesSummary,
+                 second: ValuesSummary) -> Optional[np.ndarray]:
+  """Vectorized SAME_DTYPES_APPLY_FILTER."""
+  return first.dtype_codes[:, None] == second.dtype_codes[None, :]
+
+
+def _same_dtypes_broadcastable(first: ValuesSummary,
+                               second: ValuesSummary) -> Optional[np.ndarray]:
+  """Vectorized SAME_DTYPES_BROADCASTABLE_APPLY_FILTER."""
+  first_shapes, second_shapes = _pairwise_shapes(first, second)
+  broadcastable = np.all((first_shapes == second_shapes) |
+                         (first_shapes == 1) | (second_shapes == 1), axis=-1)
+  return _same_dtypes(first, second) & broadcastable
+
+
+def _same_shapes(first: ValuesSummary,
+                 second: ValuesSummary) -> Optional[np.ndarray]:
+  """Vectorized SAME_SHAPES_APPLY_FILTER."""
+  first_shapes, second_shapes = _pairwise_shapes(first, second)
+  return ((first.ranks[:, None] == second.ranks[None, :]) &
+          np.all(first_shapes == second_shapes, axis=-1))
+
+
+def _tensor_axis_in_range(first: ValuesSummary,
+                          second: ValuesSummary) -> Optional[np.ndarray]:
+  """Vectorized TENSOR_AXIS_IN_RANGE_APPLY_FILTER."""
+  if not first.all_shaped or not second.all_ints:
+    return None
+  return second.int_values[None, :] < first.ranks[:, None]
+
+
+# A vectorized filter returns a boolean mask for all pairs of the first and
+# second arguments, or None if it does not support these arguments.
+VectorizedFilterType = Callable[[ValuesSummary, ValuesSummary],
+                                Optional[np.ndarray]]
+
+# Apply filters with vectorized versions. These filters only depend on the
+# first two arguments.
+VECTORIZED_APPLY_FILTERS = {
+    operation_filtering.SAME_DTYPES_APPLY_FILTER: _same_dtypes,
+    operation_filtering.SAME_DTYPES_BROADCASTABLE_APPLY_FILTER:
+        _same_dtypes_broadcastable,
+    operation_filtering.SAME_SHAPES_APPLY_FILTER: _same_shapes,
+    operation_filtering.TENSOR_AXIS_IN_RANGE_APPLY_FILTER:
+        _tensor_axis_in_range,
+}  # type: Dict[Callable[..., bool], VectorizedFilterType]
+
+
+def _surviving_products(
+    vectorized_filter: VectorizedFilterType,
+    arg_options: List[Sequence[value_module.Value]],
+    first: ValuesSummary,
+    second: ValuesSummary,
+    chunk_size: int,
+    first_mask: np.ndarray) -> Iterator[Tuple[value_module.Value, ...]]:
+  """Yields the argument tuples whose first two arguments pass the filter."""
+  first_values, second_values = arg_options[0], arg_options[1]
+  other_options = arg_options[2:]
+  mask = first_mask
+  for start in range(0, len(first_values), chunk_size):
+    if start:
+      mask = vectorized_filter(
+          first.slice(start, start + chunk_size), second)
+    for i, j in zip(*np.nonzero(mask)):
+      pair = (first_values[start + i], second_values[j])
+      if other_options:
+        for rest in itertools.product(*other_options):
+          yield pair + rest
+      else:
+        yield pair
+
+
+def filtered_product(
+    apply_filter: Callable[..., bool],
+    arg_options: List[Sequence[value_module.Value]]
+) -> Optional[Iterator[Tuple[value_module.Value, ...]]]:
+  """Enumerates the argument tuples that pass an apply filter, if vectorized.
+
+  Args:
+    apply_filter: The apply filter of an operation.
+    arg_options: A list of lists of Value objects, where the i-th list contains
+      the possible Value objects for the i-th argument.
+
+  Returns:
+    An iterator over the tuples of itertools.product(*arg_options) that pass
+    `apply_filter`, in the same order, or None if the filter cannot be
+    vectorized for these arguments (the caller should filter them itself).
+  """
+  vectorized_filter = VECTORIZED_APPLY_FILTERS.get(apply_filter)
+  if vectorized_filter is None or len(arg_options) < 2:
+    return None
+  first_values, second_values = arg_options[0], arg_options[1]
+  if len(first_values) * len(second_values) < MIN_PRODUCT_SIZE:
+    return None
+
+  first = ValuesSummary(first_values)
+  second = ValuesSummary(second_values)
+  width = max(first.shapes.shape[1], second.shapes.shape[1], 1)
+  chunk_size = max(1, MAX_CHUNK_ELEMENTS // (len(second_values) * width))
+  # Summary flags describe whole lists, so if the first chunk is supported,
+  # every chunk is.
+  first_mask = vectorized_filter(first.slice(0, chunk_size), second)
+  if first_mask is None:
+    return None
+  return _surviving_products(vectorized_filter, arg_options, first, second,
+                             chunk_size, first_mask)
@@ -0,0 +1,108 @@
+# Copyright 2021 The TF-Coder Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for vectorized_filtering.py."""
+
+import itertools
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import tensorflow as tf
+from tf_coder.value_search import operation_filtering
+from tf_coder.value_search import value
+from tf_coder.value_search import vectorized_filtering
+
+
+def _value_pool():
+  """Returns Values with various dtypes, shapes, and primitives."""
+  tensors = [
+      tf.constant(1), tf.constant(2.0), tf.constant(True),
+      tf.constant([1, 2]), tf.constant([1.0, 2.0]), tf.constant([3]),
+      tf.constant([[1, 2], [3, 4]]), tf.constant([[1.0], [2.0]]),
+      tf.constant([[1, 2, 3]]), tf.constant([[[1]], [[2]]]),
+      tf.constant([1, 2], dtype=tf.int64), tf.constant([[True, False]]),
+  ]
+  return ([value.ConstantValue(tensor) for tensor in tensors] +
+          [value.ConstantValue(i) for i in range(-1, 4)] +
+          [value.ConstantValue(tf.int32), value.ConstantValue([1, 2])])
+
+
+class VectorizedFilteringTest(parameterized.TestCase):
+
+  def setUp(self):
+    super(VectorizedFilteringTest, self).setUp()
+    self.values = _value_pool()
+    self.tensors = [v for v in self.values
+                    if operation_filtering.TENSOR_FILTER(v)]
+    self.axes = [v for v in self.values if operation_filtering.AXIS_FILTER(v)]
+
+  def _check_matches_filter(self, apply_filter, arg_options):
+    expected = [arg_values for arg_values in itertools.product(*arg_options)
+                if apply_filter(arg_values)]
+    iterator = vectorized_filtering.filtered_product(apply_filter, arg_options)
+    self.assertIsNotNone(iterator)
+    self.assertEqual(list(iterator), expected)
+
+  @parameterized.named_parameters(
+      ('same_dtypes', operation_filtering.SAME_DTYPES_APPLY_FILTER),
+      ('same_dtypes_broadcastable',
+       operation_filtering.SAME_DTYPES_BROADCASTABLE_APPLY_FILTER),
+      ('same_shapes', operation_filtering.SAME_SHAPES_APPLY_FILTER))
+  def test_pairwise_filters_match(self, apply_filter):
+    self._check_matches_filter(apply_filter, [self.values, self.values])
+
+  def test_tensor_axis_in_range_matches(self):
+    self._check_matches_filter(
+        operation_filtering.TENSOR_AXIS_IN_RANGE_APPLY_FILTER,
+        [self.tensors * 3, self.axes * 3])
+
+  def test_extra_arguments_keep_product_order(self):
+    third = [value.ConstantValue(0), value.ConstantValue(1)]
+    expected = [
+        arg_values
+        for arg_values in itertools.product(self.values, self.values, third)
+        if operation_filtering.SAME_DTYPES_APPLY_FILTER(arg_values)]
+    self.assertEqual(
+        list(vectorized_filtering.filtered_product(
+            operation_filtering.SAME_DTYPES_APPLY_FILTER,
+            [self.values, self.values, third])),
+        expected)
+
+  def test_chunks(self):
+    old_max_chunk_elements = vectorized_filtering.MAX_CHUNK_ELEMENTS
+    vectorized_filtering.MAX_CHUNK_ELEMENTS = 7
+    try:
+      self._check_matches_filter(
+          operation_filtering.SAME_DTYPES_BROADCASTABLE_APPLY_FILTER,
+          [self.values, self.values])
+    finally:
+      vectorized_filtering.MAX_CHUNK_ELEMENTS = old_max_chunk_elements
+
+  def test_unsupported(self):
+    # Not a vectorized filter.
+    self.assertIsNone(vectorized_filtering.filtered_product(
+        lambda arg_values: True, [self.values, self.values]))
+    # Too small to be worth it.
+    self.assertIsNone(vectorized_filtering.filtered_product(
+        operation_filtering.SAME_DTYPES_APPLY_FILTER,
+        [self.values[:2], self.values[:2]]))
+    # The axis argument contains non-ints.
+    self.assertIsNone(vectorized_filtering.filtered_product(
+        operation_filtering.TENSOR_AXIS_IN_RANGE_APPLY_FILTER,
+        [self.tensors * 3, self.values]))
+
+
+if __name__ == '__main__':
+  absltest.main()